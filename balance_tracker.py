@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+import time
+
+from multicall import GET_ETH_BALANCE, MULTICALL3_ADDRESS, address_call, aggregate, decode_uint
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for new blocks
+BALANCE_POLL_INTERVAL = float(os.getenv("BALANCE_POLL_INTERVAL", "2"))
+# Seconds between full refreshes of every watched balance, catching what block
+# scanning can't see (ETH sent by contracts, e.g. bridge withdrawals)
+BALANCE_RECONCILE_INTERVAL = float(os.getenv("BALANCE_RECONCILE_INTERVAL", "60"))
+# Blocks behind the head scanned one by one; further behind, everything is reconciled instead
+BALANCE_MAX_CATCHUP = int(os.getenv("BALANCE_MAX_CATCHUP", "20"))
+# Also scan receipts (contract creations, logs naming a watched address), one eth_getBlockReceipts per block
+BALANCE_SCAN_RECEIPTS = os.getenv("BALANCE_SCAN_RECEIPTS", "true").lower() == "true"
+# Seconds without a local answer after which a watcher stops polling
+BALANCE_WATCH_IDLE = float(os.getenv("BALANCE_WATCH_IDLE", "600"))
+# Local answers are only given while the last successful poll is at most this old
+BALANCE_STALE_AFTER = float(os.getenv("BALANCE_STALE_AFTER", "30"))
+
+def _address(value):
+    """Lowercase hex of an address given as str or bytes, None for None"""
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    return value.lower()
+
+def touched_addresses(block, receipts=()):
+    """Lowercase addresses whose ETH balance a block may have changed
+
+    Senders and recipients of its transactions, the fee recipient, withdrawal
+    recipients, created contracts and addresses in log topics (such as the
+    receiver of a WETH withdrawal). ETH moved by contracts without a log isn't
+    visible here, reconciliation catches it.
+    """
+    touched = {_address(block.get("miner"))}
+    for tx in block.get("transactions", []):
+        if isinstance(tx, (bytes, bytearray, str)):
+            # Hashes only, the block was fetched without full transactions
+            continue
+        touched.add(_address(tx.get("from")))
+        touched.add(_address(tx.get("to")))
+    for withdrawal in block.get("withdrawals") or []:
+        touched.add(_address(withdrawal.get("address")))
+    for receipt in receipts:
+        touched.add(_address(receipt.get("contractAddress")))
+        for log in receipt.get("logs", []):
+            for topic in log.get("topics", [])[1:]:
+                topic = bytes(topic) if not isinstance(topic, str) else bytes.fromhex(topic[2:])
+                if topic[:12] == bytes(12):
+                    touched.add("0x" + topic[12:].hex())
+    touched.discard(None)
+    return touched
+
+class BalanceWatcher:
+    """Keeps the ETH balances of a set of addresses on one chain in memory.
+
+    A background task follows the chain head. For every new block it
+    refreshes only the watched addresses the block touched, at that block;
+    every BALANCE_RECONCILE_INTERVAL seconds, after a reorg or when it fell
+    more than BALANCE_MAX_CATCHUP blocks behind it refreshes all of them.
+    Refreshes go through Multicall3 getEthBalance where it is deployed.
+
+        watcher = BalanceWatcher(w3, "Layer2 http://...", addresses)
+        watcher.start()
+        balance, block_number = watcher.lookup(address)
+    """
+
+    def __init__(self, w3, name, addresses=()):
+        self.w3 = w3
+        self.name = name
+        self.watched = set()
+        self.balances = {}
+        self.block_number = None
+        self.block_hash = None
+        self.polled_at = None
+        self.reconciled_at = None
+        self.last_used = time.monotonic()
+        self.multicall = None
+        self.counters = {"blocks": 0, "refreshed": 0, "reconciliations": 0, "local_answers": 0, "errors": 0}
+        self._pending = set()
+        self._task = None
+        self.watch(addresses)
+
+    def watch(self, addresses):
+        """Add addresses, fetched with the next poll; returns the ones not watched before"""
+        added = {_address(address) for address in addresses} - self.watched
+        self.watched |= added
+        self._pending |= added
+        return added
+
+    def unwatch(self, addresses):
+        for address in map(_address, addresses):
+            self.watched.discard(address)
+            self._pending.discard(address)
+            self.balances.pop(address, None)
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def lookup(self, address):
+        """(balance, block number) of a watched address while the watcher is current, else None"""
+        address = _address(address)
+        fresh = self.running and self.polled_at is not None and time.monotonic() - self.polled_at <= BALANCE_STALE_AFTER
+        if not fresh or address not in self.balances:
+            return None
+        self.last_used = time.monotonic()
+        self.counters["local_answers"] += 1
+        return self.balances[address]
+
+    async def fetch_balances(self, addresses, block_number):
+        """Balances of addresses at a block, in one batched Multicall3 round where possible"""
+        addresses = sorted(addresses)
+        if self.multicall is None:
+            self.multicall = len(await self.w3.eth.get_code(MULTICALL3_ADDRESS)) > 0
+        if self.multicall:
+            async def eth_call(to, data):
+                return await self.w3.eth.call({"to": to, "data": data}, block_number)
+
+            results = await aggregate(
+                eth_call, [(MULTICALL3_ADDRESS, address_call(GET_ETH_BALANCE, address)) for address in addresses]
+            )
+            balances = [decode_uint(*result) for result in results]
+        else:
+            from eth_utils import to_checksum_address
+
+            balances = await asyncio.gather(
+                *(self.w3.eth.get_balance(to_checksum_address(address), block_number) for address in addresses)
+            )
+        self.counters["refreshed"] += len(addresses)
+        for address, balance in zip(addresses, balances):
+            if balance is not None and address in self.watched:
+                self.balances[address] = (balance, block_number)
+
+    async def reconcile(self):
+        """Refresh every watched balance at the head block"""
+        block = await self.w3.eth.get_block("latest")
+        self._pending.clear()
+        await self.fetch_balances(self.watched, block["number"])
+        self.block_number, self.block_hash = block["number"], block["hash"]
+        self.reconciled_at = time.monotonic()
+        self.counters["reconciliations"] += 1
+
+    async def process_block(self, number):
+        """Refresh the watched addresses block `number` touched
+
+        Returns:
+            False on a reorg (the block doesn't extend the last one seen), True otherwise
+        """
+        block = await self.w3.eth.get_block(number, full_transactions=True)
+        if self.block_hash is not None and block["parentHash"] != self.block_hash:
+            return False
+        receipts = []
+        if BALANCE_SCAN_RECEIPTS and block.get("transactions"):
+            try:
+                receipts = await self.w3.eth.get_block_receipts(number)
+            except Exception:
+                # eth_getBlockReceipts isn't served everywhere, reconciliation covers for it
+                receipts = []
+        touched = touched_addresses(block, receipts) & self.watched
+        if touched:
+            await self.fetch_balances(touched, number)
+        self.block_number, self.block_hash = number, block["hash"]
+        self.counters["blocks"] += 1
+        return True
+
+    async def poll(self):
+        """Catch up with the chain head once"""
+        head = await self.w3.eth.block_number
+        due = self.reconciled_at is None or time.monotonic() - self.reconciled_at >= BALANCE_RECONCILE_INTERVAL
+        if due or self.block_number is None or head - self.block_number > BALANCE_MAX_CATCHUP:
+            await self.reconcile()
+        else:
+            for number in range(self.block_number + 1, head + 1):
+                if not await self.process_block(number):
+                    logger.info(f"{self.name}: reorg at block {number}, reconciling balances")
+                    await self.reconcile()
+                    break
+            if self._pending:
+                pending, self._pending = self._pending, set()
+                await self.fetch_balances(pending, self.block_number)
+        self.polled_at = time.monotonic()
+
+    async def run(self):
+        """Poll until stopped or idle for BALANCE_WATCH_IDLE seconds"""
+        while time.monotonic() - self.last_used < BALANCE_WATCH_IDLE:
+            try:
+                await self.poll()
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.warning(f"{self.name}: balance poll failed: {e}")
+            await asyncio.sleep(BALANCE_POLL_INTERVAL)
+        logger.info(f"{self.name}: balance watcher idle, stopping")
+
+    def start(self):
+        if not self.running:
+            self.last_used = time.monotonic()
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def status(self):
+        return {
+            "name": self.name,
+            "running": self.running,
+            "watched": len(self.watched),
+            "block_number": self.block_number,
+            "multicall": self.multicall,
+            **self.counters,
+            "balances": {address: {"balance": balance, "block_number": block} for address, (balance, block) in sorted(self.balances.items())},
+        }
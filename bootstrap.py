@@ -0,0 +1,43 @@
+from string import Template
+
+from ssh import PRE_COMMAND
+
+# Written by the bootstrap script so a stalled deploy can be diagnosed over SSH:
+# "deploying", "done" or "failed:<exit code>"
+STATUS_MARKER = "/var/lib/devnet/bootstrap.status"
+DEPLOY_LOG = "/var/log/devnet-deploy.log"
+
+USER_DATA_TEMPLATE = Template("""#!/bin/bash
+# Devnet bootstrap, rendered by bootstrap.render_user_data
+mkdir -p $$(dirname $status_marker)
+
+until docker info > /dev/null 2>&1; do sleep 1; done
+chmod 666 /var/run/docker.sock
+
+touch $deploy_log && chown $username $deploy_log
+echo deploying > $status_marker
+# script(1) gives the command the pseudo terminal it gets from exec_command_interactive over SSH
+sudo -u $username -H bash -c '$pre_command cd ~ && script -qefc "$command" $deploy_log'
+rc=$$?
+if [ $$rc -eq 0 ]; then
+    echo done > $status_marker
+else
+    echo failed:$$rc > $status_marker
+fi
+""")
+
+def render_user_data(command="trh-sdk deploy", username="ubuntu"):
+    """Render the EC2 user data that prepares docker and runs `command` at boot
+    Args:
+        command: The devnet command to run once docker is up, e.g. "trh-sdk deploy"
+        username: The user the command runs as
+    Returns:
+        user_data: The bash script passed as UserData to RunInstances
+    """
+    return USER_DATA_TEMPLATE.substitute(
+        status_marker=STATUS_MARKER,
+        deploy_log=DEPLOY_LOG,
+        username=username,
+        pre_command=" ".join(PRE_COMMAND.split()),
+        command=command,
+    )
@@ -0,0 +1,114 @@
+import json
+import os
+import re
+import time
+
+from datetime import datetime
+
+# Ordered (stage, pattern) pairs matched against trh-sdk deploy output, the
+# stages of the timing table in the README. A stage starts at the first line
+# matching its pattern and ends where the next recognized stage starts.
+# Override with a JSON list of [stage, pattern] pairs in DEPLOY_STAGE_MARKERS.
+DEFAULT_DEPLOY_STAGE_MARKERS = [
+    ("l1_startup", r"\b(l1|layer ?1)\b"),
+    ("l2_startup", r"\b(l2|layer ?2)\b"),
+    ("contracts", r"\bcontracts?\b"),
+    ("accounts", r"\baccounts?\b"),
+]
+DEPLOY_STAGE_MARKERS = [
+    tuple(marker) for marker in json.loads(os.getenv("DEPLOY_STAGE_MARKERS") or "[]")
+] or DEFAULT_DEPLOY_STAGE_MARKERS
+
+# Output before the first marker, e.g. trh-sdk checking its environment
+SETUP_STAGE = "setup"
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+class DeployTimer:
+    """Turns timestamped deploy output lines into a stage timing breakdown.
+
+    Markers only move forward: once a stage started, lines matching an
+    earlier stage's pattern (e.g. an L1 address printed during contract
+    deployment) don't reopen it.
+
+        timer = DeployTimer()
+        timer.feed("Starting L1 node...", time.time())
+        ...
+        timings = timer.finish()
+    """
+
+    def __init__(self, markers=DEPLOY_STAGE_MARKERS, start=None):
+        self.markers = [(stage, re.compile(pattern, re.IGNORECASE)) for stage, pattern in markers]
+        self.start = time.time() if start is None else start
+        self.lines = 0
+        self._position = -1
+        self._stages = [(SETUP_STAGE, self.start, None)]
+
+    def feed(self, line, at=None):
+        """Record one output line received at `at` (epoch seconds)"""
+        at = time.time() if at is None else at
+        self.lines += 1
+        text = ANSI_ESCAPE.sub("", line if isinstance(line, str) else line.decode(errors="replace"))
+        for position in range(self._position + 1, len(self.markers)):
+            stage, pattern = self.markers[position]
+            if pattern.search(text):
+                self._position = position
+                self._stages.append((stage, at, text.strip()[:200]))
+                return stage
+        return None
+
+    def finish(self, end=None):
+        """Close the last stage and return the breakdown
+
+        Returns:
+            {
+                "started_at": "2025-06-04 23:09:13",
+                "total": 146.3,
+                "lines": 1520,
+                "stages": {
+                    "setup": {"start": 0.0, "end": 4.1, "duration": 4.1, "marker": None},
+                    "l1_startup": {"start": 4.1, "end": 35.2, "duration": 31.1, "marker": "Starting L1..."},
+                    ...
+                }
+            }
+        """
+        end = time.time() if end is None else end
+        stages = {}
+        boundaries = self._stages + [(None, end, None)]
+        for (stage, stage_start, marker), (_, stage_end, _) in zip(boundaries, boundaries[1:]):
+            stages[stage] = {
+                "start": round(stage_start - self.start, 2),
+                "end": round(stage_end - self.start, 2),
+                "duration": round(stage_end - stage_start, 2),
+                "marker": marker,
+            }
+        return {
+            "started_at": datetime.fromtimestamp(self.start).strftime("%Y-%m-%d %H:%M:%S"),
+            "total": round(end - self.start, 2),
+            "lines": self.lines,
+            "stages": stages,
+        }
+
+def percentile(values, p):
+    """Linear interpolated percentile of values, p in [0, 100]"""
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return round(values[low] + (values[high] - values[low]) * (rank - low), 2)
+
+def summarize(values, percentiles=(50, 90, 95, 99)):
+    """Count, mean, min, max and percentiles of a list of durations"""
+    if not values:
+        return {"count": 0}
+    summary = {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 2),
+        "min": round(min(values), 2),
+        "max": round(max(values), 2),
+    }
+    for p in percentiles:
+        summary[f"p{p}"] = percentile(values, p)
+    return summary
@@ -0,0 +1,93 @@
+import os
+import re
+import shlex
+
+from string import Template
+
+# Directory on the devnet host holding one subdirectory per snapshot
+DEVNET_SNAPSHOT_DIR = os.getenv("DEVNET_SNAPSHOT_DIR", "/home/ubuntu/devnet-snapshots")
+# Docker volumes to snapshot, space or comma separated; by default every named
+# volume mounted by a running container, i.e. the L1/L2 node data directories
+DEVNET_SNAPSHOT_VOLUMES = os.getenv("DEVNET_SNAPSHOT_VOLUMES", "")
+# Seconds a snapshot or reset may take on the host
+DEVNET_SNAPSHOT_TIMEOUT = int(os.getenv("DEVNET_SNAPSHOT_TIMEOUT", "600"))
+
+SNAPSHOT_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+# Containers are stopped so the nodes flush their databases, the volumes are
+# archived as they are on disk and the containers are started again, also
+# when archiving fails. Containers start oldest first, L1 before L2.
+SNAPSHOT_TEMPLATE = Template("""
+dir=$dir
+containers=$$(docker ps -q | tac)
+[ -n "$$containers" ] || { echo "no running containers" >&2; exit 1; }
+volumes="$volumes"
+if [ -z "$$volumes" ]; then
+    volumes=$$(docker inspect -f '{{range .Mounts}}{{if eq .Type "volume"}}{{println .Name}}{{end}}{{end}}' $$containers | sort -u)
+fi
+[ -n "$$volumes" ] || { echo "no docker volumes to snapshot" >&2; exit 1; }
+mkdir -p "$$dir"
+trap 'docker start $$containers > /dev/null' EXIT
+docker stop $$containers > /dev/null
+for volume in $$volumes; do
+    sudo tar -cf "$$dir/$$volume.tar" --numeric-owner -C "$$(docker volume inspect -f '{{.Mountpoint}}' "$$volume")" .
+done
+printf '%s\\n' $$volumes > "$$dir/volumes"
+echo "volumes: $$(echo $$volumes)"
+echo "size: $$(sudo du -sb "$$dir" | cut -f1)"
+""")
+
+# Stop, swap every snapshotted volume's content for the archive, start
+RESTORE_TEMPLATE = Template("""
+dir=$dir
+[ -f "$$dir/volumes" ] || { echo "snapshot $$dir not found" >&2; exit 1; }
+containers=$$(docker ps -q | tac)
+trap '[ -z "$$containers" ] || docker start $$containers > /dev/null' EXIT
+[ -z "$$containers" ] || docker stop $$containers > /dev/null
+for volume in $$(cat "$$dir/volumes"); do
+    mountpoint=$$(docker volume inspect -f '{{.Mountpoint}}' "$$volume")
+    sudo find "$$mountpoint" -mindepth 1 -delete
+    sudo tar -xf "$$dir/$$volume.tar" --numeric-owner -C "$$mountpoint"
+done
+echo "volumes: $$(echo $$(cat "$$dir/volumes"))"
+""")
+
+def _script(template, **values):
+    return "bash -eo pipefail -c " + shlex.quote(template.substitute(**values))
+
+def snapshot_path(snapshot_id):
+    """Directory of a snapshot on the devnet host
+
+    Raises:
+        ValueError: The ID isn't a plain file name
+    """
+    if not SNAPSHOT_ID.match(snapshot_id):
+        raise ValueError(f"Invalid snapshot ID: {snapshot_id}")
+    return f"{DEVNET_SNAPSHOT_DIR}/{snapshot_id}"
+
+def snapshot_command(snapshot_id, volumes=DEVNET_SNAPSHOT_VOLUMES):
+    """Shell command archiving the devnet's docker volumes into the snapshot's directory"""
+    return _script(
+        SNAPSHOT_TEMPLATE,
+        dir=shlex.quote(snapshot_path(snapshot_id)),
+        volumes=" ".join(volumes.replace(",", " ").split()),
+    )
+
+def restore_command(snapshot_id):
+    """Shell command restoring the devnet's docker volumes from a snapshot by stop-swap-start"""
+    return _script(RESTORE_TEMPLATE, dir=shlex.quote(snapshot_path(snapshot_id)))
+
+def delete_command(snapshot_id):
+    """Shell command removing a snapshot from the host"""
+    return f"sudo rm -rf {shlex.quote(snapshot_path(snapshot_id))}"
+
+def parse_output(stdout):
+    """The "volumes: ..." and "size: ..." lines of a snapshot or restore run"""
+    result = {}
+    for line in stdout.splitlines():
+        key, _, value = line.partition(": ")
+        if key == "volumes":
+            result["volumes"] = value.split()
+        elif key == "size" and value.strip().isdigit():
+            result["size_bytes"] = int(value)
+    return result
@@ -1,12 +1,17 @@
-import boto3
+import logging
 import os
 import time
+import threading
 from dotenv import load_dotenv
 from os.path import join, dirname
 
+from metrics import record_boto_timings
+
 dotenv_path = join(dirname(__file__), '.env')
 load_dotenv(dotenv_path)
 
+logger = logging.getLogger(__name__)
+
 AWS_ACCESS_KEY = os.getenv("IAM_ACCESS_KEY")
 AWS_SECRET_KEY = os.getenv("IAM_SECRET_KEY")
 REGION_NAME = os.getenv("REGION_NAME")
@@ -16,11 +21,40 @@ INSTANCE_TYPE = os.getenv("INSTANCE_TYPE")
 KEY_NAME = os.getenv("SSH_KEY_NAME")
 SECURITY_GROUP_IDS = [os.getenv("SECURITY_GROUP_ID")]
 
-ec2 = boto3.client("ec2",
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=REGION_NAME
-)
+_client = None
+_client_lock = threading.Lock()
+
+def _session():
+    """A boto3 Session with the IAM credentials, its calls timed by the metrics layer
+
+    boto3 is imported on first use rather than with this module, so starting
+    the MCP server doesn't pay for it.
+    """
+    import boto3
+
+    session = boto3.Session(
+        aws_access_key_id=AWS_ACCESS_KEY,
+        aws_secret_access_key=AWS_SECRET_KEY,
+        region_name=REGION_NAME
+    )
+    record_boto_timings(session.events)
+    return session
+
+def get_ec2_client():
+    """The shared EC2 client, created on first use (boto3 clients are thread safe)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = _session().client("ec2")
+        return _client
+
+class _LazyClient:
+    """Stands in for the EC2 client until an API call needs it"""
+
+    def __getattr__(self, name):
+        return getattr(get_ec2_client(), name)
+
+ec2 = _LazyClient()
 
 def describe_ec2_instances():
     """Describe all EC2 instances
@@ -49,10 +83,44 @@ def describe_ec2_instances():
     response = ec2.describe_instances()
     return response["Reservations"]
 
-def create_ec2_instance(name: str):
+def describe_ec2_instances_by_ids(instance_ids):
+    """Describe many EC2 instances with one paginated DescribeInstances call
+    Args:
+        instance_ids: The IDs of the instances to describe
+    Returns:
+        instances: Dict of instance ID to instance description
+        {
+            "i-01234567890123456": {
+                "InstanceId": "i-01234567890123456",
+                "State": {"Name": "running"},
+                "PublicIpAddress": "192.168.1.100",
+                "LaunchTime": datetime(2025, 6, 4, 23, 9, 10, tzinfo=tzutc()),
+                ...
+            }
+        }
+    """
+    instances = {}
+    if not instance_ids:
+        return instances
+
+    # Filter by instance-id instead of passing InstanceIds, so a single
+    # unknown or long-gone ID does not fail the whole request.
+    paginator = ec2.get_paginator("describe_instances")
+    pages = paginator.paginate(
+        Filters=[{"Name": "instance-id", "Values": list(instance_ids)}]
+    )
+    for page in pages:
+        for reservation in page["Reservations"]:
+            for instance in reservation["Instances"]:
+                instances[instance["InstanceId"]] = instance
+
+    return instances
+
+def create_ec2_instance(name: str, user_data: str = None):
     """Create an EC2 instance
     Args:
         name: The name of the instance
+        user_data: Script run by cloud-init at first boot (see bootstrap.render_user_data)
     Returns: Instance ID and Public IP address
         Instance.id
     """
@@ -76,26 +144,77 @@ def create_ec2_instance(name: str):
         "InstanceType":"t3.large",
         "KeyName":KEY_NAME,
         "SecurityGroupIds":SECURITY_GROUP_IDS,
-        # "UserData":user_data,
         "TagSpecifications":tag_specifications
     }
+    if user_data:
+        instance_params["UserData"] = user_data
 
-    session = boto3.Session(
-        aws_access_key_id=AWS_ACCESS_KEY, 
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=REGION_NAME
-    )
-
-    ec2r = session.resource('ec2')
+    ec2r = _session().resource('ec2')
     instances = ec2r.create_instances(**instance_params)
 
     return instances[0].id
 
-def create_ec2_instance_by_image(name: str, image_id: str):
+def create_ec2_instances(names, image_id=None, tags=None):
+    """Create several EC2 instances with a single RunInstances request
+    Args:
+        names: The names of the instances, one instance is created per name
+        image_id: The ID of the image (default: IMAGE_ID)
+        tags: Dict of tag key to value shared by the whole batch, applied at launch
+    Returns:
+        instance_ids: The instance IDs, in the same order as names
+    Raises:
+        botocore.exceptions.ClientError: Tagging failed, every launched instance was terminated
+    """
+    instance_params = {
+        "ImageId":image_id or IMAGE_ID,
+        "MinCount":len(names),
+        "MaxCount":len(names),
+        "InstanceType":"t3.large",
+        "KeyName":KEY_NAME,
+        "SecurityGroupIds":SECURITY_GROUP_IDS,
+    }
+    if tags:
+        instance_params["TagSpecifications"] = [
+            {
+                "ResourceType": "instance",
+                "Tags": [{"Key": key, "Value": value} for key, value in tags.items()]
+            }
+        ]
+
+    ec2r = _session().resource('ec2')
+    instances = ec2r.create_instances(**instance_params)
+    instance_ids = [instance.id for instance in instances]
+
+    # TagSpecifications apply the same tags to every instance of the request,
+    # so each instance gets its own Name afterwards. Don't leave unnamed
+    # instances running when that fails.
+    try:
+        for name, instance_id in zip(names, instance_ids):
+            _tag_new_instance(instance_id, {"Name": name})
+    except Exception:
+        terminate_ec2_instances(instance_ids)
+        raise
+
+    return instance_ids
+
+def _tag_new_instance(instance_id, tags, attempts=5, delay=1):
+    """Tag a just launched instance, retrying while EC2 doesn't know its ID yet"""
+    from botocore.exceptions import ClientError
+
+    for attempt in range(attempts):
+        try:
+            return tag_ec2_instance(instance_id, tags)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "InvalidInstanceID.NotFound" or attempt == attempts - 1:
+                raise
+            time.sleep(delay * 2 ** attempt)
+
+def create_ec2_instance_by_image(name: str, image_id: str, user_data: str = None):
     """Create an EC2 instance by image
     Args:
         name: The name of the instance
         image_id: The ID of the image
+        user_data: Script run by cloud-init at first boot (see bootstrap.render_user_data)
     Returns: Instance ID and Public IP address
     """
     tag_specifications = [
@@ -114,14 +233,10 @@ def create_ec2_instance_by_image(name: str, image_id: str):
         "SecurityGroupIds":SECURITY_GROUP_IDS,
         "TagSpecifications":tag_specifications
     }
+    if user_data:
+        instance_params["UserData"] = user_data
     
-    session = boto3.Session(
-        aws_access_key_id=AWS_ACCESS_KEY, 
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=REGION_NAME
-    )
-
-    ec2r = session.resource('ec2')
+    ec2r = _session().resource('ec2')
     instances = ec2r.create_instances(**instance_params)
 
     return instances[0].id, instances[0].public_ip_address
@@ -150,11 +265,7 @@ def terminate_ec2_instance(instance_id):
             'RetryAttempts': 0}
         }
     """
-    ec2 = boto3.resource('ec2',
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=REGION_NAME
-    )
+    ec2 = _session().resource('ec2')
 
     # Retrieve the instance to be terminated
     instance = ec2.Instance(instance_id)
@@ -165,10 +276,51 @@ def terminate_ec2_instance(instance_id):
     # Wait for the instance to terminate
     # instance.wait_until_terminated() # It takes 10~20 seconds depends on environment
 
-    print("Terminated instance:", instance_id)
+    logger.info(f"Terminated instance: {instance_id}")
     return response
 
 
+def terminate_ec2_instances(instance_ids):
+    """Terminate many EC2 instances with a single TerminateInstances call
+    Args:
+        instance_ids: The IDs of the instances to terminate
+    Returns:
+        terminating: Dict of instance ID to its new state, e.g. {"i-0d871b6e201a9a0f0": "shutting-down"}
+    """
+    if not instance_ids:
+        return {}
+    response = ec2.terminate_instances(InstanceIds=list(instance_ids))
+    return {
+        instance["InstanceId"]: instance["CurrentState"]["Name"]
+        for instance in response["TerminatingInstances"]
+    }
+
+def wait_for_instances_state(instance_ids, desired_state, timeout=600):
+    """Wait for many instances to reach a desired state, polling them together
+    Args:
+        instance_ids: The IDs of the instances
+        desired_state: The desired state ('running', 'stopped', 'terminated')
+        timeout: Maximum time to wait in seconds
+    Returns:
+        bool: True if every instance reached the desired state, False if timeout
+    """
+    start_time = time.time()
+    remaining = set(instance_ids)
+    while time.time() - start_time < timeout:
+        instances = describe_ec2_instances_by_ids(remaining)
+        remaining = {
+            instance_id for instance_id in remaining
+            if instance_id in instances and instances[instance_id]["State"]["Name"] != desired_state
+        }
+        logger.info(f"Instances not yet {desired_state}: {len(remaining)}")
+
+        if not remaining:
+            return True
+
+        time.sleep(10)
+
+    return False
+
 def reboot_ec2_instance(instance_id):
     """Reboot an EC2 instance
     Args:
@@ -176,11 +328,7 @@ def reboot_ec2_instance(instance_id):
     Returns:
         response: The response from the reboot request
     """
-    ec2 = boto3.resource('ec2',
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=REGION_NAME
-    )
+    ec2 = _session().resource('ec2')
 
     instance = ec2.Instance(instance_id)
     response = instance.reboot()
@@ -194,11 +342,7 @@ def stop_ec2_instance(instance_id):
     Returns:
         response: The response from the stop request
     """
-    ec2 = boto3.resource('ec2',
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=REGION_NAME
-    )
+    ec2 = _session().resource('ec2')
 
     instance = ec2.Instance(instance_id)
     response = instance.stop()
@@ -212,11 +356,7 @@ def start_ec2_instance(instance_id):
     Returns:
         response: The response from the start request
     """
-    ec2 = boto3.resource('ec2',
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=REGION_NAME
-    )
+    ec2 = _session().resource('ec2')
 
     instance = ec2.Instance(instance_id)
     response = instance.start()
@@ -230,11 +370,7 @@ def get_ec2_instance(instance_id):
     Returns:
         instance: The instance object
     """
-    ec2 = boto3.resource('ec2',
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=REGION_NAME
-    )
+    ec2 = _session().resource('ec2')
 
     instance = ec2.Instance(instance_id)    
 
@@ -247,23 +383,34 @@ def get_ec2_instance_public_ip(instance_id):
     Returns:
         public_ip_address: The public IP address of the instance
     """
-    ec2 = boto3.resource('ec2',
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=REGION_NAME
-    )
+    ec2 = _session().resource('ec2')
 
     # Retrieve the instance to be terminated
     instance = ec2.Instance(instance_id)
 
     return instance.public_ip_address
 
-def wait_for_instance_state(instance_id, desired_state, timeout=300):
+def tag_ec2_instance(instance_id, tags):
+    """Create or overwrite tags on an EC2 instance
+    Args:
+        instance_id: The ID of the instance
+        tags: Dict of tag key to value, e.g. {"Name": "devnet-1"}
+    Returns:
+        response: The response from the create_tags request
+    """
+    response = ec2.create_tags(
+        Resources=[instance_id],
+        Tags=[{"Key": key, "Value": value} for key, value in tags.items()]
+    )
+    return response
+
+def wait_for_instance_state(instance_id, desired_state, timeout=300, interval=10):
     """Wait for an instance to reach a desired state
     Args:
         instance_id: The ID of the instance
         desired_state: The desired state ('running', 'stopped', 'terminated')
         timeout: Maximum time to wait in seconds
+        interval: Seconds between state checks
     Returns:
         bool: True if the instance reached the desired state, False if timeout
     """
@@ -271,15 +418,157 @@ def wait_for_instance_state(instance_id, desired_state, timeout=300):
     while time.time() - start_time < timeout:
         instance = get_ec2_instance(instance_id)
         current_state = instance.state['Name']
-        print(f"Current instance state: {current_state}")
+        logger.info(f"Instance {instance_id} state: {current_state}")
         
         if current_state == desired_state:
             return True
             
-        time.sleep(10)
+        time.sleep(interval)
     
     return False
 
+def wait_for_public_ip(instance_id, timeout=300, interval=1):
+    """Wait until an instance has a public IP address
+
+    The address is assigned while the instance is still pending, well before
+    it is running, so SSH probing can start early.
+    Args:
+        instance_id: The ID of the instance
+        timeout: Maximum time to wait in seconds
+        interval: Seconds between DescribeInstances calls
+    Returns:
+        public_ip_address: The public IP address, or None if timeout
+    """
+    start_time = time.time()
+    while time.time() - start_time < timeout:
+        instance = describe_ec2_instances_by_ids([instance_id]).get(instance_id)
+        if instance and instance.get("PublicIpAddress"):
+            return instance["PublicIpAddress"]
+        time.sleep(interval)
+
+    return None
+
+def check_security_group_ports(ports, security_group_ids=SECURITY_GROUP_IDS):
+    """Find ports that the devnet security groups don't open to the internet
+    Args:
+        ports: The TCP ports that must be reachable, e.g. [22, 8545, 9545]
+        security_group_ids: The security groups attached to devnet instances
+    Returns:
+        missing: The ports without a matching 0.0.0.0/0 ingress rule
+    """
+    response = ec2.describe_security_groups(GroupIds=security_group_ids)
+    open_ports = set()
+    for group in response["SecurityGroups"]:
+        for permission in group["IpPermissions"]:
+            if not any(ip_range.get("CidrIp") == "0.0.0.0/0" for ip_range in permission.get("IpRanges", [])):
+                continue
+            if permission["IpProtocol"] == "-1":
+                return []
+            if permission["IpProtocol"] != "tcp":
+                continue
+            for port in ports:
+                if permission["FromPort"] <= port <= permission["ToPort"]:
+                    open_ports.add(port)
+
+    return [port for port in ports if port not in open_ports]
+
+def create_ec2_image(instance_id, name, description="", tags=None, no_reboot=False):
+    """Create an AMI from an EC2 instance
+    Args:
+        instance_id: The ID of the source instance
+        name: The name of the image (must be unique in the account/region)
+        description: The description of the image
+        tags: Dict of tag key to value applied to the image and its snapshots
+        no_reboot: Skip rebooting the instance before snapshotting. Faster,
+                   but the file system of running nodes may be inconsistent.
+    Returns:
+        image_id: The ID of the new image, e.g. "ami-01234567890123456"
+    """
+    params = {
+        "InstanceId": instance_id,
+        "Name": name,
+        "Description": description,
+        "NoReboot": no_reboot,
+    }
+    if tags:
+        tag_list = [{"Key": key, "Value": value} for key, value in tags.items()]
+        params["TagSpecifications"] = [
+            {"ResourceType": "image", "Tags": tag_list},
+            {"ResourceType": "snapshot", "Tags": tag_list},
+        ]
+
+    response = ec2.create_image(**params)
+    return response["ImageId"]
+
+def describe_ec2_images(image_ids):
+    """Describe AMIs owned by this account
+    Args:
+        image_ids: The IDs of the images
+    Returns:
+        images: Dict of image ID to image description
+        {
+            "ami-01234567890123456": {
+                "ImageId": "ami-01234567890123456",
+                "State": "available",
+                "BlockDeviceMappings": [{"Ebs": {"SnapshotId": "snap-..."}}],
+                ...
+            }
+        }
+    """
+    if not image_ids:
+        return {}
+    response = ec2.describe_images(
+        Owners=["self"],
+        Filters=[{"Name": "image-id", "Values": list(image_ids)}]
+    )
+    return {image["ImageId"]: image for image in response["Images"]}
+
+def wait_for_image_available(image_id, timeout=1800):
+    """Wait for an AMI to become available
+    Args:
+        image_id: The ID of the image
+        timeout: Maximum time to wait in seconds
+    Returns:
+        bool: True if the image is available, False if timeout or failed
+    """
+    start_time = time.time()
+    while time.time() - start_time < timeout:
+        image = describe_ec2_images([image_id]).get(image_id)
+        state = image["State"] if image else "pending"
+        logger.info(f"Image {image_id} state: {state}")
+
+        if state == "available":
+            return True
+        if state in ("failed", "error", "invalid", "deregistered"):
+            return False
+
+        time.sleep(15)
+
+    return False
+
+def deregister_ec2_image(image_id):
+    """Deregister an AMI and delete its EBS snapshots
+    Args:
+        image_id: The ID of the image
+    Returns:
+        snapshot_ids: The IDs of the deleted snapshots
+    """
+    image = describe_ec2_images([image_id]).get(image_id)
+    snapshot_ids = []
+    if image:
+        snapshot_ids = [
+            mapping["Ebs"]["SnapshotId"]
+            for mapping in image.get("BlockDeviceMappings", [])
+            if "Ebs" in mapping and "SnapshotId" in mapping["Ebs"]
+        ]
+
+    ec2.deregister_image(ImageId=image_id)
+    # Snapshots are not removed with the image and keep costing storage
+    for snapshot_id in snapshot_ids:
+        ec2.delete_snapshot(SnapshotId=snapshot_id)
+
+    return snapshot_ids
+
 def test_ec2_operations():
     """Test all EC2 instance operations"""
     print("Starting EC2 instance operations test...")
@@ -0,0 +1,223 @@
+import asyncio
+import bisect
+import json
+import os
+import re
+
+from collections import OrderedDict, deque
+
+# Blocks per eth_getLogs request to start with, and the most one request may grow to
+LOGS_CHUNK_SIZE = int(os.getenv("LOGS_CHUNK_SIZE", "2000"))
+LOGS_MAX_CHUNK_SIZE = int(os.getenv("LOGS_MAX_CHUNK_SIZE", "100000"))
+# Chunks fetched at the same time per query
+LOGS_CONCURRENCY = int(os.getenv("LOGS_CONCURRENCY", "4"))
+# Results per chunk to aim for: sparser chunks double the chunk size, denser ones halve it
+LOGS_TARGET_RESULTS = int(os.getenv("LOGS_TARGET_RESULTS", "2000"))
+# Seconds before a chunk request counts as too large and is split
+LOGS_REQUEST_TIMEOUT = float(os.getenv("LOGS_REQUEST_TIMEOUT", "30"))
+# Logs of finalized blocks kept in memory across queries
+LOGS_CACHE_MAX_LOGS = int(os.getenv("LOGS_CACHE_MAX_LOGS", "200000"))
+# Blocks behind the head taken as final when the chain doesn't know the "finalized" tag
+LOGS_FINALITY_DEPTH = int(os.getenv("LOGS_FINALITY_DEPTH", "64"))
+
+# How providers reject a range that is too large, e.g. "query returned more than
+# 10000 results" (geth, Infura), "Log response size exceeded" (Alchemy) or
+# "block range is too wide". Some report it with the rate limiting code -32005.
+LOG_RANGE_ERROR = re.compile(r"results|response size|range|too large|timeout", re.IGNORECASE)
+# A range the provider suggests instead, e.g. "this block range should work: [0x1, 0x7d0]"
+SUGGESTED_RANGE = re.compile(r"\[\s*(0x[0-9a-fA-F]+)\s*,\s*(0x[0-9a-fA-F]+)\s*\]")
+
+class LogRangeError(Exception):
+    """The provider rejected a range as too large; suggested_end is where it would have stopped"""
+
+    def __init__(self, message, suggested_end=None):
+        super().__init__(message)
+        self.suggested_end = suggested_end
+
+class LogQueryError(Exception):
+    """The provider answered eth_getLogs with an error other than a too large range"""
+
+def format_log(log):
+    """A raw eth_getLogs entry with block number, log index and transaction index as ints"""
+    log = dict(log)
+    for field in ("blockNumber", "logIndex", "transactionIndex"):
+        if isinstance(log.get(field), str):
+            log[field] = int(log[field], 16)
+    return log
+
+def logs_from_response(response, start):
+    """The formatted logs of an eth_getLogs JSON-RPC response for a range starting at `start`
+
+    Raises:
+        LogRangeError: The range was too large, with the end of the range the provider suggested
+        LogQueryError: Any other error
+    """
+    if "error" not in response:
+        return [format_log(log) for log in response["result"]]
+    message = str(response["error"].get("message", response["error"]))
+    if LOG_RANGE_ERROR.search(message):
+        suggested_end = None
+        match = SUGGESTED_RANGE.search(message)
+        if match and int(match[1], 16) == start:
+            suggested_end = int(match[2], 16)
+        raise LogRangeError(message, suggested_end)
+    raise LogQueryError(message)
+
+class LogCache:
+    """Logs of finalized block ranges per query, so repeated queries only fetch new blocks.
+
+    Every query (chain, address, topics) keeps sorted, non-overlapping
+    (start, end, logs) chunks. The queries used longest ago are dropped
+    once more than max_logs logs are cached.
+    """
+
+    def __init__(self, max_logs=LOGS_CACHE_MAX_LOGS):
+        self.max_logs = max_logs
+        self.size = 0
+        self._queries = OrderedDict()
+
+    def find(self, key, block):
+        """(start, end, logs) of the cached chunk holding `block`, and the first
+        cached block after `block` (None if there is none)"""
+        chunks = self._queries.get(key)
+        if not chunks:
+            return None, None
+        self._queries.move_to_end(key)
+        i = bisect.bisect_right(chunks, block, key=lambda chunk: chunk[0])
+        if i and chunks[i - 1][1] >= block:
+            return chunks[i - 1], None
+        return None, chunks[i][0] if i < len(chunks) else None
+
+    def add(self, key, start, end, logs):
+        chunks = self._queries.setdefault(key, [])
+        self._queries.move_to_end(key)
+        i = bisect.bisect_right(chunks, start, key=lambda chunk: chunk[0])
+        # Another query may have cached an overlapping chunk meanwhile
+        if (i and chunks[i - 1][1] >= start) or (i < len(chunks) and chunks[i][0] <= end):
+            return
+        chunks.insert(i, (start, end, logs))
+        self.size += len(logs)
+        while self.size > self.max_logs and len(self._queries) > 1:
+            _, dropped = self._queries.popitem(last=False)
+            self.size -= sum(len(chunk[2]) for chunk in dropped)
+
+    def drop_chain(self, chain):
+        """Forget every query of a chain, e.g. after its state was reset"""
+        for key in [key for key in self._queries if key[0] == chain]:
+            self.size -= sum(len(chunk[2]) for chunk in self._queries.pop(key))
+
+    def clear(self):
+        self._queries.clear()
+        self.size = 0
+
+log_cache = LogCache()
+
+def cache_key(chain, address, topics):
+    """Cache key of a log query, the same for any spelling of the addresses"""
+    addresses = sorted(a.lower() for a in ([address] if isinstance(address, str) else address or []))
+    return (chain, tuple(addresses), json.dumps(topics or [], sort_keys=True).lower())
+
+async def iter_logs(
+    request,
+    from_block,
+    to_block,
+    chunk_size=LOGS_CHUNK_SIZE,
+    concurrency=LOGS_CONCURRENCY,
+    cache=None,
+    key=None,
+    finalized=-1,
+    stats=None,
+):
+    """Fetch the logs of a block range in chunks, yielding (start, end, logs) in block order.
+
+    Up to `concurrency` chunks are fetched at the same time. A chunk the
+    provider rejects as too large (or that times out) is split, at the
+    range the provider suggests or in half, and later chunks get smaller;
+    sparse chunks make later chunks grow. Ranges up to `finalized` are
+    answered from and stored in `cache` under `key`.
+
+    Args:
+        request: async request(start, end) returning the logs of blocks start..end,
+                 raising LogRangeError when the range is too large
+        from_block: First block, inclusive
+        to_block: Last block, inclusive
+        stats: Optional dict counting "requests", "splits" and "cached_chunks"
+    Raises:
+        LogRangeError: A single block has more logs than the provider returns at once
+    """
+    stats = {} if stats is None else stats
+    for counter in ("requests", "splits", "cached_chunks"):
+        stats.setdefault(counter, 0)
+    size = max(chunk_size, 1)
+    next_start = from_block
+    cursor = from_block
+    retry = deque()
+    results = {}
+    tasks = {}
+
+    async def fetch(start, end):
+        stats["requests"] += 1
+        try:
+            return await asyncio.wait_for(request(start, end), LOGS_REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise LogRangeError(f"eth_getLogs for blocks {start}-{end} timed out")
+
+    def next_range():
+        nonlocal next_start
+        if retry:
+            return retry.popleft()
+        next_cached = None
+        while cache is not None and next_start <= to_block:
+            chunk, next_cached = cache.find(key, next_start)
+            if chunk is None:
+                break
+            end = min(chunk[1], to_block)
+            results[next_start] = (end, [log for log in chunk[2] if next_start <= log["blockNumber"] <= end])
+            stats["cached_chunks"] += 1
+            next_start = end + 1
+        if next_start > to_block:
+            return None
+        end = min(next_start + size - 1, to_block)
+        if cache is not None and next_cached is not None:
+            end = min(end, next_cached - 1)
+        start, next_start = next_start, end + 1
+        return start, end
+
+    try:
+        while True:
+            while len(tasks) < concurrency:
+                chunk = next_range()
+                if chunk is None:
+                    break
+                tasks[asyncio.ensure_future(fetch(*chunk))] = chunk
+            while cursor in results:
+                end, logs = results.pop(cursor)
+                yield cursor, end, logs
+                cursor = end + 1
+            if not tasks:
+                break
+
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                start, end = tasks.pop(task)
+                try:
+                    logs = task.result()
+                except LogRangeError as e:
+                    if start == end:
+                        raise
+                    stats["splits"] += 1
+                    middle = e.suggested_end if e.suggested_end is not None and start <= e.suggested_end < end else (start + end) // 2
+                    # Splits go first so the chunks the output waits on are fetched next
+                    retry.extendleft([(middle + 1, end), (start, middle)])
+                    size = max(min(size, middle - start + 1), 1)
+                    continue
+                results[start] = (end, logs)
+                if cache is not None and end <= finalized:
+                    cache.add(key, start, end, logs)
+                if len(logs) < LOGS_TARGET_RESULTS // 4:
+                    size = min(size * 2, LOGS_MAX_CHUNK_SIZE)
+                elif len(logs) > LOGS_TARGET_RESULTS:
+                    size = max(size // 2, 1)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,112 @@
+import os
+import time
+
+from eth_utils import keccak
+
+# Share added to an eth_estimateGas result for the gas limit, 0.2 is 20%
+GAS_LIMIT_MARGIN = float(os.getenv("GAS_LIMIT_MARGIN", "0.2"))
+# Seconds the code hash of a recipient is remembered
+GAS_CODE_CACHE_TTL = float(os.getenv("GAS_CODE_CACHE_TTL", "300"))
+
+# Gas of a plain ETH transfer to an address without code, exact, no margin needed
+TRANSFER_GAS = 21000
+# Intrinsic gas per calldata byte (EIP-2028) and of a contract creation (EIP-2, EIP-3860)
+ZERO_BYTE_GAS = 4
+NONZERO_BYTE_GAS = 16
+CREATE_GAS = 32000
+INITCODE_WORD_GAS = 2
+EMPTY_CODE_HASH = "0x" + keccak(b"").hex()
+
+def _calldata(data):
+    if not data:
+        return b""
+    return bytes.fromhex(data[2:] if data.startswith("0x") else data)
+
+def intrinsic_gas(tx):
+    """Gas a transaction costs before any code runs; nodes reject lower limits outright"""
+    data = _calldata(tx.get("data"))
+    zeros = data.count(0)
+    gas = TRANSFER_GAS + zeros * ZERO_BYTE_GAS + (len(data) - zeros) * NONZERO_BYTE_GAS
+    if not tx.get("to"):
+        gas += CREATE_GAS + (len(data) + 31) // 32 * INITCODE_WORD_GAS
+    return gas
+
+class GasEstimator:
+    """Gas limits from eth_estimateGas plus a margin, cached by transaction shape.
+
+    Transactions of the same shape, i.e. the same chain, recipient code
+    (by hash, so every copy of a token contract shares it), function
+    selector and calldata size (within a factor of two, for bytes and
+    array arguments), cost about the same gas, so only the first one of a
+    shape is estimated. A cached estimate rises to the highest gas use seen
+    and is dropped when a transaction runs out of gas or can't be sent.
+    Limits never go below the intrinsic gas of the actual calldata.
+    """
+
+    def __init__(self, margin=GAS_LIMIT_MARGIN, code_ttl=GAS_CODE_CACHE_TTL):
+        self.margin = margin
+        self.code_ttl = code_ttl
+        self.hits = 0
+        self.misses = 0
+        self._code_hashes = {}
+        self._estimates = {}
+
+    async def code_hash(self, w3, chain_id, address):
+        """keccak of the code at address, EMPTY_CODE_HASH for accounts and contract creations"""
+        if not address:
+            return EMPTY_CODE_HASH
+        key = (chain_id, address.lower())
+        cached = self._code_hashes.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        code_hash = "0x" + keccak(bytes(await w3.eth.get_code(address))).hex()
+        self._code_hashes[key] = (time.monotonic() + self.code_ttl, code_hash)
+        return code_hash
+
+    @staticmethod
+    def shape(chain_id, code_hash, data):
+        """Cache key of a transaction: chain, recipient code hash, function selector
+        and calldata size bucket (bit length of the byte count)"""
+        selector = data[:10].lower() if data and len(data) >= 10 else None
+        return (chain_id, code_hash, selector, len(_calldata(data)).bit_length())
+
+    def with_margin(self, estimate, code_hash):
+        if code_hash == EMPTY_CODE_HASH and estimate == TRANSFER_GAS:
+            return estimate
+        return int(estimate * (1 + self.margin))
+
+    async def gas_limit(self, w3, chain_id, tx):
+        """Gas limit for a transaction dict (from, to, value, data)
+
+        Returns:
+            (gas limit, shape, "cache" or "estimate")
+        """
+        code_hash = await self.code_hash(w3, chain_id, tx.get("to"))
+        shape = self.shape(chain_id, code_hash, tx.get("data"))
+        if shape in self._estimates:
+            self.hits += 1
+            limit = max(self.with_margin(self._estimates[shape], code_hash), intrinsic_gas(tx))
+            return limit, shape, "cache"
+        self.misses += 1
+        estimate = await w3.eth.estimate_gas(tx)
+        self._estimates[shape] = estimate
+        return self.with_margin(estimate, code_hash), shape, "estimate"
+
+    def observe(self, shape, gas_limit, gas_used, status):
+        """Learn from a mined transaction of a shape"""
+        if shape not in self._estimates:
+            return
+        if status == 0 and gas_used >= gas_limit:
+            # Out of gas: estimate this shape afresh next time
+            del self._estimates[shape]
+        elif gas_used > self._estimates[shape]:
+            self._estimates[shape] = gas_used
+
+    def forget(self, shape):
+        """Estimate a shape afresh next time, e.g. after its transaction was rejected"""
+        self._estimates.pop(shape, None)
+
+    def stats(self):
+        return {"shapes": len(self._estimates), "hits": self.hits, "misses": self.misses, "margin": self.margin}
+
+gas_estimator = GasEstimator()
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+import uuid
+
+from datetime import datetime
+from tinydb import Query
+
+logger = logging.getLogger(__name__)
+
+# Number of jobs running at the same time, the rest wait in the queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Log lines kept per job
+JOB_LOG_LINES = int(os.getenv("JOB_LOG_LINES", "200"))
+# Seconds log lines are collected in memory before they are written to the database
+JOB_LOG_FLUSH_INTERVAL = float(os.getenv("JOB_LOG_FLUSH_INTERVAL", "2"))
+
+UNFINISHED = ("queued", "running")
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+class Job:
+    """Handle passed to a job handler to report back while it runs."""
+
+    def __init__(self, manager, record):
+        self._manager = manager
+        self.job_id = record["job_id"]
+        self.kind = record["kind"]
+        self.params = record["params"]
+        self.attempt = record["attempts"]
+        # What earlier attempts stored with remember()
+        self.saved = dict(record.get("saved") or {})
+
+    @property
+    def resumed(self):
+        """True when an earlier attempt was interrupted by a server restart"""
+        return self.attempt > 1
+
+    def log(self, message):
+        logger.info(f"[job {self.job_id}] {message}")
+        self._manager._append_log(self.job_id, message)
+
+    def remember(self, **values):
+        """Store values with the job record right away, so an attempt resumed
+        after a restart finds them in job.saved"""
+        self.saved.update(values)
+        self._manager._update(self.job_id, {"saved": self.saved})
+
+    def set_stage(self, stage, done=None, total=None):
+        fields = {"stage": stage}
+        if done is not None and total:
+            fields["progress"] = round(done / total, 2)
+        self._manager._update(self.job_id, fields)
+
+class JobManager:
+    """Runs long operations such as devnet creation in the background.
+
+    Jobs are stored in the database as "job" records, so their status,
+    progress and logs can be polled with get_job/list_jobs and jobs that
+    were queued or running when the server stopped are picked up again on
+    the next start. A fixed number of workers bounds how many jobs run at once.
+    """
+
+    def __init__(self, db, workers=JOB_WORKERS, log_flush_interval=JOB_LOG_FLUSH_INTERVAL):
+        self.db = db
+        self.workers = workers
+        self.log_flush_interval = log_flush_interval
+        self._handlers = {}
+        self._queue = None
+        self._worker_tasks = []
+        # job ID -> log lines not written to the database yet
+        self._pending_logs = {}
+        self._flush_handle = None
+
+    def register(self, kind, handler):
+        """Register the async handler running jobs of `kind`.
+
+        The handler receives a Job and returns the job result, raising on failure.
+        """
+        self._handlers[kind] = handler
+
+    def _update(self, job_id, fields):
+        self.db.update(fields, (Query().type == "job") & (Query().job_id == job_id))
+
+    def _append_log(self, job_id, message):
+        # Every database write rewrites the whole file, so lines are written
+        # in batches, every log_flush_interval seconds and when the job ends
+        lines = self._pending_logs.setdefault(job_id, [])
+        lines.append(f"{datetime.now().strftime('%H:%M:%S')} {message}")
+        del lines[:-JOB_LOG_LINES]
+        if self._flush_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._flush_logs()
+                return
+            self._flush_handle = loop.call_later(self.log_flush_interval, self._flush_logs)
+
+    def _flush_logs(self, job_id=None):
+        """Write buffered log lines to the database, of one job or of all"""
+        if job_id is None:
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+            pending, self._pending_logs = self._pending_logs, {}
+        else:
+            pending = {job_id: self._pending_logs.pop(job_id, [])}
+        for job_id, lines in pending.items():
+            record = self._get_stored(job_id)
+            if record is None or not lines:
+                continue
+            self._update(job_id, {"logs": (record["logs"] + lines)[-JOB_LOG_LINES:]})
+
+    def _get_stored(self, job_id):
+        records = self.db.search((Query().type == "job") & (Query().job_id == job_id))
+        return records[0] if records else None
+
+    def _with_pending_logs(self, record):
+        lines = self._pending_logs.get(record["job_id"])
+        if lines:
+            # A copy, TinyDB hands out its cached documents
+            record = {**record, "logs": (record["logs"] + lines)[-JOB_LOG_LINES:]}
+        return record
+
+    def get(self, job_id):
+        record = self._get_stored(job_id)
+        return self._with_pending_logs(record) if record is not None else None
+
+    def list(self, status=None, kind=None, limit=20):
+        records = [self._with_pending_logs(record) for record in self.db.search(Query().type == "job")]
+        if status:
+            records = [record for record in records if record["status"] == status]
+        if kind:
+            records = [record for record in records if record["kind"] == kind]
+        records.sort(key=lambda record: record["created_at"], reverse=True)
+        return records[:limit]
+
+    def start(self):
+        """Start the workers and queue jobs left unfinished by a previous process."""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        for record in sorted(self.db.search(Query().type == "job"), key=lambda record: record["created_at"]):
+            if record["status"] in UNFINISHED:
+                self._update(record["job_id"], {"status": "queued"})
+                self._queue.put_nowait(record["job_id"])
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(max(self.workers, 1))]
+
+    async def submit(self, kind, params):
+        """Queue a job and return its record right away."""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self.start()
+        record = {
+            "type": "job",
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "stage": None,
+            "progress": 0.0,
+            "logs": [],
+            "saved": {},
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self.db.insert(record)
+        await self._queue.put(record["job_id"])
+        return record
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Job worker failed on {job_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id):
+        record = self.get(job_id)
+        if record is None or record["status"] not in UNFINISHED:
+            return
+
+        record["attempts"] += 1
+        self._update(job_id, {"status": "running", "attempts": record["attempts"], "started_at": _now()})
+        job = Job(self, record)
+        if job.resumed:
+            job.log(f"Resuming after restart (attempt {job.attempt})")
+
+        try:
+            result = await self._handlers[record["kind"]](job)
+        except Exception as e:
+            job.log(f"Failed: {str(e)}")
+            self._flush_logs(job_id)
+            self._update(job_id, {"status": "failed", "error": str(e), "finished_at": _now()})
+            return
+
+        self._flush_logs(job_id)
+        self._update(job_id, {
+            "status": "succeeded",
+            "progress": 1.0,
+            "result": result,
+            "finished_at": _now(),
+        })
@@ -0,0 +1,137 @@
+import asyncio
+import functools
+import json
+import os
+import time
+
+from contextlib import asynccontextmanager
+
+# Concurrent calls per tool: few devnet creations, many balance reads.
+# TOOL_CONCURRENCY is a JSON object overriding single tools, e.g. {"get_balance": 100}
+DEFAULT_TOOL_CONCURRENCY = int(os.getenv("DEFAULT_TOOL_CONCURRENCY", "32"))
+TOOL_CONCURRENCY = {
+    "create_new_devnet": 2,
+    "create_devnets": 1,
+    "destroy_devnets": 2,
+    "bake_devnet_image": 1,
+    "run_on_devnets": 2,
+    **json.loads(os.getenv("TOOL_CONCURRENCY") or "{}"),
+}
+# Seconds a call may wait for a free slot, and calls waiting per tool at most,
+# before it is turned away with a busy response
+TOOL_QUEUE_TIMEOUT = float(os.getenv("TOOL_QUEUE_TIMEOUT", "30"))
+TOOL_MAX_QUEUE = int(os.getenv("TOOL_MAX_QUEUE", "100"))
+
+class ToolBusy(Exception):
+    """Raised when a tool call can't get a slot: its queue is full or the wait timed out"""
+
+    def __init__(self, tool, reason):
+        super().__init__(f"{tool} is busy: {reason}, retry later")
+        self.tool = tool
+        self.reason = reason
+
+class ToolLimiter:
+    """Bounds the concurrent calls of every tool, queueing the rest for a while.
+
+    One heavy caller (say, a loop of devnet creations) then only holds the
+    slots of that tool and can't starve cheap reads of other sessions:
+
+        async with limiter.slot("create_new_devnet"):
+            ...
+    """
+
+    def __init__(self, limits=None, default=DEFAULT_TOOL_CONCURRENCY, queue_timeout=TOOL_QUEUE_TIMEOUT, max_queue=TOOL_MAX_QUEUE):
+        self.limits = TOOL_CONCURRENCY if limits is None else limits
+        self.default = default
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self._tools = {}
+
+    def _state(self, tool):
+        if tool not in self._tools:
+            limit = self.limits.get(tool, self.default)
+            self._tools[tool] = {
+                "limit": limit,
+                "semaphore": asyncio.Semaphore(limit),
+                "running": 0,
+                "waiting": 0,
+                "rejected": 0,
+                "avg_duration": None,
+            }
+        return self._tools[tool]
+
+    async def acquire(self, tool):
+        """Take one of the tool's slots, waiting up to queue_timeout seconds
+
+        Raises:
+            ToolBusy: More than max_queue calls are waiting already, or no
+                      slot became free within queue_timeout seconds
+        """
+        state = self._state(tool)
+        if state["waiting"] >= self.max_queue:
+            state["rejected"] += 1
+            raise ToolBusy(tool, f"{state['waiting']} calls already queued")
+
+        state["waiting"] += 1
+        try:
+            await asyncio.wait_for(state["semaphore"].acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            state["rejected"] += 1
+            raise ToolBusy(tool, f"no free slot within {self.queue_timeout}s")
+        finally:
+            state["waiting"] -= 1
+        state["running"] += 1
+
+    def release(self, tool, duration=None):
+        """Give a slot back, duration (seconds) feeds the retry_after estimate"""
+        state = self._tools[tool]
+        state["running"] -= 1
+        state["semaphore"].release()
+        if duration is not None:
+            state["avg_duration"] = round(0.8 * state["avg_duration"] + 0.2 * duration, 3) if state["avg_duration"] else round(duration, 3)
+
+    def retry_after(self, tool):
+        """Seconds until a slot is likely free, from the average call duration and the queue length"""
+        state = self._state(tool)
+        return max(1.0, round((state["avg_duration"] or 1.0) * (state["waiting"] + 1) / state["limit"], 1))
+
+    @asynccontextmanager
+    async def slot(self, tool):
+        """Hold one of the tool's slots for the duration of a block"""
+        await self.acquire(tool)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(tool, time.monotonic() - start)
+
+    def status(self):
+        """Limit, running, waiting and rejected calls of every tool called so far"""
+        return {
+            tool: {key: value for key, value in state.items() if key != "semaphore"}
+            for tool, state in sorted(self._tools.items())
+        }
+
+limiter = ToolLimiter()
+
+def limit_tool(fn, name=None):
+    """Wrap an async tool so its calls go through the limiter.
+
+    A call that can't get a slot returns a backpressure response instead
+    of running: {"status": "error", "busy": True, "retry_after": seconds, ...}
+    """
+    name = name or fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        try:
+            await limiter.acquire(name)
+        except ToolBusy as e:
+            return {"status": "error", "error": str(e), "busy": True, "retry_after": limiter.retry_after(name)}
+        start = time.monotonic()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            limiter.release(name, time.monotonic() - start)
+
+    return wrapper
@@ -3,37 +3,62 @@ import secrets
 import asyncio
 import os
 import logging
+import sys
+import time
+import fnmatch
+import functools
+import importlib
 
 from typing import Literal, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
 from fastmcp import FastMCP, Context
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
 
-from eth_account import Account
-from web3 import AsyncWeb3, AsyncHTTPProvider
-from web3.middleware import ExtraDataToPOAMiddleware
 
 from tinydb import TinyDB, Query
+from tinydb.storages import JSONStorage
 
 from ec2 import (
-    get_ec2_instance_public_ip,
+    get_ec2_client,
     get_ec2_instance,
+    describe_ec2_instances_by_ids,
     wait_for_instance_state,
     create_ec2_instance,
+    create_ec2_instances,
+    create_ec2_instance_by_image,
     terminate_ec2_instance,
-    get_ec2_instance_public_ip,
+    terminate_ec2_instances,
+    wait_for_instances_state,
+    wait_for_public_ip,
+    check_security_group_ports,
+    create_ec2_image,
+    describe_ec2_images,
+    deregister_ec2_image,
+    wait_for_image_available,
 )
 
 from ssh import (
-    wait_for_ssh_ready,
-    exec_command,
-    exec_command_interactive,
+    load_private_key,
+    close_ssh_clients,
+    exec_command_async,
+    exec_command_with_status_async,
+    exec_command_stream_async,
+    SSH_LOG_DIR,
 )
 
+from pool import WarmPool
+from jobs import JobManager
+from bootstrap import render_user_data, STATUS_MARKER
+from readiness import wait_for_devnet_ready
+from pipeline import StagePipeline, StageError
+from deploy_timing import DeployTimer, summarize
+from metrics import metrics, instrument_tool, TimedStorage
+from limits import limiter, limit_tool
+
 from dotenv import load_dotenv
 from os.path import join, dirname
 
-from eth_utils import to_hex
-from hexbytes import HexBytes
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
@@ -45,17 +70,95 @@ load_dotenv(dotenv_path)
 ALCHEMY_API_KEY = os.getenv("ALCHEMY_API_KEY")
 ALCHEMY_URL = f"https://eth-mainnet.g.alchemy.com/v2/{ALCHEMY_API_KEY}"
 
-db = TinyDB("db.json")
+db = TinyDB("db.json", storage=TimedStorage(JSONStorage))
+
+# Fleet status results are reused for this many seconds, so dashboards
+# polling every few seconds don't turn into one DescribeInstances call each.
+FLEET_STATUS_TTL = float(os.getenv("FLEET_STATUS_TTL", "10"))
+RPC_PROBE_TIMEOUT = float(os.getenv("RPC_PROBE_TIMEOUT", "3"))
+
+# Number of baked devnet images to keep, older ones are deregistered
+IMAGE_RETENTION = int(os.getenv("IMAGE_RETENTION", "3"))
+# Stops the L1/L2 containers and flushes their data to disk before an image is baked,
+# recording which ones were running
+DEVNET_STOP_COMMAND = os.getenv(
+    "DEVNET_STOP_COMMAND",
+    "docker ps -q > ~/.devnet-containers && docker ps -q | xargs -r docker stop && sync",
+)
+# Brings the baked L1/L2 containers back up, on the source after baking and on an
+# instance booted from a devnet image. Only the containers that were running are
+# started, oldest (L1) first; one-shot deploy containers stay exited. Images baked
+# without the list restart every container.
+DEVNET_RESTART_COMMAND = os.getenv(
+    "DEVNET_RESTART_COMMAND",
+    "if [ -s ~/.devnet-containers ]; then tac ~/.devnet-containers | xargs -r docker start; "
+    "else docker ps -aq | xargs -r docker restart; fi",
+)
+# How long a cloud-init bootstrapped devnet may take until both RPCs serve
+DEVNET_BOOTSTRAP_TIMEOUT = int(os.getenv("DEVNET_BOOTSTRAP_TIMEOUT", "900"))
+# How long the RPCs may take to come up once deploy (or restart) returned
+DEVNET_READY_TIMEOUT = int(os.getenv("DEVNET_READY_TIMEOUT", "120"))
+# Per-command SSH timeouts: short housekeeping commands, trh-sdk deploy and trh-sdk destroy
+SSH_COMMAND_TIMEOUT = int(os.getenv("SSH_COMMAND_TIMEOUT", "120"))
+DEVNET_DEPLOY_TIMEOUT = int(os.getenv("DEVNET_DEPLOY_TIMEOUT", "1800"))
+DEVNET_DESTROY_TIMEOUT = int(os.getenv("DEVNET_DESTROY_TIMEOUT", "600"))
+# Characters of stdout/stderr kept per host in run_on_devnets results
+RUN_OUTPUT_TAIL = int(os.getenv("RUN_OUTPUT_TAIL", "2000"))
+# Start watching every saved account on a chain once get_balance asks for one of them there
+BALANCE_WATCH_AUTO = os.getenv("BALANCE_WATCH_AUTO", "true").lower() == "true"
+# Also on endpoints billing compute units (RPC_METERED_HOSTS, e.g. the default mainnet
+# URL), where following every block spends the budget; watch_balances works there regardless
+BALANCE_WATCH_AUTO_METERED = os.getenv("BALANCE_WATCH_AUTO_METERED", "false").lower() == "true"
+# Load web3, eth_account, boto3 and paramiko in the background right after
+# the server starts, instead of on the first tool call needing them
+PREWARM = os.getenv("PREWARM", "true").lower() == "true"
+# "stdio" for a single client spawning the server, "streamable-http" to share
+# one server between many agents
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio")
+MCP_HOST = os.getenv("MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.getenv("MCP_PORT", "9000"))
+MCP_PATH = os.getenv("MCP_PATH", "/mcp")
+
+_fleet_status_cache = {"expires_at": 0.0, "result": None}
+_fleet_status_lock = asyncio.Lock()
+_background_tasks = set()
+# (chain ID, lowercase token address) -> {"symbol": ..., "decimals": ...}, backed by the DB
+_token_metadata = {}
+# chain ID -> whether Multicall3 is deployed
+_multicall_deployed = {}
+# (url, type) -> BalanceWatcher
+_balance_watchers = {}
+# instance ID -> asyncio.Lock, one snapshot or reset per devnet at a time
+_devnet_locks = {}
 
-mcp = FastMCP(
+warm_pool = WarmPool(db)
+job_manager = JobManager(db)
+
+class InstrumentedFastMCP(FastMCP):
+    """FastMCP whose tools record call counts, errors and latency in metrics
+    and go through the per-tool concurrency limiter"""
+
+    def tool(self, *args, **kwargs):
+        register = super().tool(*args, **kwargs)
+        name = kwargs.get("name")
+        return lambda fn: register(instrument_tool(limit_tool(fn, name), name))
+
+mcp = InstrumentedFastMCP(
     name="MyServer"
 )
 
+@functools.lru_cache(maxsize=64)
 def get_web3(url: str, type:Literal["Layer1", "Layer2"]="Layer2"):
+    # One client per endpoint, shared by all tools and sessions.
+    # web3 is loaded by the first RPC tool call (or the pre-warm), not at server start
+    from web3 import AsyncWeb3
+    from web3.middleware import ExtraDataToPOAMiddleware
+    from rpc import make_provider
+
     if type == "Layer2":
-        return AsyncWeb3(AsyncHTTPProvider(url))
+        return AsyncWeb3(make_provider(url))
     else:
-        w3 = AsyncWeb3(AsyncHTTPProvider(url))
+        w3 = AsyncWeb3(make_provider(url))
         w3.middleware_onion.inject(ExtraDataToPOAMiddleware(), layer=0)
         return w3
 
@@ -63,21 +166,98 @@ def get_web3(url: str, type:Literal["Layer1", "Layer2"]="Layer2"):
 
 @mcp.tool()
 async def get_balance(address: str, url: str=ALCHEMY_URL, type:Literal["Layer1", "Layer2"]="Layer2") -> dict:
-    """Get the balance of an Ethereum address."""
-    if type == "Layer2":
-        w3 = AsyncWeb3(AsyncHTTPProvider(url))
-    else:
-        w3 = AsyncWeb3(AsyncHTTPProvider(url))
-        w3.middleware_onion.inject(ExtraDataToPOAMiddleware(), layer=0)
+    """Get the balance of an Ethereum address.
+
+    Balances of watched addresses (see watch_balances) are answered from
+    memory, with the block they were read at as block_number.
+    """
+    watcher = _balance_watchers.get((url, type))
+    local = watcher.lookup(address) if watcher else None
+    if local:
+        balance, block_number = local
+        return {"address": address, "balance": balance, "block_number": block_number, "source": "watch"}
+
+    w3 = get_web3(url, type)
     balance = await w3.eth.get_balance(address)
+    if BALANCE_WATCH_AUTO and (watcher is None or not watcher.running) and db.search(
+        (Query().type == "account") & (Query().address == address)
+    ):
+        from rpc import routes_to_metered
+
+        if BALANCE_WATCH_AUTO_METERED or not routes_to_metered(url):
+            _balance_watcher(url, type).start()
     return {
         "address": address,
         "balance": balance
     }
 
+def _balance_watcher(url: str, type: Literal["Layer1", "Layer2"]):
+    """The balance watcher of a chain, created watching every saved account"""
+    from balance_tracker import BalanceWatcher
+    from rpc import mask_url
+
+    key = (url, type)
+    if key not in _balance_watchers:
+        accounts = [account["address"] for account in db.search(Query().type == "account")]
+        _balance_watchers[key] = BalanceWatcher(get_web3(url, type), f"{type} {mask_url(url)}", accounts)
+    return _balance_watchers[key]
+
+@mcp.tool()
+async def watch_balances(
+    addresses: list[str] = None,
+    url: str = ALCHEMY_URL,
+    type: Literal["Layer1", "Layer2"] = "Layer2",
+) -> dict:
+    """Keep the ETH balances of addresses in memory, so get_balance answers them without RPC calls.
+
+    Every saved account is watched by default. Balances are refreshed for
+    each new block that touches a watched address (transactions, fees,
+    withdrawals, logs naming it) and all of them periodically, catching
+    ETH sent by contracts. The watcher stops after BALANCE_WATCH_IDLE
+    seconds without get_balance answers.
+
+    Args:
+        addresses: Addresses to watch besides the saved accounts
+    Returns:
+        {
+            "name": "Layer2 https://eth-mainnet.g.alchemy.com/...",
+            "running": True,
+            "watched": 3,
+            "block_number": 22640000,
+            "multicall": True,
+            "blocks": 12, "refreshed": 5, "reconciliations": 1, "local_answers": 40, "errors": 0,
+            "balances": {"0x742d...": {"balance": 1000000000000000000, "block_number": 22639998}}
+        }
+    """
+    watcher = _balance_watcher(url, type)
+    added = watcher.watch(addresses or [])
+    if watcher.polled_at is None or added:
+        await watcher.poll()
+    watcher.start()
+    return watcher.status()
+
+@mcp.tool()
+async def unwatch_balances(
+    addresses: list[str] = None,
+    url: str = ALCHEMY_URL,
+    type: Literal["Layer1", "Layer2"] = "Layer2",
+) -> dict:
+    """Stop watching addresses, or stop the chain's balance watcher entirely without addresses."""
+    watcher = _balance_watchers.get((url, type))
+    if watcher is None:
+        return {"message": "No balance watcher for this chain"}
+    if addresses:
+        watcher.unwatch(addresses)
+        return watcher.status()
+    watcher.stop()
+    del _balance_watchers[(url, type)]
+    return {"message": f"Stopped watching balances on {watcher.name}"}
+
 @mcp.tool()
 async def create_account(number_of_accounts: int=1) -> dict:
     """Create a new Ethereum account."""
+    from eth_account import Account
+
     accounts = []
     for i in range(number_of_accounts):
         private_key = "0x" + secrets.token_hex(32)
@@ -88,6 +268,8 @@ async def create_account(number_of_accounts: int=1) -> dict:
 @mcp.tool()
 async def create_account_from_mnemonic(mnemonic: str, index: int=0, passphrase: str="") -> dict:
     """Create a new Ethereum account from a mnemonic."""
+    from eth_account import Account
+
     Account.enable_unaudited_hdwallet_features()
     path = f"m/44'/60'/0'/0/{index}"
     account = Account.from_mnemonic(mnemonic, passphrase, path)
@@ -107,12 +289,16 @@ async def save_account(address: str, private_key: str) -> dict:
             "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         }
     )
+    for watcher in _balance_watchers.values():
+        watcher.watch([address])
     return {"message": "Account saved successfully"}
 
 @mcp.tool()
 async def save_many_accounts(accounts: list[dict]) -> dict:
     """Save multiple Ethereum accounts to the database."""
     db.insert_multiple(accounts)
+    for watcher in _balance_watchers.values():
+        watcher.watch([account["address"] for account in accounts if account.get("address")])
     return {"message": "Accounts saved successfully"}
 
 @mcp.tool()
@@ -131,6 +317,8 @@ async def delete_account(address: str) -> dict:
     Account = Query()
     removed = db.remove(Account.address == address)
     if removed:
+        for watcher in _balance_watchers.values():
+            watcher.unwatch([address])
         return {"message": f"Account {address} deleted successfully"}
     return {"message": f"Account {address} not found"}
 
@@ -145,7 +333,9 @@ async def send_transaction(
     to_address: str,
     amount_ether: float,
     type: str = "Layer2",
-    url: str = ALCHEMY_URL
+    url: str = ALCHEMY_URL,
+    data: str = None,
+    gas_limit: int = None,
 ) -> Dict[str, Any]:
     """
     Send a transaction between accounts.
@@ -155,10 +345,20 @@ async def send_transaction(
         to_address: Address of the recipient
         amount_ether: Amount of ETH to send
         type: Network type ("Layer1" or "Layer2")
+        data: Hex calldata for a contract call
+        gas_limit: Gas limit to use instead of the estimate. Without it the
+                   limit is eth_estimateGas plus GAS_LIMIT_MARGIN, cached per
+                   (chain, recipient code hash, function selector, calldata size)
         
     Returns:
         Dict containing transaction details
     """
+    from eth_account import Account
+    from eth_utils import to_hex
+    from hexbytes import HexBytes
+    from gas import gas_estimator
+
+    shape = None
     try:
         w3 = get_web3(url, type)
         
@@ -169,16 +369,19 @@ async def send_transaction(
         # Convert amount to Wei
         amount_wei = w3.to_wei(amount_ether, 'ether')
         
-        #get gas price
-        gas_price = await w3.eth.gas_price
-        
-        # Get nonce
-        nonce = await w3.eth.get_transaction_count(address_from)
-        
-        # Get chain ID
-        chain_id = await w3.eth.chain_id
+        # Gas price, nonce and chain ID in one round trip
+        gas_price, nonce, chain_id = await asyncio.gather(
+            w3.eth.gas_price,
+            w3.eth.get_transaction_count(address_from),
+            w3.eth.chain_id,
+        )
 
-        gas_limit = 200000  # Reduced from 200000
+        gas_limit_source = "override"
+        if gas_limit is None:
+            call = {'from': address_from, 'to': to_address, 'value': amount_wei}
+            if data:
+                call['data'] = data
+            gas_limit, shape, gas_limit_source = await gas_estimator.gas_limit(w3, chain_id, call)
         
         # Use dynamic maxFeePerGas based on current gas price
         max_fee_per_gas = min(gas_price * 2, 2000000000)  # Cap at 2 Gwei
@@ -193,6 +396,8 @@ async def send_transaction(
             'maxPriorityFeePerGas': 1000000000, # 1 Gwei
             'chainId': chain_id
         }
+        if data:
+            tx_raw['data'] = data
         
         # Sign transaction
         signed_tx = w3.eth.account.sign_transaction(tx_raw, from_private_key)
@@ -202,6 +407,8 @@ async def send_transaction(
         
         # Wait for transaction receipt
         receipt = await w3.eth.wait_for_transaction_receipt(tx_hash)
+        if shape:
+            gas_estimator.observe(shape, gas_limit, receipt.gasUsed, receipt.status)
 
         # Convert receipt to dictionary
         receipt_dict = dict(receipt)
@@ -229,7 +436,9 @@ async def send_transaction(
                 "hash": to_hex(tx_hash),
                 "block_number": receipt.blockNumber,
                 "gas": receipt.gasUsed,
-                "gasPrice": gas_price
+                "gasPrice": gas_price,
+                "gas_limit": gas_limit,
+                "gas_limit_source": gas_limit_source,
             },
             "hash": to_hex(tx_hash),
             "status": "success"
@@ -237,6 +446,9 @@ async def send_transaction(
         
     except Exception as e:
         logger.error(f"Transaction failed: {str(e)}")
+        if shape:
+            # The limit may have been too low to be accepted, don't hand it out again
+            gas_estimator.forget(shape)
         return {
             "status": "error",
             "error": str(e)
@@ -283,42 +495,355 @@ async def get_block_by_number(block_number: int, url: str=ALCHEMY_URL, type:Lite
         "hash": block.hash.hex()
     }
 
+async def _resolve_block(w3, block) -> int:
+    """A block number, hex string or tag ("latest", "safe", "finalized", ...) as a block number"""
+    if isinstance(block, int):
+        return block
+    if block.isdigit():
+        return int(block)
+    if block.startswith("0x"):
+        return int(block, 16)
+    return (await w3.eth.get_block(block)).number
+
+async def _finalized_block(w3) -> int:
+    """The chain's finalized block, or LOGS_FINALITY_DEPTH blocks behind the head without the tag"""
+    from event_logs import LOGS_FINALITY_DEPTH
+
+    try:
+        return (await w3.eth.get_block("finalized")).number
+    except Exception:
+        return await w3.eth.block_number - LOGS_FINALITY_DEPTH
+
+@mcp.tool()
+async def get_logs(
+    address: str | list[str] = None,
+    topics: list = None,
+    from_block: int | str = 0,
+    to_block: int | str = "latest",
+    url: str = ALCHEMY_URL,
+    type: Literal["Layer1", "Layer2"] = "Layer2",
+    max_logs: int = 10000,
+    concurrency: int = None,
+    ctx: Context = None,
+) -> dict:
+    """Get contract event logs over a block range, e.g. bridge deposits or token Transfers.
+
+    Large ranges are fetched in chunks, several at a time: a chunk the
+    provider rejects as too large is split and later chunks shrink, sparse
+    chunks make later chunks grow. Chunks are reported as progress in block
+    order. Logs of finalized blocks are cached, so repeating a query only
+    fetches the blocks added since.
+
+    Args:
+        address: Contract address, or a list of them; None for every contract
+        topics: Topic filter as in eth_getLogs, e.g. [Transfer event signature hash, None, padded recipient]
+        from_block: First block (number, hex or tag such as "finalized"), inclusive
+        to_block: Last block, inclusive
+        max_logs: Stop after the chunk reaching this many logs; next_block tells where to continue
+        concurrency: Chunks fetched at the same time (default: LOGS_CONCURRENCY)
+    Returns:
+        {
+            "from_block": 0,
+            "to_block": 120000,
+            "count": 2,
+            "logs": [{"address": "0x...", "topics": ["0x..."], "data": "0x...", "blockNumber": 118000,
+                      "transactionHash": "0x...", "logIndex": 3, ...}],
+            "truncated": False,
+            "next_block": None,
+            "requests": 14,
+            "splits": 1,
+            "cached_chunks": 0,
+            "elapsed": 2.1
+        }
+    """
+    from event_logs import LOGS_CONCURRENCY, cache_key, iter_logs, log_cache, logs_from_response
+
+    w3 = get_web3(url, type)
+    start_block = await _resolve_block(w3, from_block)
+    end_block = await _resolve_block(w3, to_block)
+    finalized = await _finalized_block(w3)
+    log_filter = {"topics": topics or []}
+    if address:
+        log_filter["address"] = address
+
+    async def request(start: int, end: int) -> list:
+        params = {**log_filter, "fromBlock": hex(start), "toBlock": hex(end)}
+        return logs_from_response(await w3.provider.make_request("eth_getLogs", [params]), start)
+
+    log_progress = _progress_logger(ctx)
+    stats = {}
+    logs = []
+    next_block = None
+    started = time.monotonic()
+    chunks = iter_logs(
+        request,
+        start_block,
+        end_block,
+        concurrency=concurrency or LOGS_CONCURRENCY,
+        cache=log_cache,
+        key=cache_key(url, address, topics),
+        finalized=finalized,
+        stats=stats,
+    )
+    try:
+        async for chunk_start, chunk_end, chunk_logs in chunks:
+            logs.extend(chunk_logs)
+            log_progress(f"blocks {chunk_start}-{chunk_end}: {len(chunk_logs)} logs ({len(logs)} total)")
+            if len(logs) >= max_logs and chunk_end < end_block:
+                next_block = chunk_end + 1
+                break
+    finally:
+        await chunks.aclose()
+
+    return {
+        "from_block": start_block,
+        "to_block": end_block,
+        "count": len(logs),
+        "logs": logs,
+        "truncated": next_block is not None,
+        "next_block": next_block,
+        **stats,
+        "elapsed": round(time.monotonic() - started, 2),
+    }
+
+def _eth_caller(w3, block_number: int):
+    """An eth_call(to, data) at a fixed block, so every batch of a query sees the same state"""
+    async def eth_call(to: str, data: bytes) -> bytes:
+        return await w3.eth.call({"to": to, "data": data}, block_number)
+
+    return eth_call
+
+async def _load_token_metadata(chain_id: int, tokens: list, eth_call, multicall: bool, stats: dict) -> dict:
+    """Symbol and decimals of tokens, from memory, the DB or, once per chain and token, the chain"""
+    from multicall import DECIMALS, SYMBOL, aggregate, decode_symbol, decode_uint
+
+    missing = []
+    for token in tokens:
+        key = (chain_id, token.lower())
+        if key in _token_metadata:
+            continue
+        stored = db.search(
+            (Query().type == "token_metadata") & (Query().chain_id == chain_id) & (Query().address == token.lower())
+        )
+        if stored:
+            _token_metadata[key] = {"symbol": stored[0]["symbol"], "decimals": stored[0]["decimals"]}
+        else:
+            missing.append(token)
+
+    if missing:
+        calls = [(token, selector) for token in missing for selector in (DECIMALS, SYMBOL)]
+        results = await aggregate(eth_call, calls, multicall=multicall, stats=stats)
+        for i, token in enumerate(missing):
+            decimals = decode_uint(*results[2 * i])
+            if decimals is None:
+                # Not an ERC-20, or the call failed: don't remember it
+                continue
+            metadata = {"symbol": decode_symbol(*results[2 * i + 1]), "decimals": decimals}
+            _token_metadata[(chain_id, token.lower())] = metadata
+            db.insert({"type": "token_metadata", "chain_id": chain_id, "address": token.lower(), **metadata})
+    return {token: _token_metadata.get((chain_id, token.lower())) for token in tokens}
+
+@mcp.tool()
+async def get_token_balances(
+    holders: list[str],
+    tokens: list[str],
+    url: str = ALCHEMY_URL,
+    type: Literal["Layer1", "Layer2"] = "Layer2",
+) -> dict:
+    """Get the ERC-20 balances of many holders across many tokens.
+
+    The balanceOf calls of every (holder, token) pair are packed into
+    Multicall3 aggregate3 requests run concurrently, all at the same block.
+    Chains without Multicall3 fall back to one eth_call per pair. Token
+    symbol and decimals are fetched once per chain and kept in the DB.
+
+    Args:
+        holders: Addresses to get the balances of
+        tokens: ERC-20 token contract addresses
+    Returns:
+        {
+            "chain_id": 1,
+            "block_number": 22640000,
+            "tokens": {"0xdAC1...": {"symbol": "USDT", "decimals": 6}},
+            "balances": {
+                "0x742d...": {"0xdAC1...": {"symbol": "USDT", "raw": 1500000, "balance": "1.5"}}
+            },
+            "calls": 1,
+            "requests": 1,
+            "multicall": True,
+            "elapsed": 0.3
+        }
+        raw and balance are None where the balanceOf call failed, balance
+        also where the token's decimals() failed.
+    """
+    from decimal import Decimal
+    from eth_utils import to_checksum_address
+    from multicall import BALANCE_OF, MULTICALL3_ADDRESS, address_call, aggregate, decode_uint
+
+    started = time.monotonic()
+    holders = [to_checksum_address(holder) for holder in holders]
+    tokens = [to_checksum_address(token) for token in tokens]
+    w3 = get_web3(url, type)
+    chain_id = await w3.eth.chain_id
+    block_number = await w3.eth.block_number
+    if chain_id not in _multicall_deployed:
+        _multicall_deployed[chain_id] = len(await w3.eth.get_code(MULTICALL3_ADDRESS)) > 0
+    multicall = _multicall_deployed[chain_id]
+    eth_call = _eth_caller(w3, block_number)
+
+    stats = {}
+    metadata = await _load_token_metadata(chain_id, tokens, eth_call, multicall, stats)
+    pairs = [(holder, token) for holder in holders for token in tokens]
+    results = await aggregate(
+        eth_call, [(token, address_call(BALANCE_OF, holder)) for holder, token in pairs], multicall=multicall, stats=stats
+    )
+
+    balances = {holder: {} for holder in holders}
+    for (holder, token), result in zip(pairs, results):
+        raw = decode_uint(*result)
+        info = metadata[token] or {}
+        balance = None
+        if raw is not None and info.get("decimals") is not None:
+            balance = f"{Decimal(raw).scaleb(-info['decimals']).normalize():f}"
+        balances[holder][token] = {"symbol": info.get("symbol"), "raw": raw, "balance": balance}
+
+    return {
+        "chain_id": chain_id,
+        "block_number": block_number,
+        "tokens": metadata,
+        "balances": balances,
+        "calls": len(pairs),
+        "requests": stats["requests"],
+        "multicall": multicall,
+        "elapsed": round(time.monotonic() - started, 2),
+    }
+
 @mcp.tool()
-async def create_new_devnet(name: str, ctx: Context = None) -> dict:
+async def create_new_devnet(
+    name: str,
+    use_pool: bool = True,
+    from_image: str = None,
+    bootstrap: Literal["ssh", "cloud-init"] = "ssh",
+    ctx: Context = None,
+) -> dict:
     """Create a new Devnet Layer1 instance.
     
     Args:
         name: Name of the devnet instance
+        use_pool: Claim a pre-booted instance from the warm pool when one is
+                  available, falling back to creating a new instance
+        from_image: Boot from a baked devnet image (see bake_devnet_image) and
+                    only restart the nodes instead of running trh-sdk deploy.
+                    Either an image ID or "latest".
+        bootstrap: "ssh" prepares docker and deploys over SSH after boot.
+                   "cloud-init" passes both as EC2 user data, so the deploy
+                   starts at boot and the server only waits for the RPCs.
         ctx: MCP Context object, automatically provided when called from MCP client
              (e.g., Claude Desktop). None when called from regular Python code.
     """
-    # Helper function to handle progress reporting
-    # Uses Context.report_progress when available (MCP client calls)
-    # Falls back to regular logging when Context is None (direct Python calls)
+    return await _create_devnet(
+        name,
+        _progress_logger(ctx),
+        use_pool=use_pool,
+        from_image=from_image,
+        bootstrap=bootstrap,
+    )
+
+def _spawn(coro):
+    """Run a coroutine in the background, keeping a reference until it is done
+    so the task isn't garbage collected half way."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+def _progress_logger(ctx: Context = None, prefix: str = ""):
+    """Build a log_progress(message) callback for a tool call.
+
+    Uses Context.report_progress when available (MCP client calls) and
+    falls back to regular logging when Context is None (direct Python calls).
+    """
+    step = 0
+
     def log_progress(message: str):
+        nonlocal step
+        step += 1
+        message = f"{prefix}{message}"
         if ctx:
-            asyncio.create_task(ctx.report_progress(message))
+            _spawn(ctx.report_progress(step, message=message))
         logger.info(message)
 
-    instance_id = create_ec2_instance(name)
-    log_progress(f"Created EC2 instance: {instance_id}")
-    
-    wait_result = wait_for_instance_state(instance_id, "running")
-    log_progress(f"Instance state change result: {wait_result}")
-    
-    public_ip = get_ec2_instance_public_ip(instance_id)
-    log_progress(f"Got public IP: {public_ip}")
-    
-    ssh_ready = wait_for_ssh_ready(public_ip)
-    log_progress(f"SSH ready result: {ssh_ready}")
-    
-    docker_permission = exec_command(public_ip, "sudo chmod 666 /var/run/docker.sock")
-    log_progress(f"Docker permission result: {docker_permission}")
-    
-    deploy_result = exec_command_interactive(public_ip, "trh-sdk deploy")
-    log_progress(f"Deploy result: {deploy_result}")
-    
-    devnet = {
+    return log_progress
+
+async def _create_devnet(
+    name: str,
+    log_progress,
+    use_pool: bool = True,
+    from_image: str = None,
+    bootstrap: str = "ssh",
+    on_stage=None,
+    resume_instance_id: str = None,
+    on_instance=None,
+) -> dict:
+    """Provision one devnet, shared by create_new_devnet and devnet jobs.
+
+    Args:
+        resume_instance_id: Instance of an interrupted earlier attempt; its
+                            creation is skipped and the remaining stages run again
+        on_instance: Optional callback on_instance(instance_id) called as soon
+                     as the instance is launched or claimed from the pool
+    """
+    image = None
+    if from_image:
+        image = await _resolve_devnet_image(from_image)
+        if not image:
+            return {"status": "error", "error": f"Devnet image {from_image} not found or not available"}
+
+    warm = None
+    if use_pool and not image and not resume_instance_id:
+        warm = await warm_pool.claim(name)
+    if warm:
+        log_progress(f"Claimed warm pool instance: {warm['instance_id']} ({warm['mode']})")
+
+    pipeline = _devnet_pipeline(
+        name,
+        log_progress,
+        instance_id=resume_instance_id,
+        warm=warm,
+        image=image,
+        cloud_init=bootstrap == "cloud-init" and not warm,
+        on_instance=on_instance,
+    )
+    try:
+        results, timings = await pipeline.run(on_stage=on_stage)
+    except StageError as e:
+        logger.error(str(e))
+        failed = {"status": "error", "error": str(e), "stage": e.stage, "stage_timings": e.timings}
+        launched = e.results.get("instance")
+        if launched:
+            # Don't leave a half provisioned instance running, it may not even have a record yet
+            await asyncio.to_thread(terminate_ec2_instances, [launched])
+            log_progress(f"Terminated instance {launched} of the failed devnet")
+            failed["terminated_instance_id"] = launched
+            db.update(
+                {"status": "terminated", "error": str(e), "stage_timings": e.timings},
+                (Query().type == "devnet") & (Query().instance_id == launched),
+            )
+        else:
+            db.update(
+                {"status": "failed", "error": str(e), "stage_timings": e.timings},
+                (Query().type == "devnet") & (Query().name == name) & (Query().status == "provisioning"),
+            )
+        return failed
+
+    devnet = results["record"]
+    devnet["stage_timings"] = timings
+    db.update({"stage_timings": timings}, Query().instance_id == devnet["instance_id"])
+    log_progress(f"Devnet {name} provisioned in {timings['total']['duration']:.2f}s")
+    return devnet
+
+def _devnet_record(name: str, instance_id: str, public_ip: str) -> dict:
+    return {
         "type": "devnet",
         "name": name,
         "instance_id": instance_id,
@@ -327,8 +852,271 @@ async def create_new_devnet(name: str, ctx: Context = None) -> dict:
         "layer1_url": f"http://{public_ip}:8545",
         "layer2_url": f"http://{public_ip}:9545",
     }
-    db.insert(devnet)
-    return devnet
+
+def _devnet_pipeline(
+    name: str,
+    log_progress,
+    instance_id: str = None,
+    warm: dict = None,
+    image: dict = None,
+    cloud_init: bool = False,
+    store: bool = True,
+    on_instance=None,
+) -> StagePipeline:
+    """Build the provisioning stages of one devnet as a dependency graph.
+
+    The public IP is known while the instance is still pending, so SSH
+    probing starts before EC2 reports "running", and key loading, the
+    security group check and the DB record run next to the boot.
+    Blocking EC2/SSH calls run in worker threads.
+
+    Args:
+        name: Name of the devnet
+        log_progress: Progress callback taking a message
+        instance_id: Instance already launched by the caller (create_devnets)
+        warm: Claimed warm pool record, skips boot (and deploy in "deployed" mode)
+        image: Baked devnet image to boot from, restarts instead of deploying
+        cloud_init: Prepare docker and deploy from EC2 user data at boot
+        store: Insert the devnet record as soon as the instance exists and
+               keep it up to date. create_devnets stores its records in one batch instead.
+        on_instance: Optional callback on_instance(instance_id) once the instance exists
+    Returns:
+        The pipeline; after run() the final devnet record is results["record"]
+    """
+    pipeline = StagePipeline()
+
+    async def load_key(results):
+        return await asyncio.to_thread(load_private_key)
+
+    async def security_check(results):
+        try:
+            missing = await asyncio.to_thread(check_security_group_ports, [22, 8545, 9545])
+        except Exception as e:
+            # Advisory only, the IAM user may not be allowed to describe security groups
+            log_progress(f"Security group check skipped: {str(e)}")
+            return None
+        if missing:
+            log_progress(f"Warning: security groups don't open ports {missing} to the internet")
+        return missing
+
+    async def create_instance(results):
+        if instance_id:
+            return instance_id
+        launching = asyncio.ensure_future(launch())
+        try:
+            new_id = await asyncio.shield(launching)
+        except asyncio.CancelledError:
+            # Another stage failed mid-launch; the instance comes up anyway, terminate it then
+            launching.add_done_callback(_terminate_launched)
+            raise
+        if on_instance:
+            on_instance(new_id)
+        return new_id
+
+    def _terminate_launched(task):
+        if not task.cancelled() and task.exception() is None:
+            _spawn(asyncio.to_thread(terminate_ec2_instances, [task.result()]))
+
+    async def launch():
+        if warm:
+            return warm["instance_id"]
+        user_data = None
+        if cloud_init:
+            user_data = render_user_data(DEVNET_RESTART_COMMAND if image else "trh-sdk deploy")
+        if image:
+            new_id, _ = await asyncio.to_thread(create_ec2_instance_by_image, name, image["image_id"], user_data)
+            log_progress(f"Created EC2 instance: {new_id} from image {image['image_id']} (v{image['version']})")
+        else:
+            new_id = await asyncio.to_thread(create_ec2_instance, name, user_data)
+            log_progress(f"Created EC2 instance: {new_id}")
+        return new_id
+
+    async def public_ip(results):
+        if warm:
+            return warm["public_ip"]
+        ip = await asyncio.to_thread(wait_for_public_ip, results["instance"])
+        if not ip:
+            raise TimeoutError(f"Instance {results['instance']} got no public IP")
+        log_progress(f"Got public IP: {ip}")
+        return ip
+
+    async def running(results):
+        if warm:
+            return True
+        wait_result = await asyncio.to_thread(wait_for_instance_state, results["instance"], "running", interval=1)
+        log_progress(f"Instance state change result: {wait_result}")
+        return wait_result
+
+    async def db_record(results):
+        devnet = _devnet_record(name, results["instance"], results["public_ip"])
+        devnet["status"] = "provisioning"
+        devnet["from_pool"] = bool(warm)
+        devnet["image_id"] = image["image_id"] if image else None
+        if store:
+            # A resumed attempt finds the record of the interrupted one
+            db.upsert(devnet, Query().instance_id == devnet["instance_id"])
+        return devnet
+
+    async def ssh_ready(results):
+        readiness = await wait_for_devnet_ready(results["public_ip"], ("ssh",), timeout=300)
+        log_progress(f"SSH ready result: {readiness}")
+        if not readiness["ready"]:
+            raise TimeoutError(f"SSH on {results['public_ip']} not ready after {readiness['elapsed']}s")
+        return readiness
+
+    async def docker(results):
+        docker_permission = await exec_command_async(
+            results["public_ip"], "sudo chmod 666 /var/run/docker.sock", timeout=SSH_COMMAND_TIMEOUT
+        )
+        log_progress(f"Docker permission result: {docker_permission}")
+        return docker_permission
+
+    async def restart(results):
+        restart_result = await exec_command_async(results["public_ip"], DEVNET_RESTART_COMMAND, timeout=SSH_COMMAND_TIMEOUT)
+        log_progress(f"Restart result: {restart_result}")
+        return restart_result
+
+    async def deploy(results):
+        # Stream the deploy output to the client as it runs, the full log goes to disk
+        timer = DeployTimer()
+        deploy_result = await exec_command_stream_async(
+            results["public_ip"],
+            "trh-sdk deploy",
+            on_output=lambda lines: log_progress("\n".join(lines)),
+            on_line=timer.feed,
+            timeout=DEVNET_DEPLOY_TIMEOUT,
+            log_path=join(SSH_LOG_DIR, f"{name}-deploy-{datetime.now().strftime('%Y%m%d-%H%M%S')}.log.gz"),
+        )
+        log_progress(
+            f"Deploy finished with exit status {deploy_result['exit_status']} "
+            f"({deploy_result['lines']} lines, full log: {deploy_result['log_path']})"
+        )
+        deploy_result["timings"] = timer.finish()
+        log_progress(f"Deploy stage timings: {deploy_result['timings']}")
+        if deploy_result["exit_status"] != 0:
+            # Fails the pipeline with a StageError for "deploy" instead of waiting out rpc_ready
+            raise RuntimeError(
+                f"trh-sdk deploy exited with status {deploy_result['exit_status']}, "
+                f"full log: {deploy_result['log_path']}"
+            )
+        return deploy_result
+
+    async def rpc_ready(results):
+        # Don't hand out URLs before both layers actually serve requests
+        readiness = await wait_for_devnet_ready(
+            results["public_ip"],
+            ("layer1", "layer2"),
+            timeout=DEVNET_BOOTSTRAP_TIMEOUT if cloud_init else DEVNET_READY_TIMEOUT,
+        )
+        log_progress(f"RPC ready result: {readiness}")
+        if readiness["ready"]:
+            return readiness
+
+        error = f"Devnet RPCs not ready after {readiness['elapsed']}s"
+        if cloud_init:
+            # The bootstrap script leaves a status marker behind, fetch it for the error
+            try:
+                marker, _ = await exec_command_async(
+                    results["public_ip"], f"cat {STATUS_MARKER}", timeout=SSH_COMMAND_TIMEOUT
+                )
+            except Exception as e:
+                marker = f"unavailable ({str(e)})"
+            error += f", bootstrap status: {marker.strip()}"
+        raise TimeoutError(error)
+
+    pipeline.add("load_key", load_key)
+    pipeline.add("security_check", security_check)
+    pipeline.add("instance", create_instance)
+    pipeline.add("public_ip", public_ip, deps=["instance"])
+    pipeline.add("running", running, deps=["instance"])
+    pipeline.add("db_record", db_record, deps=["instance", "public_ip"])
+
+    last = ["running"]
+    if not cloud_init and not warm:
+        pipeline.add("ssh_ready", ssh_ready, deps=["public_ip"])
+        # sshd answering means the instance runs, no need to wait for EC2 to report it
+        pipeline.add("docker", docker, deps=["ssh_ready", "load_key"])
+        last = ["docker"]
+    if not cloud_init:
+        if image:
+            pipeline.add("restart", restart, deps=last + ["load_key"])
+            last = ["restart"]
+        elif not warm or warm["mode"] != "deployed":
+            pipeline.add("deploy", deploy, deps=last + ["load_key"])
+            last = ["deploy"]
+    pipeline.add("rpc_ready", rpc_ready, deps=last + ["public_ip"])
+
+    async def record(results):
+        devnet = results["db_record"]
+        devnet["status"] = "ready"
+        devnet["readiness"] = results["rpc_ready"]["stages"]
+        if "deploy" in results:
+            devnet["deploy_timings"] = results["deploy"]["timings"]
+        if store:
+            db.update(devnet, Query().instance_id == devnet["instance_id"])
+        return devnet
+
+    pipeline.add("record", record, deps=["db_record", "rpc_ready", "security_check"])
+    return pipeline
+
+@mcp.tool()
+async def create_devnets(names: list[str] = None, count: int = None, concurrency: int = 5, ctx: Context = None) -> dict:
+    """Create several Devnet instances in parallel.
+
+    All instances are launched with one RunInstances request, then the SSH
+    setup and trh-sdk deploy stages run concurrently, at most `concurrency`
+    devnets at a time. Successful devnets are written to the database in one batch.
+
+    Args:
+        names: Names of the devnet instances
+        count: Number of devnets to create when names are not given
+        concurrency: Maximum number of devnets being set up at the same time
+        ctx: MCP Context object, automatically provided when called from MCP client
+    """
+    if not names:
+        if not count:
+            return {"status": "error", "error": "Either names or count is required"}
+        prefix = f"devnet-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        names = [f"{prefix}-{i}" for i in range(count)]
+
+    log_progress = _progress_logger(ctx)
+
+    batch = f"devnets-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    instance_ids = await asyncio.to_thread(create_ec2_instances, names, tags={"DevnetBatch": batch})
+    for name, instance_id in zip(names, instance_ids):
+        log_progress(f"[{name}] Created EC2 instance: {instance_id}")
+
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def setup(name: str, instance_id: str):
+        async with semaphore:
+            progress = lambda message: log_progress(f"[{name}] {message}")
+            pipeline = _devnet_pipeline(name, progress, instance_id=instance_id, store=False)
+            results, timings = await pipeline.run()
+            progress(f"Devnet ready in {timings['total']['duration']:.2f}s")
+            devnet = results["record"]
+            devnet["stage_timings"] = timings
+            return devnet
+
+    results = await asyncio.gather(
+        *(setup(name, instance_id) for name, instance_id in zip(names, instance_ids)),
+        return_exceptions=True,
+    )
+
+    devnets = []
+    failed = []
+    for name, instance_id, result in zip(names, instance_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"[{name}] Devnet setup failed: {str(result)}")
+            failed.append({"name": name, "instance_id": instance_id, "error": str(result)})
+        else:
+            devnets.append(result)
+    if failed:
+        await asyncio.to_thread(terminate_ec2_instances, [devnet["instance_id"] for devnet in failed])
+
+    if devnets:
+        db.insert_multiple(devnets)
+    return {"devnets": devnets, "failed": failed}
 
 @mcp.tool()
 async def destroy_devnet(instance_id: str) -> dict:
@@ -337,15 +1125,206 @@ async def destroy_devnet(instance_id: str) -> dict:
     if not devnet:
         return {"message": f"Devnet instance {instance_id} not found"}
     
-    destroy_result = exec_command(devnet[0]["public_ip"], "trh-sdk destroy")
+    destroy_result = await exec_command_async(
+        devnet[0]["public_ip"], "trh-sdk destroy", timeout=DEVNET_DESTROY_TIMEOUT
+    )
     logger.info(f"Destroy result: {destroy_result}")
     
-    terminate_result = terminate_ec2_instance(instance_id)
+    terminate_result = await asyncio.to_thread(terminate_ec2_instance, instance_id)
     logger.info(f"Terminate result: {terminate_result}")
+    close_ssh_clients(devnet[0]["public_ip"])
     
     db.update({'status': 'terminated'}, Query().instance_id == instance_id)
+    _fleet_status_cache["expires_at"] = 0.0
     return {"message": f"Devnet instance {instance_id} destroyed successfully"}
 
+def _select_devnets(instance_ids: list[str] = None, name_filter: str = None) -> list:
+    """Find stored, not yet terminated devnets by instance ID and/or a
+    shell-style name pattern such as "test_devnet_*"."""
+    devnets = [
+        devnet for devnet in db.search(Query().type == "devnet")
+        if devnet.get("status") != "terminated"
+    ]
+    if instance_ids:
+        devnets = [devnet for devnet in devnets if devnet["instance_id"] in instance_ids]
+    if name_filter:
+        devnets = [devnet for devnet in devnets if fnmatch.fnmatch(devnet.get("name", ""), name_filter)]
+    return devnets
+
+@mcp.tool()
+async def destroy_devnets(instance_ids: list[str] = None, name_filter: str = None, wait: bool = False) -> dict:
+    """Destroy several Devnet instances at once.
+
+    trh-sdk destroy runs concurrently on every host that is still running,
+    then all instances are terminated with one TerminateInstances call and
+    the database is updated in one batch.
+
+    Args:
+        instance_ids: Instance IDs of the devnets to destroy
+        name_filter: Shell-style pattern matched against devnet names, e.g. "test_devnet_*"
+        wait: Wait until every instance is terminated before returning
+    """
+    if not instance_ids and not name_filter:
+        return {"status": "error", "error": "Either instance_ids or name_filter is required"}
+
+    devnets = _select_devnets(instance_ids, name_filter)
+    if not devnets:
+        return {"message": "No matching devnet instances found", "destroyed": []}
+
+    ids = [devnet["instance_id"] for devnet in devnets]
+    instances = await asyncio.to_thread(describe_ec2_instances_by_ids, ids)
+
+    async def remote_destroy(devnet: dict):
+        instance = instances.get(devnet["instance_id"])
+        # Skip the SSH step when the host is already gone
+        if not instance or instance["State"]["Name"] != "running":
+            return "skipped"
+        try:
+            result = await exec_command_async(
+                instance["PublicIpAddress"], "trh-sdk destroy", timeout=DEVNET_DESTROY_TIMEOUT
+            )
+            logger.info(f"Destroy result for {devnet['instance_id']}: {result}")
+            return "destroyed"
+        except Exception as e:
+            logger.error(f"trh-sdk destroy failed on {devnet['instance_id']}: {str(e)}")
+            return f"error: {str(e)}"
+
+    remote_results = await asyncio.gather(*(remote_destroy(devnet) for devnet in devnets))
+
+    to_terminate = [
+        instance_id for instance_id in ids
+        if instance_id in instances and instances[instance_id]["State"]["Name"] not in ("shutting-down", "terminated")
+    ]
+    terminate_result = await asyncio.to_thread(terminate_ec2_instances, to_terminate)
+    logger.info(f"Terminate result: {terminate_result}")
+    for devnet in devnets:
+        close_ssh_clients(devnet["public_ip"])
+
+    db.update({'status': 'terminated'}, Query().instance_id.one_of(ids))
+    _fleet_status_cache["expires_at"] = 0.0
+
+    terminated = None
+    if wait:
+        terminated = await asyncio.to_thread(wait_for_instances_state, to_terminate, "terminated")
+
+    return {
+        "destroyed": [
+            {
+                "instance_id": devnet["instance_id"],
+                "name": devnet.get("name"),
+                "remote_destroy": remote_result,
+                "state": terminate_result.get(devnet["instance_id"], "terminated"),
+            }
+            for devnet, remote_result in zip(devnets, remote_results)
+        ],
+        "terminated": terminated,
+    }
+
+@mcp.tool()
+async def run_on_devnets(
+    command: str,
+    instance_ids: list[str] = None,
+    name_filter: str = None,
+    concurrency: int = 10,
+    timeout: float = 300,
+    fail_fast: bool = False,
+    ctx: Context = None,
+) -> dict:
+    """Run a shell command on many devnets at once, e.g. to pull images or collect disk usage.
+
+    The command runs concurrently over the pooled SSH connections, with at
+    most `concurrency` hosts at a time. Without instance_ids or name_filter
+    it runs on every devnet that isn't terminated.
+
+    Args:
+        command: The shell command to run on every host
+        instance_ids: Instance IDs of the devnets to run on
+        name_filter: Shell-style pattern matched against devnet names, e.g. "test_devnet_*"
+        concurrency: Maximum number of hosts running the command at the same time
+        timeout: Seconds for the whole run; hosts still running then are cancelled
+        fail_fast: Cancel the remaining hosts as soon as one fails
+    Returns:
+        {
+            "command": "df -h /",
+            "hosts": 2,
+            "succeeded": 1,
+            "elapsed": 1.4,
+            "results": [
+                {"instance_id": "i-...", "name": "devnet-1", "status": "ok", "exit_status": 0,
+                 "stdout": "...", "stderr": "", "duration": 1.2},
+                {"instance_id": "i-...", "name": "devnet-2", "status": "failed", "exit_status": 1, ...}
+            ]
+        }
+        status is one of "ok", "failed" (non-zero exit), "error" (SSH error),
+        "timeout" (global timeout) and "cancelled" (fail_fast).
+    """
+    devnets = _select_devnets(instance_ids, name_filter)
+    if not devnets:
+        return {"message": "No matching devnet instances found", "hosts": 0, "results": []}
+
+    log_progress = _progress_logger(ctx)
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    results = [
+        {
+            "instance_id": devnet["instance_id"],
+            "name": devnet.get("name"),
+            "public_ip": devnet["public_ip"],
+            "status": "pending",
+            "exit_status": None,
+            "stdout": "",
+            "stderr": "",
+            "duration": None,
+        }
+        for devnet in devnets
+    ]
+
+    async def run_one(result: dict):
+        async with semaphore:
+            result["status"] = "running"
+            start = time.monotonic()
+            try:
+                stdout, stderr, exit_status = await exec_command_with_status_async(result["public_ip"], command)
+                result.update({
+                    "status": "ok" if exit_status == 0 else "failed",
+                    "exit_status": exit_status,
+                    "stdout": stdout[-RUN_OUTPUT_TAIL:],
+                    "stderr": stderr[-RUN_OUTPUT_TAIL:],
+                })
+            except Exception as e:
+                result.update({"status": "error", "stderr": str(e)})
+            finally:
+                result["duration"] = round(time.monotonic() - start, 2)
+        log_progress(f"{result['name']}: {result['status']} in {result['duration']}s")
+
+    start = time.monotonic()
+    deadline = None if timeout is None else start + timeout
+    pending = {asyncio.create_task(run_one(result)) for result in results}
+    stopped = None
+    while pending:
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            stopped = "timeout"
+            break
+        if fail_fast and any(result["status"] in ("failed", "error") for result in results):
+            stopped = "cancelled"
+            break
+
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for result in results:
+        if result["status"] in ("pending", "running"):
+            result["status"] = stopped
+
+    return {
+        "command": command,
+        "hosts": len(results),
+        "succeeded": sum(result["status"] == "ok" for result in results),
+        "elapsed": round(time.monotonic() - start, 2),
+        "results": results,
+    }
+
 @mcp.tool()
 async def check_instance_status(instance_id: str) -> dict:
     """Check the status of an EC2 instance."""
@@ -356,27 +1335,635 @@ async def check_instance_status(instance_id: str) -> dict:
         "public_ip": instance.public_ip_address if instance.public_ip_address else None
     }
 
+@mcp.tool()
+async def wait_for_devnet(
+    instance_id: str,
+    conditions: list[Literal["ssh", "layer1", "layer2"]] = ["ssh", "layer1", "layer2"],
+    timeout: int = 60,
+) -> dict:
+    """Wait until a devnet's SSH and/or Layer1/Layer2 RPCs are serving.
+
+    Returns per-stage ready times as soon as every condition holds, or the
+    stages that are still not ready after the timeout.
+    """
+    devnet = db.search(Query().instance_id == instance_id)
+    if not devnet:
+        return {"message": f"Devnet instance {instance_id} not found"}
+    return await wait_for_devnet_ready(devnet[0]["public_ip"], tuple(conditions), timeout=timeout)
+
 @mcp.tool()
 async def devnet(instance_id: str) -> dict:
     """Get a Devnet instance."""
     return db.search(Query().instance_id == instance_id)
 
 @mcp.tool()
-async def list_all_devnets() -> list:
-    """Get all Devnet instances."""
-    return db.search(Query().type == "devnet")
+async def list_all_devnets(include_status: bool = False) -> list:
+    """Get all Devnet instances.
+
+    Args:
+        include_status: Attach live EC2 state, uptime and RPC reachability
+                        from get_fleet_status to every record
+    """
+    devnets = db.search(Query().type == "devnet")
+    if not include_status:
+        return devnets
+
+    fleet = await get_fleet_status()
+    statuses = {status["instance_id"]: status for status in fleet["devnets"]}
+    return [
+        {**devnet, "live": statuses.get(devnet.get("instance_id"))}
+        for devnet in devnets
+    ]
+
+@mcp.tool()
+async def deploy_timing_report(name_filter: str = None, since: str = None, last: int = None) -> dict:
+    """Aggregate stored deploy timings across devnets, to track regressions over time.
+
+    Every devnet created with a trh-sdk deploy stores the deploy's stage
+    breakdown (setup, L1 startup, L2 startup, contracts, accounts) as
+    deploy_timings and the provisioning stages as stage_timings, including
+    terminated devnets.
+
+    Args:
+        name_filter: Shell-style pattern matched against devnet names, e.g. "test_devnet_*"
+        since: Only devnets created at or after this time, e.g. "2025-06-01"
+        last: Only the most recent `last` devnets
+    Returns:
+        {
+            "deploys": 12,
+            "deploy_total": {"count": 12, "mean": 140.2, "min": ..., "max": ..., "p50": ..., "p90": ..., ...},
+            "deploy_stages": {"l1_startup": {...}, "l2_startup": {...}, ...},
+            "provisioning": {"instance": {...}, "deploy": {...}, "total": {...}}
+        }
+    """
+    devnets = [devnet for devnet in db.search(Query().type == "devnet") if devnet.get("deploy_timings")]
+    if name_filter:
+        devnets = [devnet for devnet in devnets if fnmatch.fnmatch(devnet.get("name", ""), name_filter)]
+    if since:
+        devnets = [devnet for devnet in devnets if devnet.get("created_at", "") >= since]
+    devnets.sort(key=lambda devnet: devnet.get("created_at", ""))
+    if last:
+        devnets = devnets[-last:]
+
+    deploy_stages = {}
+    provisioning = {}
+    for devnet in devnets:
+        for stage, timing in devnet["deploy_timings"]["stages"].items():
+            deploy_stages.setdefault(stage, []).append(timing["duration"])
+        for stage, timing in (devnet.get("stage_timings") or {}).items():
+            provisioning.setdefault(stage, []).append(timing["duration"])
+
+    return {
+        "deploys": len(devnets),
+        "deploy_total": summarize([devnet["deploy_timings"]["total"] for devnet in devnets]),
+        "deploy_stages": {stage: summarize(values) for stage, values in deploy_stages.items()},
+        "provisioning": {stage: summarize(values) for stage, values in provisioning.items()},
+    }
+
+async def probe_rpc(url: str, type: Literal["Layer1", "Layer2"] = "Layer2", timeout: float = RPC_PROBE_TIMEOUT) -> dict:
+    """Check whether an RPC endpoint answers eth_chainId within the timeout."""
+    start = time.monotonic()
+    try:
+        w3 = get_web3(url, type)
+        chain_id = await asyncio.wait_for(w3.eth.chain_id, timeout)
+        return {
+            "reachable": True,
+            "chain_id": chain_id,
+            "latency_ms": round((time.monotonic() - start) * 1000, 1),
+        }
+    except Exception as e:
+        return {"reachable": False, "error": str(e) or e.__class__.__name__}
+
+async def _collect_fleet_status() -> dict:
+    devnets = [
+        devnet for devnet in db.search(Query().type == "devnet")
+        if devnet.get("status") != "terminated"
+    ]
+    instance_ids = [devnet["instance_id"] for devnet in devnets]
+    instances = await asyncio.to_thread(describe_ec2_instances_by_ids, instance_ids)
+
+    now = datetime.now(timezone.utc)
+
+    async def devnet_status(devnet: dict) -> dict:
+        instance = instances.get(devnet["instance_id"])
+        state = instance["State"]["Name"] if instance else "not-found"
+        public_ip = instance.get("PublicIpAddress") if instance else None
+        status = {
+            "instance_id": devnet["instance_id"],
+            "name": devnet.get("name"),
+            "state": state,
+            "public_ip": public_ip,
+            "uptime_seconds": None,
+            "layer1": None,
+            "layer2": None,
+        }
+        if state != "running" or not public_ip:
+            return status
+
+        status["uptime_seconds"] = int((now - instance["LaunchTime"]).total_seconds())
+        status["layer1"], status["layer2"] = await asyncio.gather(
+            probe_rpc(f"http://{public_ip}:8545", "Layer1"),
+            probe_rpc(f"http://{public_ip}:9545", "Layer2"),
+        )
+        return status
+
+    statuses = await asyncio.gather(*(devnet_status(devnet) for devnet in devnets))
+    return {
+        "checked_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "devnets": list(statuses),
+    }
+
+@mcp.tool()
+async def get_fleet_status(refresh: bool = False) -> dict:
+    """Get live state, IPs, uptime and RPC reachability of all stored devnets.
+
+    All instances are described with one DescribeInstances call and the
+    Layer1/Layer2 RPCs are probed concurrently. Results are cached for
+    FLEET_STATUS_TTL seconds.
+
+    Args:
+        refresh: Ignore the cached result and query EC2 again
+    """
+    async with _fleet_status_lock:
+        if not refresh and time.monotonic() < _fleet_status_cache["expires_at"]:
+            return {**_fleet_status_cache["result"], "cached": True}
+
+        result = await _collect_fleet_status()
+        _fleet_status_cache["result"] = result
+        _fleet_status_cache["expires_at"] = time.monotonic() + FLEET_STATUS_TTL
+        return {**result, "cached": False}
+
+async def _refresh_image_states(images: list) -> list:
+    """Update the stored state of images that were still pending."""
+    pending = [image["image_id"] for image in images if image.get("state") == "pending"]
+    if not pending:
+        return images
+    live = await asyncio.to_thread(describe_ec2_images, pending)
+    for image in images:
+        if image["image_id"] in pending:
+            state = live[image["image_id"]]["State"] if image["image_id"] in live else "deregistered"
+            image["state"] = state
+            db.update({"state": state}, Query().image_id == image["image_id"])
+    return images
+
+async def _resolve_devnet_image(image_ref: str):
+    images = await list_devnet_images()
+    available = [image for image in images if image["state"] == "available"]
+    if image_ref == "latest":
+        return available[0] if available else None
+    return next((image for image in available if image["image_id"] == image_ref), None)
+
+@mcp.tool()
+async def list_devnet_images() -> list:
+    """Get all baked devnet images, newest version first."""
+    images = db.search(Query().type == "devnet_image")
+    images = await _refresh_image_states(images)
+    return sorted(images, key=lambda image: image["version"], reverse=True)
+
+@mcp.tool()
+async def bake_devnet_image(instance_id: str, wait: bool = False, no_reboot: bool = False) -> dict:
+    """Snapshot a deployed devnet into a versioned AMI.
+
+    New devnets can boot from the image with create_new_devnet(from_image=...)
+    and skip trh-sdk deploy. Only the newest IMAGE_RETENTION images are kept.
+
+    Args:
+        instance_id: Instance ID of a freshly deployed devnet
+        wait: Wait until the image is available before returning
+        no_reboot: Snapshot the running nodes as they are (faster, but node
+                   data may be captured mid-write). By default the containers
+                   are stopped and synced to disk first and started again
+                   once the snapshot is taken.
+    """
+    devnet = db.search((Query().type == "devnet") & (Query().instance_id == instance_id))
+    if not devnet:
+        return {"message": f"Devnet instance {instance_id} not found"}
+    public_ip = devnet[0]["public_ip"]
+
+    versions = [image["version"] for image in db.search(Query().type == "devnet_image")]
+    version = max(versions, default=0) + 1
+    name = f"tokamak-devnet-v{version}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+    if not no_reboot:
+        # A reboot by CreateImage would leave the containers down, so stop them
+        # ourselves and snapshot without one
+        _, stderr, exit_status = await exec_command_with_status_async(
+            public_ip, DEVNET_STOP_COMMAND, timeout=SSH_COMMAND_TIMEOUT
+        )
+        if exit_status != 0:
+            await exec_command_async(public_ip, DEVNET_RESTART_COMMAND, timeout=SSH_COMMAND_TIMEOUT)
+            return {"message": f"Failed to stop the devnet containers on {instance_id}: {stderr}"}
+
+    source_ready = None
+    try:
+        image_id = await asyncio.to_thread(
+            create_ec2_image,
+            instance_id,
+            name,
+            description=f"Tokamak devnet baked from {instance_id}",
+            tags={"Name": name, "DevnetImageVersion": str(version)},
+            no_reboot=True,
+        )
+    finally:
+        if not no_reboot:
+            # The snapshot is taken at the time of the call, the nodes can come back up
+            await exec_command_async(public_ip, DEVNET_RESTART_COMMAND, timeout=SSH_COMMAND_TIMEOUT)
+            readiness = await wait_for_devnet_ready(public_ip, ("layer1", "layer2"), timeout=DEVNET_READY_TIMEOUT)
+            source_ready = readiness["ready"]
+            if not source_ready:
+                logger.error(f"Devnet {instance_id} RPCs not back up after {readiness['elapsed']}s")
+    logger.info(f"Baking devnet image {image_id} (v{version}) from {instance_id}")
+
+    image = {
+        "type": "devnet_image",
+        "image_id": image_id,
+        "name": name,
+        "version": version,
+        "source_instance_id": instance_id,
+        "state": "pending",
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    db.insert(image)
+
+    if wait:
+        available = await asyncio.to_thread(wait_for_image_available, image_id)
+        image["state"] = "available" if available else "failed"
+        db.update({"state": image["state"]}, Query().image_id == image_id)
+
+    pruned = await prune_devnet_images()
+    return {**image, "source_ready": source_ready, "pruned": pruned["deregistered"]}
+
+@mcp.tool()
+async def prune_devnet_images(keep: int = IMAGE_RETENTION) -> dict:
+    """Deregister all but the newest `keep` devnet images and delete their snapshots."""
+    images = sorted(
+        db.search(Query().type == "devnet_image"),
+        key=lambda image: image["version"],
+        reverse=True,
+    )
+    deregistered = []
+    for image in images[keep:]:
+        try:
+            await asyncio.to_thread(deregister_ec2_image, image["image_id"])
+        except Exception as e:
+            # Most likely still pending, retry on the next prune
+            logger.error(f"Failed to deregister image {image['image_id']}: {str(e)}")
+            continue
+        db.remove(Query().image_id == image["image_id"])
+        deregistered.append(image["image_id"])
+    return {"kept": [image["image_id"] for image in images[:keep]], "deregistered": deregistered}
+
+async def _chain_heads(devnet: dict) -> dict:
+    """Number and hash of the latest Layer1 and Layer2 blocks of a devnet"""
+    urls = {"layer1": (devnet["layer1_url"], "Layer1"), "layer2": (devnet["layer2_url"], "Layer2")}
+    blocks = await asyncio.gather(*(get_web3(url, type).eth.get_block("latest") for url, type in urls.values()))
+    return {layer: {"number": block.number, "hash": "0x" + bytes(block.hash).hex()} for layer, block in zip(urls, blocks)}
+
+async def _verify_chain_heads(devnet: dict, heads: dict, before: dict) -> dict:
+    """Check a reset rewound the chains: the heads seen before the reset are
+    gone (or the chain is shorter now), and the blocks recorded with the
+    snapshot are back with the same hashes"""
+    urls = {"layer1": (devnet["layer1_url"], "Layer1"), "layer2": (devnet["layer2_url"], "Layer2")}
+    result = {}
+    for layer, head in heads.items():
+        w3 = get_web3(*urls[layer])
+        previous = before[layer]
+        try:
+            latest = await w3.eth.block_number
+            if previous == head:
+                # Nothing was added since the snapshot, there was nothing to rewind
+                rewound = True
+            elif latest < previous["number"]:
+                rewound = True
+            else:
+                block = await w3.eth.get_block(previous["number"])
+                rewound = "0x" + bytes(block.hash).hex() != previous["hash"]
+            block = await w3.eth.get_block(head["number"])
+            matches = "0x" + bytes(block.hash).hex() == head["hash"]
+        except Exception as e:
+            result[layer] = {"snapshot_head": head["number"], "verified": False, "error": str(e)}
+            continue
+        result[layer] = {
+            "snapshot_head": head["number"],
+            "head_before": previous["number"],
+            "head": latest,
+            "rewound": rewound,
+            "verified": rewound and matches,
+        }
+    return result
+
+def _forget_chain_state(devnet: dict):
+    """Drop what was cached about a devnet's chains, which a reset rewound"""
+    for url in (devnet["layer1_url"], devnet["layer2_url"]):
+        for (watched_url, _), watcher in _balance_watchers.items():
+            if watched_url == url:
+                watcher.reconciled_at = None
+        if "event_logs" in sys.modules:
+            sys.modules["event_logs"].log_cache.drop_chain(url)
+
+def _find_snapshot(instance_id: str, snapshot: str):
+    """A devnet's snapshot record by ID; "latest" picks its newest one"""
+    snapshots = db.search((Query().type == "devnet_snapshot") & (Query().instance_id == instance_id))
+    if snapshot == "latest":
+        return max(snapshots, key=lambda record: record["created_at"], default=None)
+    return next((record for record in snapshots if record["snapshot_id"] == snapshot), None)
+
+@mcp.tool()
+async def snapshot_devnet(instance_id: str, snapshot: str = None) -> dict:
+    """Checkpoint a devnet's Layer1/Layer2 chain state on its host, to return to with reset_devnet.
+
+    The node containers are stopped for the few seconds it takes to archive
+    their docker volumes (DEVNET_SNAPSHOT_VOLUMES, by default all of them)
+    under DEVNET_SNAPSHOT_DIR, then started again. The chain heads at
+    snapshot time are recorded to verify resets against.
+
+    Args:
+        instance_id: Instance ID of the devnet
+        snapshot: Snapshot ID, by default "snap-<timestamp>"
+    Returns:
+        {
+            "type": "devnet_snapshot",
+            "snapshot_id": "snap-20250604-230913",
+            "instance_id": "i-...",
+            "path": "/home/ubuntu/devnet-snapshots/snap-20250604-230913",
+            "volumes": ["l1_data", "l2_data", ...],
+            "size_bytes": 412345678,
+            "heads": {"layer1": {"number": 120, "hash": "0x..."}, "layer2": {"number": 1830, "hash": "0x..."}},
+            "duration": 6.2,
+            "created_at": "2025-06-04 23:09:13"
+        }
+    """
+    from devnet_snapshot import DEVNET_SNAPSHOT_TIMEOUT, parse_output, snapshot_command, snapshot_path
+
+    devnet = db.search((Query().type == "devnet") & (Query().instance_id == instance_id))
+    if not devnet:
+        return {"message": f"Devnet instance {instance_id} not found"}
+    devnet = devnet[0]
+    snapshot = snapshot or f"snap-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    try:
+        path = snapshot_path(snapshot)
+    except ValueError as e:
+        return {"status": "error", "error": str(e)}
+    async with _devnet_locks.setdefault(instance_id, asyncio.Lock()):
+        # Checked under the lock, a concurrent call with the same ID would overwrite the archives
+        if _find_snapshot(instance_id, snapshot):
+            return {"status": "error", "error": f"Snapshot {snapshot} of {instance_id} already exists"}
+        start = time.monotonic()
+        try:
+            # Taken before the nodes stop, so the snapshot holds at least these blocks
+            heads = await _chain_heads(devnet)
+            stdout, stderr, exit_status = await exec_command_with_status_async(
+                devnet["public_ip"], snapshot_command(snapshot), timeout=DEVNET_SNAPSHOT_TIMEOUT
+            )
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+        if exit_status != 0:
+            return {"status": "error", "error": f"Snapshot failed with exit status {exit_status}: {stderr.strip()[-RUN_OUTPUT_TAIL:]}"}
+
+        record = {
+            "type": "devnet_snapshot",
+            "snapshot_id": snapshot,
+            "instance_id": instance_id,
+            "path": path,
+            **parse_output(stdout),
+            "heads": heads,
+            "duration": round(time.monotonic() - start, 2),
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        db.insert(record)
+    logger.info(f"Snapshot {snapshot} of {instance_id} taken in {record['duration']}s")
+    return record
+
+@mcp.tool()
+async def reset_devnet(instance_id: str, snapshot: str = "latest") -> dict:
+    """Return a devnet's Layer1/Layer2 chain state to a snapshot, in seconds instead of a recreate.
+
+    Stops the node containers, swaps the content of their docker volumes for
+    the snapshot's, starts them again and waits for both RPCs. The reset is
+    verified when the heads from before the reset are gone and the chain
+    heads recorded with the snapshot are back on both chains with the same
+    block hashes.
+
+    Args:
+        instance_id: Instance ID of the devnet
+        snapshot: Snapshot ID from snapshot_devnet, or "latest"
+    Returns:
+        {
+            "status": "ok",
+            "snapshot_id": "snap-20250604-230913",
+            "verified": True,
+            "chains": {
+                "layer1": {"snapshot_head": 120, "head_before": 160, "head": 122, "rewound": True, "verified": True},
+                "layer2": {"snapshot_head": 1830, "head_before": 1990, "head": 1834, "rewound": True, "verified": True}
+            },
+            "duration": 14.8
+        }
+    """
+    from devnet_snapshot import DEVNET_SNAPSHOT_TIMEOUT, restore_command
+
+    devnet = db.search((Query().type == "devnet") & (Query().instance_id == instance_id))
+    if not devnet:
+        return {"message": f"Devnet instance {instance_id} not found"}
+    devnet = devnet[0]
+    record = _find_snapshot(instance_id, snapshot)
+    if record is None:
+        return {"status": "error", "error": f"No snapshot {snapshot} of {instance_id}"}
+
+    async with _devnet_locks.setdefault(instance_id, asyncio.Lock()):
+        start = time.monotonic()
+        try:
+            # The heads the reset has to take away, a restore that did nothing keeps them
+            before = await _chain_heads(devnet)
+            stdout, stderr, exit_status = await exec_command_with_status_async(
+                devnet["public_ip"], restore_command(record["snapshot_id"]), timeout=DEVNET_SNAPSHOT_TIMEOUT
+            )
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+        _forget_chain_state(devnet)
+        if exit_status != 0:
+            return {"status": "error", "error": f"Reset failed with exit status {exit_status}: {stderr.strip()[-RUN_OUTPUT_TAIL:]}"}
+
+        readiness = await wait_for_devnet_ready(devnet["public_ip"], ("layer1", "layer2"), timeout=DEVNET_READY_TIMEOUT)
+        if not readiness["ready"]:
+            return {"status": "error", "error": "RPCs not serving after the reset", "readiness": readiness}
+        chains = await _verify_chain_heads(devnet, record["heads"], before)
+
+    verified = all(chain["verified"] for chain in chains.values())
+    duration = round(time.monotonic() - start, 2)
+    db.update(
+        {"last_reset_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "resets": record.get("resets", 0) + 1},
+        (Query().type == "devnet_snapshot") & (Query().snapshot_id == record["snapshot_id"]) & (Query().instance_id == instance_id),
+    )
+    logger.info(f"Devnet {instance_id} reset to {record['snapshot_id']} in {duration}s, verified: {verified}")
+    return {
+        "status": "ok" if verified else "error",
+        "snapshot_id": record["snapshot_id"],
+        "verified": verified,
+        "chains": chains,
+        "duration": duration,
+    }
+
+@mcp.tool()
+async def list_devnet_snapshots(instance_id: str = None) -> list:
+    """List chain state snapshots, of one devnet or of all, newest first."""
+    query = Query().type == "devnet_snapshot"
+    if instance_id:
+        query = query & (Query().instance_id == instance_id)
+    return sorted(db.search(query), key=lambda record: record["created_at"], reverse=True)
+
+@mcp.tool()
+async def delete_devnet_snapshot(instance_id: str, snapshot: str) -> dict:
+    """Delete a chain state snapshot from the devnet host and the database."""
+    from devnet_snapshot import delete_command
+
+    devnet = db.search((Query().type == "devnet") & (Query().instance_id == instance_id))
+    record = _find_snapshot(instance_id, snapshot)
+    if not devnet or record is None:
+        return {"message": f"No snapshot {snapshot} of {instance_id}"}
+    await exec_command_async(devnet[0]["public_ip"], delete_command(record["snapshot_id"]), timeout=SSH_COMMAND_TIMEOUT)
+    db.remove((Query().type == "devnet_snapshot") & (Query().snapshot_id == record["snapshot_id"]) & (Query().instance_id == instance_id))
+    return {"message": f"Snapshot {record['snapshot_id']} of {instance_id} deleted"}
+
+async def _run_create_devnet_job(job) -> dict:
+    params = job.params
+    # Pick up the instance an interrupted attempt already launched, stored
+    # with the job the moment it existed
+    resume_instance_id = job.saved.get("instance_id") if job.resumed else None
+    if resume_instance_id:
+        job.log(f"Resuming provisioning of instance {resume_instance_id}")
+
+    devnet = await _create_devnet(
+        params["name"],
+        job.log,
+        use_pool=params.get("use_pool", True),
+        from_image=params.get("from_image"),
+        bootstrap=params.get("bootstrap", "ssh"),
+        on_stage=job.set_stage,
+        resume_instance_id=resume_instance_id,
+        on_instance=lambda instance_id: job.remember(instance_id=instance_id),
+    )
+    if devnet.get("status") == "error":
+        raise RuntimeError(devnet["error"])
+    return devnet
+
+job_manager.register("create_devnet", _run_create_devnet_job)
+
+@mcp.tool()
+async def start_create_devnet(
+    name: str,
+    use_pool: bool = True,
+    from_image: str = None,
+    bootstrap: Literal["ssh", "cloud-init"] = "ssh",
+) -> dict:
+    """Queue the creation of a new Devnet and return its job ID right away.
+
+    Takes the same arguments as create_new_devnet. Poll get_job(job_id) for
+    stage, progress and logs; the devnet record is the job result.
+    """
+    job = await job_manager.submit("create_devnet", {
+        "name": name,
+        "use_pool": use_pool,
+        "from_image": from_image,
+        "bootstrap": bootstrap,
+    })
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+@mcp.tool()
+async def get_job(job_id: str) -> dict:
+    """Get the status, stage, progress, logs and result of a job."""
+    job = job_manager.get(job_id)
+    if not job:
+        return {"message": f"Job {job_id} not found"}
+    return job
+
+@mcp.tool()
+async def list_jobs(status: Literal["queued", "running", "succeeded", "failed"] = None, limit: int = 20) -> list:
+    """List the most recent jobs, optionally only those with a given status.
+
+    Logs are left out, use get_job for them.
+    """
+    return [
+        {key: value for key, value in job.items() if key != "logs"}
+        for job in job_manager.list(status=status, limit=limit)
+    ]
+
+@mcp.tool()
+async def get_warm_pool_status() -> dict:
+    """Get warm pool size, ready instances, hit/miss counts and refill latency."""
+    return warm_pool.metrics()
+
+@mcp.tool()
+async def get_server_metrics(reset: bool = False) -> dict:
+    """Get call counts, error counts and latency of every tool, and the time
+    spent in RPC, EC2, SSH and DB calls underneath them.
+
+    Latencies are in seconds; p50/p95/p99 are histogram bucket upper bounds.
+    rpc_budget shows the compute units each RPC endpoint spent, how long
+    requests waited for budget and how often the endpoint throttled them.
+    The same metrics are served in Prometheus text format at /metrics when
+    the server runs over HTTP.
+
+    Args:
+        reset: Clear the metrics after reading them
+    """
+    from gas import gas_estimator
+    from rpc import budget_stats
+
+    snapshot = metrics.snapshot()
+    snapshot["tool_limits"] = limiter.status()
+    snapshot["rpc_budget"] = budget_stats()
+    snapshot["gas_estimates"] = gas_estimator.stats()
+    coalescing = snapshot["counters"].get("rpc_coalescing")
+    if coalescing:
+        # Share of RPC reads answered without their own upstream call
+        coalescing["hit_rate"] = round(
+            (coalescing.get("coalesced", 0) + coalescing.get("cached", 0)) / coalescing["requests"], 3
+        )
+    if reset:
+        metrics.reset()
+    return snapshot
+
+@mcp.tool()
+async def get_rpc_endpoints() -> dict:
+    """Get the configured RPC endpoint groups with per-endpoint health and latency.
+
+    Each endpoint reports its circuit state ("closed" healthy, "open" skipped
+    after repeated failures, "half-open" about to be retried), latency EWMA,
+    request and error counts and how often it received hedged reads.
+    Pass a group name as the `url` of an RPC tool to route through the group.
+    """
+    from rpc import endpoint_groups
+
+    return {"groups": [group.stats() for group in endpoint_groups.values()]}
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def prometheus_metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 #TODO : transaction 조회 기능 추가
 
 
-async def main():
-    await mcp.run_async(transport="stdio")
+def _prewarm():
+    """Import the heavy client libraries and create the EC2 client ahead of the first tool call.
 
-# if __name__ == "__main__":
-#     mcp.run(transport="stdio")
-    
-    # To use a different transport, e.g., HTTP:
-    # mcp.run(transport="streamable-http", host="127.0.0.1", port=9000)
+    They are kept out of module import so the server answers initialize quickly.
+    """
+    start = time.monotonic()
+    for module in ("web3", "eth_account", "eth_utils", "paramiko", "rpc"):
+        importlib.import_module(module)
+    get_ec2_client()
+    logger.info(f"Pre-warmed client libraries in {time.monotonic() - start:.2f}s")
+
+async def main():
+    warm_pool.start()
+    job_manager.start()
+    if PREWARM:
+        _spawn(asyncio.to_thread(_prewarm))
+    if MCP_TRANSPORT == "stdio":
+        await mcp.run_async(transport="stdio")
+    else:
+        # Every session shares the limiter, client pools and caches of this process
+        await mcp.run_async(transport=MCP_TRANSPORT, host=MCP_HOST, port=MCP_PORT, path=MCP_PATH)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,263 @@
+import functools
+import threading
+import time
+
+from contextlib import contextmanager
+from tinydb.middlewares import Middleware
+
+# Upper bounds in seconds of the latency histogram buckets, from RPC calls to deploys
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+
+# Downstream systems timed separately from the tools calling them
+DOWNSTREAM_KINDS = ("rpc", "ec2", "ssh", "db")
+
+class Histogram:
+    """Latency histogram with fixed buckets, like a Prometheus histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile, max for the overflow bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        """(bound, observations <= bound) pairs ending with ("+Inf", count)"""
+        pairs = []
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            pairs.append((bound, seen))
+        pairs.append(("+Inf", self.count))
+        return pairs
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "max": round(self.max, 4),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+class Metrics:
+    """Call counts, error counts and latency histograms of tools and downstream calls.
+
+    Observations come from the event loop and from worker threads (SSH,
+    boto3, TinyDB in asyncio.to_thread), so updates hold a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.tools = {}
+        self.downstream = {kind: {} for kind in DOWNSTREAM_KINDS}
+        self.counters = {}
+
+    @staticmethod
+    def _entry(table, name):
+        if name not in table:
+            table[name] = {"calls": 0, "errors": 0, "latency": Histogram()}
+        return table[name]
+
+    def observe_tool(self, name, duration, error=False):
+        with self._lock:
+            entry = self._entry(self.tools, name)
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["latency"].observe(duration)
+
+    def observe(self, kind, operation, duration, error=False):
+        """Record one downstream call, e.g. observe("rpc", "eth_getBalance", 0.12)"""
+        with self._lock:
+            entry = self._entry(self.downstream.setdefault(kind, {}), operation)
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["latency"].observe(duration)
+
+    def increment(self, group, name, amount=1):
+        """Bump a plain counter, e.g. increment("rpc_coalescing", "coalesced")"""
+        with self._lock:
+            table = self.counters.setdefault(group, {})
+            table[name] = table.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, kind, operation):
+        """Time a block as a downstream call, counting an exception as an error"""
+        start = time.monotonic()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(kind, operation, time.monotonic() - start, error)
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.tools = {}
+            self.downstream = {kind: {} for kind in DOWNSTREAM_KINDS}
+            self.counters = {}
+
+    def snapshot(self):
+        """Metrics as plain dicts, with latency summaries in seconds"""
+        def render(table):
+            return {
+                name: {"calls": entry["calls"], "errors": entry["errors"], "latency": entry["latency"].summary()}
+                for name, entry in sorted(table.items())
+            }
+
+        with self._lock:
+            downstream = {}
+            for kind, table in self.downstream.items():
+                downstream[kind] = {
+                    "calls": sum(entry["calls"] for entry in table.values()),
+                    "errors": sum(entry["errors"] for entry in table.values()),
+                    "seconds": round(sum(entry["latency"].sum for entry in table.values()), 4),
+                    "operations": render(table),
+                }
+            return {
+                "uptime": round(time.time() - self.started_at, 1),
+                "tools": render(self.tools),
+                "downstream": downstream,
+                "counters": {group: dict(table) for group, table in self.counters.items()},
+            }
+
+    def render_prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def histogram(metric, labels, entry):
+            for bound, count in entry["latency"].cumulative():
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"{metric}_sum{{{labels}}} {entry['latency'].sum:.6f}")
+            lines.append(f"{metric}_count{{{labels}}} {entry['latency'].count}")
+
+        with self._lock:
+            lines += [
+                "# HELP mcp_tool_calls_total Tool calls",
+                "# TYPE mcp_tool_calls_total counter",
+            ]
+            lines += [f'mcp_tool_calls_total{{tool="{name}"}} {entry["calls"]}' for name, entry in sorted(self.tools.items())]
+            lines += [
+                "# HELP mcp_tool_errors_total Tool calls that raised or returned an error",
+                "# TYPE mcp_tool_errors_total counter",
+            ]
+            lines += [f'mcp_tool_errors_total{{tool="{name}"}} {entry["errors"]}' for name, entry in sorted(self.tools.items())]
+            lines += [
+                "# HELP mcp_tool_duration_seconds Tool call latency",
+                "# TYPE mcp_tool_duration_seconds histogram",
+            ]
+            for name, entry in sorted(self.tools.items()):
+                histogram("mcp_tool_duration_seconds", f'tool="{name}"', entry)
+
+            lines += [
+                "# HELP mcp_downstream_errors_total Failed RPC, EC2, SSH and DB calls",
+                "# TYPE mcp_downstream_errors_total counter",
+            ]
+            for kind, table in sorted(self.downstream.items()):
+                lines += [
+                    f'mcp_downstream_errors_total{{kind="{kind}",operation="{operation}"}} {entry["errors"]}'
+                    for operation, entry in sorted(table.items())
+                ]
+            lines += [
+                "# HELP mcp_downstream_duration_seconds RPC, EC2, SSH and DB call latency",
+                "# TYPE mcp_downstream_duration_seconds histogram",
+            ]
+            for kind, table in sorted(self.downstream.items()):
+                for operation, entry in sorted(table.items()):
+                    histogram("mcp_downstream_duration_seconds", f'kind="{kind}",operation="{operation}"', entry)
+
+            for group, table in sorted(self.counters.items()):
+                lines.append(f"# TYPE mcp_{group}_total counter")
+                lines += [f'mcp_{group}_total{{name="{name}"}} {value}' for name, value in sorted(table.items())]
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def instrument_tool(fn, name=None):
+    """Wrap an async tool so every call is counted and timed.
+
+    A call counts as an error when it raises or returns the
+    {"status": "error", ...} dict the tools use to report failures.
+    """
+    name = name or fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = time.monotonic()
+        error = True
+        try:
+            result = await fn(*args, **kwargs)
+            error = isinstance(result, dict) and result.get("status") == "error"
+            return result
+        finally:
+            metrics.observe_tool(name, time.monotonic() - start, error)
+
+    return wrapper
+
+def record_boto_timings(events):
+    """Time every AWS API call as an "ec2" downstream call
+
+    Args:
+        events: The event emitter of a boto3 client (client.meta.events), or
+                of a boto3 Session (session.events) to cover every client
+                and resource created from it afterwards
+    """
+    def before_call(model, context, **kwargs):
+        context["metrics_call"] = (model.name, time.monotonic())
+
+    def after_call(http_response, context, **kwargs):
+        if "metrics_call" in context:
+            operation, start = context.pop("metrics_call")
+            metrics.observe("ec2", operation, time.monotonic() - start, http_response.status_code >= 300)
+
+    def after_call_error(context, **kwargs):
+        # Connection errors never reach after-call
+        if "metrics_call" in context:
+            operation, start = context.pop("metrics_call")
+            metrics.observe("ec2", operation, time.monotonic() - start, True)
+
+    events.register("before-call.*.*", before_call, unique_id="metrics-before-call")
+    events.register("after-call.*.*", after_call, unique_id="metrics-after-call")
+    events.register("after-call-error.*.*", after_call_error, unique_id="metrics-after-call-error")
+
+class TimedStorage(Middleware):
+    """TinyDB middleware timing every storage read and write as "db" downstream calls
+
+        db = TinyDB("db.json", storage=TimedStorage(JSONStorage))
+    """
+
+    def read(self):
+        with metrics.timer("db", "read"):
+            return self.storage.read()
+
+    def write(self, data):
+        with metrics.timer("db", "write"):
+            self.storage.write(data)
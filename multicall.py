@@ -0,0 +1,110 @@
+import asyncio
+import os
+
+from eth_abi import decode, encode
+
+# Multicall3 has the same address on mainnet, most public chains and OP stack L2s (as a preinstall)
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+# Calls packed into one aggregate3 request. A balanceOf costs ~3k-30k gas, so a full
+# batch stays well under the 50M gas nodes allow an eth_call by default.
+MULTICALL_BATCH_SIZE = int(os.getenv("MULTICALL_BATCH_SIZE", "500"))
+# Calldata bytes per aggregate3 request, below the request body limits of RPC providers
+MULTICALL_MAX_CALLDATA = int(os.getenv("MULTICALL_MAX_CALLDATA", "100000"))
+# aggregate3 requests (or single calls without Multicall3) in flight at the same time
+MULTICALL_CONCURRENCY = int(os.getenv("MULTICALL_CONCURRENCY", "4"))
+
+AGGREGATE3 = bytes.fromhex("82ad56cb")  # aggregate3((address,bool,bytes)[])
+GET_ETH_BALANCE = bytes.fromhex("4d2301cc")  # getEthBalance(address)
+BALANCE_OF = bytes.fromhex("70a08231")  # balanceOf(address)
+DECIMALS = bytes.fromhex("313ce567")  # decimals()
+SYMBOL = bytes.fromhex("95d89b41")  # symbol()
+
+# Encoded size of one call in the aggregate3 array besides its calldata:
+# offset, target, allowFailure, calldata offset and length
+CALL_OVERHEAD = 5 * 32
+
+def address_call(selector, address):
+    """Calldata of a function taking one address, e.g. balanceOf(holder)"""
+    return selector + encode(["address"], [address])
+
+def encode_aggregate3(calls):
+    """aggregate3 calldata for (target, calldata) calls, each allowed to fail"""
+    return AGGREGATE3 + encode(["(address,bool,bytes)[]"], [[(target, True, data) for target, data in calls]])
+
+def decode_aggregate3(data):
+    """[(success, return data)] of an aggregate3 result"""
+    return decode(["(bool,bytes)[]"], bytes(data))[0]
+
+def decode_uint(success, data):
+    """A uint256 return value, None for a failed call or a non-conforming return"""
+    if not success or len(data) < 32:
+        return None
+    return int.from_bytes(data[:32], "big")
+
+def decode_symbol(success, data):
+    """A token symbol, returned as string or, by older tokens such as MKR, as bytes32"""
+    if not success or len(data) < 32:
+        return None
+    if len(data) == 32:
+        return data.rstrip(b"\0").decode(errors="replace")
+    try:
+        return decode(["string"], data)[0]
+    except Exception:
+        return None
+
+def batches(calls, batch_size=MULTICALL_BATCH_SIZE, max_calldata=MULTICALL_MAX_CALLDATA):
+    """Split (target, calldata) calls into aggregate3 batches under the call count and calldata limits"""
+    batch = []
+    size = 0
+    for call in calls:
+        call_size = CALL_OVERHEAD + (len(call[1]) + 31) // 32 * 32
+        if batch and (len(batch) >= batch_size or size + call_size > max_calldata):
+            yield batch
+            batch, size = [], 0
+        batch.append(call)
+        size += call_size
+    if batch:
+        yield batch
+
+async def aggregate(eth_call, calls, multicall=True, concurrency=MULTICALL_CONCURRENCY, stats=None):
+    """Run (target, calldata) calls, returning [(success, return data)] in call order.
+
+    With `multicall` the calls are packed into Multicall3 aggregate3
+    requests run concurrently; a request that fails as a whole (e.g. out of
+    gas or too large for the provider) is split in half and retried.
+    Without it, on chains lacking Multicall3, every call is its own eth_call.
+
+    Args:
+        eth_call: async eth_call(to, data) returning the return data, raising on revert
+        stats: Optional dict counting "requests" and "splits"
+    """
+    stats = {} if stats is None else stats
+    stats.setdefault("requests", 0)
+    stats.setdefault("splits", 0)
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def single(target, data):
+        async with semaphore:
+            stats["requests"] += 1
+            try:
+                return True, bytes(await eth_call(target, data))
+            except Exception:
+                return False, b""
+
+    async def batch(calls):
+        async with semaphore:
+            stats["requests"] += 1
+            try:
+                return list(decode_aggregate3(await eth_call(MULTICALL3_ADDRESS, encode_aggregate3(calls))))
+            except Exception:
+                if len(calls) == 1:
+                    return [(False, b"")]
+        stats["splits"] += 1
+        middle = len(calls) // 2
+        first, second = await asyncio.gather(batch(calls[:middle]), batch(calls[middle:]))
+        return first + second
+
+    if not multicall:
+        return await asyncio.gather(*(single(target, data) for target, data in calls))
+    results = await asyncio.gather(*(batch(calls) for calls in batches(calls)))
+    return [result for batch_results in results for result in batch_results]
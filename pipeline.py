@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class StageError(Exception):
+    """Raised by StagePipeline.run when a stage fails.
+
+    Attributes:
+        stage: Name of the stage that failed
+        timings: Timings of the stages that finished before the failure
+        results: Results of the stages that finished before the failure,
+                 e.g. to clean up what they created
+    """
+
+    def __init__(self, stage, error, timings, results=None):
+        super().__init__(f"Stage {stage} failed: {error}")
+        self.stage = stage
+        self.error = error
+        self.timings = timings
+        self.results = results if results is not None else {}
+
+class StagePipeline:
+    """Runs async stages as a dependency graph.
+
+    Every stage starts as soon as the stages it depends on are done, so
+    independent work overlaps instead of running strictly in order:
+
+        pipeline = StagePipeline()
+        pipeline.add("instance", create_instance)
+        pipeline.add("public_ip", wait_for_ip, deps=["instance"])
+        pipeline.add("load_key", load_key)
+        pipeline.add("docker", prepare_docker, deps=["public_ip", "load_key"])
+        results, timings = await pipeline.run()
+
+    A stage is an async callable receiving the dict of results of the
+    stages that finished so far; its return value is stored under its name.
+    """
+
+    def __init__(self):
+        self._stages = {}
+
+    def add(self, name, fn, deps=()):
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+        self._stages[name] = (fn, tuple(deps))
+        return self
+
+    def __contains__(self, name):
+        return name in self._stages
+
+    def __len__(self):
+        return len(self._stages)
+
+    async def run(self, on_stage=None):
+        """Run all stages.
+
+        Args:
+            on_stage: Optional callback on_stage(name, done, total) called
+                      after every finished stage, e.g. to report progress
+
+        Returns:
+            (results, timings): results maps stage name to its return value,
+            timings maps stage name to {"start", "end", "duration"} in
+            seconds since the pipeline started.
+        Raises:
+            StageError: The first failing stage. Stages still running are cancelled.
+        """
+        start = time.monotonic()
+        results = {}
+        timings = {}
+        tasks = {}
+
+        async def run_stage(name, fn, deps):
+            if deps:
+                await asyncio.gather(*(tasks[dep] for dep in deps))
+            stage_start = time.monotonic()
+            try:
+                results[name] = await fn(results)
+            except Exception as e:
+                raise StageError(name, e, dict(timings), dict(results)) from e
+            stage_end = time.monotonic()
+            timings[name] = {
+                "start": round(stage_start - start, 2),
+                "end": round(stage_end - start, 2),
+                "duration": round(stage_end - stage_start, 2),
+            }
+            logger.info(f"Stage {name} done in {stage_end - stage_start:.2f}s")
+            if on_stage:
+                on_stage(name, len(timings), len(self._stages))
+
+        # Stages are added after their dependencies, so creating the tasks in
+        # insertion order makes every dependency task exist before it is awaited.
+        for name, (fn, deps) in self._stages.items():
+            tasks[name] = asyncio.create_task(run_stage(name, fn, deps))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except StageError:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        total = round(time.monotonic() - start, 2)
+        timings["total"] = {"start": 0.0, "end": total, "duration": total}
+        return results, timings
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import os
+import time
+
+from datetime import datetime
+from tinydb import Query
+
+from ec2 import (
+    create_ec2_instance,
+    describe_ec2_instances_by_ids,
+    get_ec2_instance_public_ip,
+    tag_ec2_instance,
+    terminate_ec2_instance,
+    wait_for_instance_state,
+)
+
+from ssh import (
+    wait_for_ssh_ready,
+    exec_command,
+    exec_command_interactive,
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of idle instances to keep ready. 0 disables the pool.
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "0"))
+# "booted": EC2 running, SSH reachable and docker ready, deploy runs on claim
+# "deployed": trh-sdk deploy already done, claim returns a usable devnet
+WARM_POOL_MODE = os.getenv("WARM_POOL_MODE", "booted")
+WARM_POOL_REFILL_INTERVAL = float(os.getenv("WARM_POOL_REFILL_INTERVAL", "30"))
+
+POOL_TAG = "WarmPool"
+
+class WarmPool:
+    """Keeps pre-booted devnet instances around so create_new_devnet can
+    claim one instead of waiting for EC2 and SSH (and, in "deployed" mode,
+    for trh-sdk deploy).
+
+    Pool members are stored in the database as "pool_instance" records, so
+    the pool survives a server restart.
+    """
+
+    def __init__(self, db, size=WARM_POOL_SIZE, mode=WARM_POOL_MODE, refill_interval=WARM_POOL_REFILL_INTERVAL):
+        if mode not in ("booted", "deployed"):
+            raise ValueError(f"Unknown warm pool mode: {mode}")
+        self.db = db
+        self.size = size
+        self.mode = mode
+        self.refill_interval = refill_interval
+
+        self._lock = asyncio.Lock()
+        self._refill_event = asyncio.Event()
+        self._refill_task = None
+        self._warming = set()
+        # The event loop only keeps weak references to tasks
+        self._tasks = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.refill_latencies = []
+
+    def _records(self, status=None):
+        PoolInstance = Query()
+        if status is None:
+            return self.db.search(PoolInstance.type == "pool_instance")
+        return self.db.search((PoolInstance.type == "pool_instance") & (PoolInstance.status == status))
+
+    def _launch(self, name):
+        """Launch and tag one pool instance. Blocking, run it in a worker thread."""
+        instance_id = create_ec2_instance(name)
+        tag_ec2_instance(instance_id, {POOL_TAG: "warming"})
+        return instance_id
+
+    def _boot(self, instance_id):
+        """Wait for an instance, SSH and docker (and deploy in "deployed" mode).
+        Blocking, run it in a worker thread.
+
+        Returns:
+            The public IP of the instance
+        """
+        if not wait_for_instance_state(instance_id, "running"):
+            raise TimeoutError(f"Instance {instance_id} did not reach running state")
+        public_ip = get_ec2_instance_public_ip(instance_id)
+        if not wait_for_ssh_ready(public_ip):
+            raise TimeoutError(f"SSH on {public_ip} did not become ready")
+        exec_command(public_ip, "sudo chmod 666 /var/run/docker.sock")
+        if self.mode == "deployed":
+            exec_command_interactive(public_ip, "trh-sdk deploy")
+        tag_ec2_instance(instance_id, {POOL_TAG: "ready"})
+        return public_ip
+
+    async def _provision(self):
+        """Boot one pool instance. EC2 and SSH calls run in worker threads,
+        the database is only written from the event loop."""
+        start = time.monotonic()
+        name = f"warm-pool-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        instance_id = await asyncio.to_thread(self._launch, name)
+        self.db.insert({
+            "type": "pool_instance",
+            "instance_id": instance_id,
+            "mode": self.mode,
+            "status": "warming",
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+        try:
+            public_ip = await asyncio.to_thread(self._boot, instance_id)
+        except Exception:
+            self.db.remove(Query().instance_id == instance_id)
+            await asyncio.to_thread(terminate_ec2_instance, instance_id)
+            raise
+
+        self.db.update(
+            {"status": "ready", "public_ip": public_ip},
+            Query().instance_id == instance_id,
+        )
+        latency = time.monotonic() - start
+        self.refill_latencies = (self.refill_latencies + [latency])[-100:]
+        logger.info(f"Warm pool instance {instance_id} ready in {latency:.2f}s")
+        return instance_id
+
+    async def _provision_one(self, slot):
+        try:
+            await self._provision()
+        except Exception as e:
+            logger.error(f"Warm pool refill failed: {str(e)}")
+        finally:
+            self._warming.discard(slot)
+
+    async def refill(self):
+        """Start provisioning enough instances to bring the pool back to size."""
+        async with self._lock:
+            missing = self.size - len(self._records("ready")) - len(self._warming)
+            for _ in range(max(missing, 0)):
+                slot = object()
+                self._warming.add(slot)
+                task = asyncio.create_task(self._provision_one(slot))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return max(missing, 0)
+
+    async def _discard_unfinished(self):
+        # Records left "warming" by a previous process were never finished
+        for record in self._records("warming"):
+            await asyncio.to_thread(terminate_ec2_instance, record["instance_id"])
+            self.db.remove(Query().instance_id == record["instance_id"])
+
+    async def _refill_loop(self):
+        await self._discard_unfinished()
+        while True:
+            await self.refill()
+            self._refill_event.clear()
+            try:
+                await asyncio.wait_for(self._refill_event.wait(), self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Start topping the pool up in the background."""
+        if self.size <= 0 or self._refill_task is not None:
+            return
+        self._refill_task = asyncio.create_task(self._refill_loop())
+
+    async def claim(self, name):
+        """Take a ready instance out of the pool and retag it as `name`.
+
+        Returns:
+            The pool record ({"instance_id", "public_ip", "mode", ...}) or
+            None when the pool is empty and the caller should fall back to
+            the cold path.
+        """
+        if self.size <= 0:
+            return None
+
+        async with self._lock:
+            ready = self._records("ready")
+            live = await asyncio.to_thread(
+                describe_ec2_instances_by_ids, [record["instance_id"] for record in ready]
+            )
+            claimed = None
+            for record in ready:
+                instance = live.get(record["instance_id"])
+                if instance and instance["State"]["Name"] == "running":
+                    claimed = record
+                    break
+                # Stopped or terminated behind our back, drop it
+                self.db.remove(Query().instance_id == record["instance_id"])
+            if claimed:
+                self.db.remove(Query().instance_id == claimed["instance_id"])
+
+        self._refill_event.set()
+        if claimed is None:
+            self.misses += 1
+            return None
+
+        await asyncio.to_thread(tag_ec2_instance, claimed["instance_id"], {"Name": name, POOL_TAG: "claimed"})
+        self.hits += 1
+        return claimed
+
+    def metrics(self):
+        claims = self.hits + self.misses
+        latencies = self.refill_latencies
+        return {
+            "size": self.size,
+            "mode": self.mode,
+            "ready": len(self._records("ready")),
+            "warming": len(self._warming),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / claims if claims else None,
+            "refill_latency_last": latencies[-1] if latencies else None,
+            "refill_latency_avg": sum(latencies) / len(latencies) if latencies else None,
+        }
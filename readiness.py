@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Port of every readiness condition on a devnet host
+DEVNET_PORTS = {
+    "ssh": 22,
+    "layer1": 8545,
+    "layer2": 9545,
+}
+
+async def ssh_ready(host, port=22, timeout=3):
+    """Check whether an SSH server on host sends its banner within the timeout.
+
+    A bare TCP accept is not enough: sshd accepts connections a moment
+    before it is able to authenticate them.
+    """
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        banner = await asyncio.wait_for(reader.readline(), timeout)
+        return banner.startswith(b"SSH-")
+    except Exception:
+        return False
+    finally:
+        if writer is not None:
+            writer.close()
+
+async def rpc_ready(url, timeout=3):
+    """Check whether an RPC endpoint answers eth_chainId and eth_blockNumber within the timeout"""
+    from web3 import AsyncWeb3, AsyncHTTPProvider
+
+    w3 = AsyncWeb3(AsyncHTTPProvider(url))
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(w3.eth.chain_id, w3.eth.block_number),
+            timeout,
+        )
+        return True
+    except Exception:
+        return False
+    finally:
+        # Probes run every few hundred milliseconds, don't leave sessions behind
+        await w3.provider.disconnect()
+
+async def _probe_until_ready(probe, deadline, min_interval, max_interval):
+    """Run probe with a growing interval until it succeeds or the deadline passes.
+
+    Returns:
+        The monotonic time at which the probe first succeeded, or None
+    """
+    interval = min_interval
+    while True:
+        if await probe():
+            return time.monotonic()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        await asyncio.sleep(min(interval, remaining))
+        interval = min(interval * 1.5, max_interval)
+
+async def wait_for_devnet_ready(
+        host,
+        conditions=("ssh", "layer1", "layer2"),
+        timeout=600,
+        min_interval=0.5,
+        max_interval=5,
+    ):
+    """Wait until every requested condition holds on a devnet host.
+
+    The conditions are probed concurrently, each starting with a short
+    interval that grows towards max_interval, and the call returns as soon
+    as the last one holds.
+
+    Args:
+        host: The public IP of the devnet
+        conditions: Any of "ssh" (sshd banner on 22), "layer1" (RPC on 8545)
+                    and "layer2" (RPC on 9545)
+        timeout: Maximum time to wait in seconds
+        min_interval: First interval between probes of a condition
+        max_interval: Upper bound of the interval between probes
+    Returns:
+        {
+            "ready": True,
+            "elapsed": 41.2,
+            "stages": {
+                "ssh": {"ready": True, "after": 3.1, "at": "2025-06-04 23:09:13"},
+                "layer1": {"ready": True, "after": 35.0, "at": "2025-06-04 23:09:45"},
+                ...
+            }
+        }
+    """
+    probes = {
+        "ssh": lambda: ssh_ready(host, DEVNET_PORTS["ssh"]),
+        "layer1": lambda: rpc_ready(f"http://{host}:{DEVNET_PORTS['layer1']}"),
+        "layer2": lambda: rpc_ready(f"http://{host}:{DEVNET_PORTS['layer2']}"),
+    }
+    unknown = set(conditions) - set(probes)
+    if unknown:
+        raise ValueError(f"Unknown readiness conditions: {sorted(unknown)}")
+
+    start = time.monotonic()
+    started_at = datetime.now().timestamp()
+    deadline = start + timeout
+
+    results = await asyncio.gather(*(
+        _probe_until_ready(probes[condition], deadline, min_interval, max_interval)
+        for condition in conditions
+    ))
+
+    stages = {}
+    for condition, ready_at in zip(conditions, results):
+        if ready_at is None:
+            stages[condition] = {"ready": False, "after": None, "at": None}
+            continue
+        after = ready_at - start
+        stages[condition] = {
+            "ready": True,
+            "after": round(after, 2),
+            "at": datetime.fromtimestamp(started_at + after).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        logger.info(f"{host} {condition} ready after {after:.2f}s")
+
+    return {
+        "ready": all(stage["ready"] for stage in stages.values()),
+        "elapsed": round(time.monotonic() - start, 2),
+        "stages": stages,
+    }
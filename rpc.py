@@ -0,0 +1,560 @@
+import asyncio
+import copy
+import json
+import os
+import random
+import time
+import weakref
+
+from urllib.parse import urlparse
+
+from aiohttp import ClientError, ClientResponseError, ClientSession, TCPConnector
+from web3 import AsyncHTTPProvider
+
+from event_logs import LOG_RANGE_ERROR
+from metrics import metrics
+
+# Connections kept open to RPC endpoints, shared by every provider and MCP session
+RPC_CONNECTION_LIMIT = int(os.getenv("RPC_CONNECTION_LIMIT", "100"))
+RPC_CONNECTION_LIMIT_PER_HOST = int(os.getenv("RPC_CONNECTION_LIMIT_PER_HOST", "20"))
+# Share one upstream call between identical concurrent read requests
+RPC_COALESCE = os.getenv("RPC_COALESCE", "true").lower() == "true"
+# Seconds a read result keeps answering identical requests after it arrived,
+# 0 only shares calls still in flight. "latest" reads can be this much stale.
+RPC_CACHE_TTL = float(os.getenv("RPC_CACHE_TTL", "0"))
+
+# Named endpoint groups, a JSON object of group name -> list of URLs, e.g.
+# {"mainnet": ["https://eth-mainnet.g.alchemy.com/v2/KEY", "https://rpc.ankr.com/eth"]}.
+# A tool url naming a group, or being one of its URLs, is routed across the group.
+RPC_ENDPOINT_GROUPS = json.loads(os.getenv("RPC_ENDPOINT_GROUPS") or "{}")
+# Seconds before a read is also sent to the next best endpoint, 0 disables hedging
+RPC_HEDGE_DELAY = float(os.getenv("RPC_HEDGE_DELAY", "0"))
+# Consecutive failures opening an endpoint's circuit, and seconds until it is tried again
+RPC_CIRCUIT_FAILURES = int(os.getenv("RPC_CIRCUIT_FAILURES", "3"))
+RPC_CIRCUIT_COOLDOWN = float(os.getenv("RPC_CIRCUIT_COOLDOWN", "30"))
+# Weight of the newest latency sample in an endpoint's moving average
+RPC_EWMA_ALPHA = 0.3
+
+# Compute units per second each metered endpoint may spend, and the burst it may spend
+# at once. The default is Alchemy's free tier. Endpoints on RPC_METERED_HOSTS get this
+# budget, any other endpoint (e.g. a devnet's own RPCs) is unlimited. RPC_RATE_LIMITS
+# sets the budget of single endpoints by URL, e.g. {"http://10.0.0.5:8545": 500}.
+# 0 disables the limit.
+RPC_COMPUTE_UNITS_PER_SECOND = float(os.getenv("RPC_COMPUTE_UNITS_PER_SECOND", "330"))
+RPC_COMPUTE_UNITS_BURST = float(os.getenv("RPC_COMPUTE_UNITS_BURST") or RPC_COMPUTE_UNITS_PER_SECOND)
+RPC_METERED_HOSTS = [host.strip() for host in os.getenv("RPC_METERED_HOSTS", "alchemy.com").split(",") if host.strip()]
+RPC_RATE_LIMITS = json.loads(os.getenv("RPC_RATE_LIMITS") or "{}")
+# Retries of throttled (HTTP 429) requests, and the backoff cap in seconds
+RPC_THROTTLE_RETRIES = int(os.getenv("RPC_THROTTLE_RETRIES", "4"))
+RPC_BACKOFF_BASE = 0.25
+RPC_BACKOFF_MAX = float(os.getenv("RPC_BACKOFF_MAX", "8"))
+
+# Compute units per method, after Alchemy's pricing. Unlisted methods cost
+# DEFAULT_COMPUTE_UNITS; RPC_METHOD_COMPUTE_UNITS (JSON) overrides single methods.
+DEFAULT_COMPUTE_UNITS = 20
+METHOD_COMPUTE_UNITS = {
+    "net_version": 0,
+    "eth_chainId": 0,
+    "eth_blockNumber": 10,
+    "eth_feeHistory": 10,
+    "eth_maxPriorityFeePerGas": 10,
+    "eth_getTransactionReceipt": 15,
+    "eth_getBlockByNumber": 16,
+    "eth_getBlockByHash": 16,
+    "eth_getTransactionByHash": 17,
+    "eth_getStorageAt": 17,
+    "eth_getBalance": 19,
+    "eth_gasPrice": 19,
+    "eth_call": 26,
+    "eth_getCode": 26,
+    "eth_getTransactionCount": 26,
+    "eth_getLogs": 75,
+    "eth_estimateGas": 87,
+    "eth_sendRawTransaction": 250,
+    **json.loads(os.getenv("RPC_METHOD_COMPUTE_UNITS") or "{}"),
+}
+# JSON-RPC error codes providers use for rate limiting in a 200 response
+THROTTLE_ERROR_CODES = {429, -32005}
+
+# Read-only methods safe to coalesce, never anything sending or signing
+COALESCED_METHODS = {
+    "eth_blockNumber",
+    "eth_chainId",
+    "eth_gasPrice",
+    "eth_maxPriorityFeePerGas",
+    "eth_feeHistory",
+    "eth_getBalance",
+    "eth_getBlockByNumber",
+    "eth_getBlockByHash",
+    "eth_getTransactionByHash",
+    "eth_getTransactionReceipt",
+    "eth_getTransactionCount",
+    "eth_getCode",
+    "eth_getStorageAt",
+    "eth_call",
+    "eth_estimateGas",
+    "eth_getLogs",
+    "net_version",
+}
+# Reads whose answer moves with every transaction sent; RPC_CACHE_TTL would hand
+# out reused nonces, stale gas estimates and missing receipts, so only calls in
+# flight are shared
+FLIGHT_ONLY_METHODS = {
+    "eth_getTransactionCount",
+    "eth_getTransactionReceipt",
+    "eth_estimateGas",
+}
+
+# event loop -> ClientSession, aiohttp sessions can't be shared across loops
+_sessions = weakref.WeakKeyDictionary()
+
+def shared_session():
+    """The keep-alive HTTP session of the running event loop.
+
+    web3 gives every provider its own session that closes the connection
+    after each request; sharing one pooled session keeps connections to
+    the RPC endpoints warm across tools and MCP sessions.
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = ClientSession(
+            raise_for_status=True,
+            connector=TCPConnector(limit=RPC_CONNECTION_LIMIT, limit_per_host=RPC_CONNECTION_LIMIT_PER_HOST),
+        )
+        _sessions[loop] = session
+    return session
+
+class SingleFlight:
+    """Lets identical concurrent requests share one upstream call.
+
+    The first request for a key starts the call as its own task; requests
+    for the same key arriving before it finishes await that task instead
+    of going upstream. A caller being cancelled doesn't cancel the call for
+    the others. With a ttl the result also answers requests arriving
+    within ttl seconds after it.
+    """
+
+    def __init__(self, ttl=RPC_CACHE_TTL, max_cached=1024):
+        self.ttl = ttl
+        self.max_cached = max_cached
+        self._inflight = {}
+        self._results = {}
+
+    def _finish(self, key, task, cache):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        response = task.result()
+        if cache and self.ttl > 0 and "error" not in response:
+            now = time.monotonic()
+            if len(self._results) >= self.max_cached:
+                self._results = {k: v for k, v in self._results.items() if v[0] > now}
+            self._results[key] = (now + self.ttl, response)
+
+    async def do(self, key, call, cache=True):
+        """Return the response of call(), shared with identical requests in flight
+
+        Args:
+            cache: Keep the result for ttl seconds, False only shares the call in flight
+        """
+        metrics.increment("rpc_coalescing", "requests")
+        cached = self._results.get(key) if cache else None
+        if cached and cached[0] > time.monotonic():
+            metrics.increment("rpc_coalescing", "cached")
+            return copy.deepcopy(cached[1])
+
+        task = self._inflight.get(key)
+        if task is None:
+            metrics.increment("rpc_coalescing", "upstream")
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done, cache))
+        else:
+            metrics.increment("rpc_coalescing", "coalesced")
+        # Every caller gets its own copy, web3 formatters must not see each other's changes
+        return copy.deepcopy(await asyncio.shield(task))
+
+single_flight = SingleFlight()
+
+def _request_key(endpoint_uri, method, params):
+    # Futures belong to one event loop, keep loops apart
+    return (id(asyncio.get_running_loop()), endpoint_uri, method, json.dumps(params, sort_keys=True, default=str))
+
+def mask_url(url):
+    """An endpoint URL without the path, which often carries the API key"""
+    scheme, _, rest = url.partition("://")
+    host = rest.split("/", 1)[0]
+    return f"{scheme}://{host}/..." if "/" in rest.strip("/") else url
+
+def compute_units(method):
+    """Budget cost of one request of `method`"""
+    return METHOD_COMPUTE_UNITS.get(method, DEFAULT_COMPUTE_UNITS)
+
+class TokenBucket:
+    """Compute unit budget of one endpoint.
+
+    Holds up to `burst` units and refills at `rate` units per second. A
+    request waits until the bucket holds its cost; waiting requests are
+    served first come, first served, so a burst of cheap calls can't keep
+    an expensive one waiting forever. A throttled response empties the
+    bucket so every caller slows down, not only the one that got it.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.spent = 0
+        self.requests = 0
+        self.waited = 0.0
+        self.throttled = 0
+        # event loop -> asyncio.Lock, locks can't be shared across loops
+        self._locks = weakref.WeakKeyDictionary()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost):
+        """Take `cost` units, waiting for the refill when the bucket is short
+
+        Returns:
+            Seconds spent waiting
+        """
+        self.requests += 1
+        self.spent += cost
+        if self.rate <= 0 or cost <= 0:
+            return 0.0
+        # A request costing more than a burst can never fit, let it drain the bucket
+        cost = min(cost, self.burst)
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            lock = self._locks[loop] = asyncio.Lock()
+
+        start = time.monotonic()
+        # asyncio.Lock wakes its waiters in arrival order
+        async with lock:
+            self._refill()
+            while self.tokens < cost:
+                await asyncio.sleep((cost - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= cost
+        waited = time.monotonic() - start
+        self.waited += waited
+        return waited
+
+    def throttle(self):
+        """The endpoint answered 429: spend whatever is left"""
+        self.throttled += 1
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+    def stats(self):
+        self._refill()
+        return {
+            "units_per_second": self.rate,
+            "burst": self.burst,
+            "available": round(self.tokens, 1) if self.rate > 0 else None,
+            "units_spent": self.spent,
+            "requests": self.requests,
+            "waited_seconds": round(self.waited, 3),
+            "throttled": self.throttled,
+        }
+
+# endpoint URL -> TokenBucket, shared by every provider of the endpoint
+rate_limiters = {}
+
+def is_metered(url):
+    """Whether an endpoint is a provider billing compute units, i.e. on one of RPC_METERED_HOSTS"""
+    host = urlparse(url).hostname or ""
+    return any(host == metered or host.endswith("." + metered) for metered in RPC_METERED_HOSTS)
+
+def rate_limiter(url):
+    """The compute unit budget of an endpoint, unlimited (rate 0) unless metered or configured"""
+    if url not in rate_limiters:
+        if url in RPC_RATE_LIMITS:
+            rate = float(RPC_RATE_LIMITS[url])
+            rate_limiters[url] = TokenBucket(rate, rate)
+        elif is_metered(url):
+            rate_limiters[url] = TokenBucket(RPC_COMPUTE_UNITS_PER_SECOND, RPC_COMPUTE_UNITS_BURST)
+        else:
+            rate_limiters[url] = TokenBucket(0)
+    return rate_limiters[url]
+
+def budget_stats():
+    """Compute unit budget usage of every endpoint called so far, keyed by masked URL"""
+    return {mask_url(url): bucket.stats() for url, bucket in sorted(rate_limiters.items())}
+
+def backoff_delay(attempt, retry_after=None):
+    """Seconds to wait before retry number `attempt` (0-based) of a throttled request.
+
+    Full jitter over an exponentially growing window, so callers throttled
+    together don't come back together; a Retry-After from the endpoint is
+    a lower bound.
+    """
+    delay = random.uniform(0, min(RPC_BACKOFF_MAX, RPC_BACKOFF_BASE * 2 ** (attempt + 1)))
+    return max(delay, retry_after or 0)
+
+def _retry_after(error):
+    try:
+        return float(error.headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def _is_throttled(error):
+    # -32005 also rejects too large eth_getLogs ranges, which a retry won't fix
+    return error.get("code") in THROTTLE_ERROR_CODES and not LOG_RANGE_ERROR.search(str(error.get("message", "")))
+
+class Throttled(Exception):
+    """A request was still throttled after RPC_THROTTLE_RETRIES retries"""
+
+class TimedAsyncHTTPProvider(AsyncHTTPProvider):
+    """AsyncHTTPProvider on the shared session, timing every JSON-RPC request as an
+    "rpc" downstream call, coalescing identical concurrent reads and keeping
+    within the endpoint's compute unit budget"""
+
+    def __init__(self, endpoint_uri=None, **kwargs):
+        # Throttled requests are retried below with jitter and the shared budget,
+        # not by web3's fixed backoff
+        kwargs.setdefault("exception_retry_configuration", None)
+        super().__init__(endpoint_uri, **kwargs)
+
+    @property
+    def coalesce_key(self):
+        return self.endpoint_uri
+
+    async def make_request(self, method, params):
+        if RPC_COALESCE and method in COALESCED_METHODS:
+            key = _request_key(self.coalesce_key, method, params)
+            cache = method not in FLIGHT_ONLY_METHODS and "pending" not in params
+            return await single_flight.do(key, lambda: self._timed_request(method, params), cache=cache)
+        return await self._timed_request(method, params)
+
+    async def _timed_request(self, method, params, retries=RPC_THROTTLE_RETRIES):
+        """Send one request within the endpoint's budget, retrying while it's throttled
+
+        Raises:
+            Throttled: The endpoint still answered 429 after `retries` retries
+        """
+        session = shared_session()
+        if getattr(self, "_shared_session", None) is not session:
+            await self.cache_async_session(session)
+            self._shared_session = session
+
+        bucket = rate_limiter(str(self.endpoint_uri))
+        cost = compute_units(str(method))
+        for attempt in range(retries + 1):
+            waited = await bucket.acquire(cost)
+            metrics.increment("rpc_budget", "compute_units", cost)
+            if waited:
+                metrics.increment("rpc_budget", "waited_ms", round(waited * 1000))
+
+            start = time.monotonic()
+            error = True
+            retry_after = None
+            try:
+                response = await super().make_request(method, params)
+                error = "error" in response
+                if not error or not _is_throttled(response["error"]):
+                    return response
+            except ClientResponseError as e:
+                if e.status != 429:
+                    raise
+                retry_after = _retry_after(e)
+            except (ClientError, asyncio.TimeoutError):
+                # Connection trouble: reads are safe to send again, anything else isn't
+                if method not in COALESCED_METHODS or attempt == retries:
+                    raise
+                metrics.increment("rpc_budget", "retries")
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            finally:
+                metrics.observe("rpc", str(method), time.monotonic() - start, error)
+
+            bucket.throttle()
+            metrics.increment("rpc_budget", "throttled")
+            if attempt == retries:
+                break
+            metrics.increment("rpc_budget", "retries")
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+        raise Throttled(f"{mask_url(str(self.endpoint_uri))} still throttled {method} after {retries} retries")
+
+class Endpoint:
+    """Health and latency of one RPC endpoint of a group"""
+
+    def __init__(self, url):
+        self.url = url
+        self.provider = TimedAsyncHTTPProvider(url)
+        self.ewma = None
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.hedges = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        """"closed" (healthy), "open" (skipped) or "half-open" (cooldown over, next request probes it)"""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= RPC_CIRCUIT_COOLDOWN:
+            return "half-open"
+        return "open"
+
+    def record(self, duration, ok):
+        self.requests += 1
+        if ok:
+            self.ewma = duration if self.ewma is None else RPC_EWMA_ALPHA * duration + (1 - RPC_EWMA_ALPHA) * self.ewma
+            self.consecutive_failures = 0
+            self.opened_at = None
+            return
+        self.errors += 1
+        self.consecutive_failures += 1
+        if self.state == "half-open" or self.consecutive_failures >= RPC_CIRCUIT_FAILURES:
+            self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {
+            "url": mask_url(self.url),
+            "state": self.state,
+            "ewma_ms": None if self.ewma is None else round(self.ewma * 1000, 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "consecutive_failures": self.consecutive_failures,
+            "hedges": self.hedges,
+        }
+
+class NoHealthyEndpoint(Exception):
+    pass
+
+class EndpointGroup:
+    """Routes requests across the endpoints of one chain.
+
+    Requests go to the endpoint with the lowest latency EWMA among those
+    with a closed circuit; an endpoint without samples yet goes first so
+    it gets measured. A failed request fails over to the next endpoint, and
+    RPC_CIRCUIT_FAILURES failures in a row take an endpoint out for
+    RPC_CIRCUIT_COOLDOWN seconds. Reads not answered within hedge_delay are
+    also sent to the next endpoint, the first answer wins.
+    """
+
+    def __init__(self, name, urls, hedge_delay=RPC_HEDGE_DELAY):
+        self.name = name
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.hedge_delay = hedge_delay
+
+    def ranked(self):
+        """Endpoints in the order they should be tried"""
+        closed = [endpoint for endpoint in self.endpoints if endpoint.state == "closed"]
+        closed.sort(key=lambda endpoint: -1 if endpoint.ewma is None else endpoint.ewma)
+        half_open = [endpoint for endpoint in self.endpoints if endpoint.state == "half-open"]
+        ranked = closed + half_open
+        if not ranked:
+            # Every circuit is open: rather try the one that failed longest ago than fail outright
+            ranked = sorted(self.endpoints, key=lambda endpoint: endpoint.opened_at)[:1]
+        return ranked
+
+    async def _attempt(self, endpoint, method, params):
+        start = time.monotonic()
+        try:
+            # With another endpoint to fail over to, don't sit out a throttled one's backoff
+            retries = 0 if len(self.endpoints) > 1 else RPC_THROTTLE_RETRIES
+            response = await endpoint.provider._timed_request(method, params, retries)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            endpoint.record(time.monotonic() - start, ok=False)
+            raise
+        # JSON-RPC errors such as a revert are answers, not endpoint failures
+        endpoint.record(time.monotonic() - start, ok=True)
+        return response
+
+    async def request(self, method, params, hedge=False):
+        """Send a request with failover, and hedging when `hedge` is set
+
+        Raises:
+            The error of the last endpoint tried when none of them answered
+        """
+        candidates = iter(self.ranked())
+        pending = set()
+        errors = []
+
+        def launch(hedged=False):
+            endpoint = next(candidates, None)
+            if endpoint is None:
+                return False
+            if hedged:
+                endpoint.hedges += 1
+                metrics.increment("rpc_routing", "hedged")
+            pending.add(asyncio.ensure_future(self._attempt(endpoint, method, params)))
+            return True
+
+        launch()
+        can_hedge = hedge and self.hedge_delay > 0
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    # Slow answer: ask the next endpoint as well, keep the first request running
+                    can_hedge = launch(hedged=True)
+                    continue
+                pending -= done
+                failed = [task for task in done if task.exception() is not None]
+                if len(failed) < len(done):
+                    return next(task for task in done if task.exception() is None).result()
+                for task in failed:
+                    # Fail over to the next endpoint
+                    errors.append(task.exception())
+                    metrics.increment("rpc_routing", "failovers")
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise errors[-1] if errors else NoHealthyEndpoint(f"No endpoint of {self.name} available")
+
+    def stats(self):
+        return {"name": self.name, "endpoints": [endpoint.stats() for endpoint in self.endpoints]}
+
+class RoutedAsyncHTTPProvider(TimedAsyncHTTPProvider):
+    """Provider sending every request through an EndpointGroup"""
+
+    def __init__(self, group):
+        super().__init__(group.endpoints[0].url)
+        self.group = group
+
+    @property
+    def coalesce_key(self):
+        return f"group:{self.group.name}"
+
+    async def _timed_request(self, method, params):
+        return await self.group.request(method, params, hedge=method in COALESCED_METHODS)
+
+endpoint_groups = {name: EndpointGroup(name, urls) for name, urls in RPC_ENDPOINT_GROUPS.items() if urls}
+
+def find_endpoint_group(url):
+    """The group named `url` or containing it, None for a plain URL"""
+    if url in endpoint_groups:
+        return endpoint_groups[url]
+    for group in endpoint_groups.values():
+        if any(endpoint.url == url for endpoint in group.endpoints):
+            return group
+    return None
+
+def routes_to_metered(url):
+    """Whether a tool's url, or any endpoint of its group, bills compute units"""
+    group = find_endpoint_group(url)
+    urls = [endpoint.url for endpoint in group.endpoints] if group else [url]
+    return any(is_metered(url) for url in urls)
+
+def make_provider(url):
+    """Provider for a tool's url: routed across its endpoint group if it has one"""
+    group = find_endpoint_group(url)
+    return RoutedAsyncHTTPProvider(group) if group else TimedAsyncHTTPProvider(url)
@@ -1,14 +1,25 @@
-import paramiko
+import asyncio
+import logging
 import os
+import gzip
 import time
 import socket
+import functools
+import threading
+import weakref
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dotenv import load_dotenv
+from metrics import metrics
 from os.path import join, dirname
 
 dotenv_path = join(dirname(__file__), '.env')
 load_dotenv(dotenv_path)
 
+logger = logging.getLogger(__name__)
+
 # Use the key file from the current directory
 # KEY_PATH = join(dirname(__file__), 'kevin1.pem')
 KEY_PATH = os.getenv("SSH_KEY_PATH")
@@ -18,6 +29,127 @@ PRE_COMMAND = """
 export PATH=/home/ubuntu/.local/share/pnpm:/home/ubuntu/.nvm/versions/node/v20.16.0/bin:/home/ubuntu/go/bin:/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin:/usr/games:/usr/local/games:/snap/bin:/usr/local/go/bin:/home/ubuntu/.foundry/bin:$PATH;
 """
 
+# Seconds between SSH keepalive packets on pooled connections
+SSH_KEEPALIVE = int(os.getenv("SSH_KEEPALIVE", "30"))
+# Pooled connections unused for this long are closed
+SSH_IDLE_TIMEOUT = int(os.getenv("SSH_IDLE_TIMEOUT", "300"))
+# Streamed command output: bytes kept in memory, where full logs are written
+# and the minimum seconds between two output callbacks
+SSH_OUTPUT_TAIL_BYTES = int(os.getenv("SSH_OUTPUT_TAIL_BYTES", "65536"))
+SSH_LOG_DIR = os.getenv("SSH_LOG_DIR", join(dirname(__file__), "logs"))
+SSH_STREAM_INTERVAL = float(os.getenv("SSH_STREAM_INTERVAL", "1"))
+# Lines passed to one output callback at most, older lines of a burst are skipped
+SSH_STREAM_MAX_LINES = int(os.getenv("SSH_STREAM_MAX_LINES", "50"))
+# Threads running async SSH commands; a command holds one for as long as it runs
+# (a deploy for tens of minutes), so this bounds the commands running at once
+SSH_WORKERS = int(os.getenv("SSH_WORKERS", "64"))
+
+# (hostname, username, key_path) -> {"client": SSHClient, "last_used": float, "channels": WeakSet}
+_clients = {}
+_clients_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def load_private_key(key_path=KEY_PATH):
+    """Read and parse an RSA private key file once per path"""
+    import paramiko
+
+    return paramiko.RSAKey.from_private_key_file(key_path)
+
+def _evict_idle_clients(now):
+    for pool_key, entry in list(_clients.items()):
+        transport = entry["client"].get_transport()
+        if transport is None or not transport.is_active():
+            entry["client"].close()
+            del _clients[pool_key]
+            continue
+        # A long trh-sdk deploy keeps its channel open, that connection isn't idle
+        busy = any(not channel.closed for channel in entry["channels"])
+        if not busy and now - entry["last_used"] > SSH_IDLE_TIMEOUT:
+            entry["client"].close()
+            del _clients[pool_key]
+
+def get_ssh_client(hostname, username="ubuntu", key_path=KEY_PATH):
+    """Get a connected SSHClient for a host from the connection pool
+
+    The handshake and authentication happen once per host; later commands
+    open new channels on the same transport. Dead connections are replaced
+    and connections idle for SSH_IDLE_TIMEOUT seconds are closed.
+    """
+    pool_key = (hostname, username, key_path)
+    with _clients_lock:
+        now = time.monotonic()
+        _evict_idle_clients(now)
+        entry = _clients.get(pool_key)
+        if entry:
+            entry["last_used"] = now
+            return entry["client"]
+
+    # Connect outside the lock so one slow host doesn't hold up the others.
+    # paramiko is imported on first use, not when the server starts.
+    import paramiko
+
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    with metrics.timer("ssh", "connect"):
+        client.connect(hostname=hostname, username=username, pkey=load_private_key(key_path))
+    client.get_transport().set_keepalive(SSH_KEEPALIVE)
+
+    with _clients_lock:
+        entry = _clients.get(pool_key)
+        if entry:
+            # Another thread connected to the same host meanwhile, keep theirs
+            client.close()
+            entry["last_used"] = time.monotonic()
+            return entry["client"]
+        _clients[pool_key] = {"client": client, "last_used": time.monotonic(), "channels": weakref.WeakSet()}
+    return client
+
+def close_ssh_clients(hostname=None):
+    """Close pooled connections, to one host or to every host"""
+    with _clients_lock:
+        for pool_key, entry in list(_clients.items()):
+            if hostname is None or pool_key[0] == hostname:
+                entry["client"].close()
+                del _clients[pool_key]
+
+def _open_channel(hostname, command, username, key_path, get_pty):
+    """Start a command on a new channel of the pooled connection to a host,
+    reconnecting once if the connection went stale"""
+    import paramiko
+
+    def open_session():
+        client = get_ssh_client(hostname, username, key_path)
+        channel = client.get_transport().open_session()
+        if get_pty:
+            channel.get_pty()
+        channel.exec_command(command)
+        return client, channel
+
+    try:
+        client, channel = open_session()
+    except (paramiko.SSHException, EOFError, OSError):
+        close_ssh_clients(hostname)
+        client, channel = open_session()
+
+    with _clients_lock:
+        entry = _clients.get((hostname, username, key_path))
+        if entry and entry["client"] is client:
+            entry["channels"].add(channel)
+    return channel
+
+def _exec_pooled(hostname, command, username, key_path, get_pty):
+    """Run a command on a pooled connection, returning (stdin, stdout, stderr)
+    like SSHClient.exec_command"""
+    channel = _open_channel(hostname, command, username, key_path, get_pty)
+    return channel.makefile_stdin("wb"), channel.makefile("r"), channel.makefile_stderr("r")
+
+def _read_channel(channel):
+    stdout = channel.makefile("r").read().decode()
+    stderr = channel.makefile_stderr("r").read().decode()
+    return stdout, stderr, channel.recv_exit_status()
+
 def exec_command(
         hostname, 
         command,
@@ -26,13 +158,9 @@ def exec_command(
         precommand=PRE_COMMAND,
     ):
     # print(f"Using key: {key_path}, username: {username}")  # 디버깅용 출력
-    key = paramiko.RSAKey.from_private_key_file(key_path)
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    client.connect(hostname=hostname, username=username, pkey=key)
-    sin,sout,serr = client.exec_command(precommand+command,get_pty=False)
-    
-    return sout.read().decode(), serr.read().decode()
+    with metrics.timer("ssh", "exec"):
+        sin,sout,serr = _exec_pooled(hostname, precommand+command, username, key_path, get_pty=False)
+        return sout.read().decode(), serr.read().decode()
 
 def exec_command_interactive(
         hostname, 
@@ -41,22 +169,231 @@ def exec_command_interactive(
         key_path=KEY_PATH, 
         precommand=PRE_COMMAND,
     ):
-    key = paramiko.RSAKey.from_private_key_file(key_path)
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # print('started...')
+    with metrics.timer("ssh", "exec"):
+        stdin, stdout, stderr = _exec_pooled(hostname, precommand+command, username, key_path, get_pty=True)
 
-    client.connect(hostname=hostname, username=username, pkey=key)
+        lines = []
+        for line in iter(stdout.readline, ""):
+            # stdout belongs to the MCP stdio transport, never print here
+            logger.debug(line.rstrip("\r\n"))
+            lines.append(line)
+        # print('finished.')
 
-    # print('started...')
-    stdin, stdout, stderr = client.exec_command(precommand+command, get_pty=True)
+        return "".join(lines), stderr.read().decode()
+
+class OutputTail:
+    """Ring buffer keeping the last max_bytes of a command's output lines"""
+
+    def __init__(self, max_bytes=SSH_OUTPUT_TAIL_BYTES):
+        self.max_bytes = max_bytes
+        self.lines = 0
+        self.truncated = False
+        self._lines = deque()
+        self._size = 0
+
+    def append(self, line):
+        self._lines.append(line)
+        self._size += len(line)
+        self.lines += 1
+        while self._size > self.max_bytes and len(self._lines) > 1:
+            self._size -= len(self._lines.popleft())
+            self.truncated = True
+
+    def text(self):
+        return b"".join(self._lines).decode(errors="replace")
+
+def _ssh_executor():
+    """The thread pool for blocking SSH work, kept apart from the default
+    executor so long commands don't starve asyncio.to_thread callers"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SSH_WORKERS, thread_name_prefix="ssh")
+        return _executor
+
+async def _in_ssh_thread(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_ssh_executor(), func, *args)
+
+async def exec_command_async(
+        hostname,
+        command,
+        username="ubuntu",
+        key_path=KEY_PATH,
+        precommand=PRE_COMMAND,
+        get_pty=False,
+        timeout=None,
+    ):
+    """Run a command like exec_command without blocking the event loop
+
+    The SSH work runs in a thread of the SSH pool (SSH_WORKERS threads) on
+    a pooled connection, so many hosts can run commands concurrently from
+    one event loop without tying up the default executor. When the
+    timeout expires or the calling task is cancelled, the channel is
+    closed, which also hangs up the remote command when get_pty is set.
+    Args:
+        hostname: The host to run the command on
+        command: The command, run after precommand (PATH setup)
+        get_pty: Request a pseudo terminal, as exec_command_interactive does
+        timeout: Seconds after which the command is abandoned, None waits forever
+    Returns:
+        (stdout, stderr)
+    Raises:
+        TimeoutError: The command did not finish within timeout
+    """
+    stdout, stderr, _ = await exec_command_with_status_async(
+        hostname, command, username, key_path, precommand, get_pty, timeout
+    )
+    return stdout, stderr
+
+async def exec_command_with_status_async(
+        hostname,
+        command,
+        username="ubuntu",
+        key_path=KEY_PATH,
+        precommand=PRE_COMMAND,
+        get_pty=False,
+        timeout=None,
+    ):
+    """Same as exec_command_async, also returning the exit status
+    Returns:
+        (stdout, stderr, exit_status)
+    """
+    with metrics.timer("ssh", "exec"):
+        channel = await _in_ssh_thread(_open_channel, hostname, precommand+command, username, key_path, get_pty)
+        try:
+            return await asyncio.wait_for(_in_ssh_thread(_read_channel, channel), timeout)
+        except asyncio.TimeoutError:
+            channel.close()
+            raise TimeoutError(f"Command timed out after {timeout}s on {hostname}: {command}")
+        except asyncio.CancelledError:
+            # Unblocks the reader thread and stops the remote command
+            channel.close()
+            raise
+
+async def exec_command_stream_async(
+        hostname,
+        command,
+        on_output=None,
+        on_line=None,
+        username="ubuntu",
+        key_path=KEY_PATH,
+        precommand=PRE_COMMAND,
+        get_pty=True,
+        timeout=None,
+        log_path=None,
+        interval=SSH_STREAM_INTERVAL,
+        tail_bytes=SSH_OUTPUT_TAIL_BYTES,
+    ):
+    """Run a long command such as trh-sdk deploy, streaming its output as it runs
+
+    Memory stays constant however long the output gets: only the last
+    tail_bytes are kept, while the full output is written to a gzip file.
+    Output lines are passed to on_output in batches, at most once per
+    interval seconds, so a chatty command doesn't flood the MCP client.
+    Args:
+        hostname: The host to run the command on
+        command: The command, run after precommand (PATH setup)
+        on_output: Optional callback on_output(lines) receiving new output lines
+        on_line: Optional callback on_line(line, at) called for every output line
+                 with the epoch time it was received, not rate limited
+        get_pty: Request a pseudo terminal, stderr is then part of the output
+        timeout: Seconds after which the command is abandoned, None waits forever
+        log_path: The gzip file for the full output, by default under SSH_LOG_DIR
+        interval: Minimum seconds between two on_output calls
+        tail_bytes: Bytes of output kept in memory and returned
+    Returns:
+        {
+            "output": "...last tail_bytes of the output...",
+            "stderr": "",
+            "exit_status": 0,
+            "lines": 1520,
+            "truncated": True,
+            "log_path": "logs/1.2.3.4-20250604-230913.log.gz"
+        }
+    Raises:
+        TimeoutError: The command did not finish within timeout
+    """
+    if log_path is None:
+        log_path = join(SSH_LOG_DIR, f"{hostname}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.log.gz")
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    tail = OutputTail(tail_bytes)
+
+    channel = await _in_ssh_thread(_open_channel, hostname, precommand+command, username, key_path, get_pty)
+
+    def pump():
+        stdout = channel.makefile("rb")
+        try:
+            os.makedirs(dirname(log_path) or ".", exist_ok=True)
+            with gzip.open(log_path, "wb") as log_file:
+                for line in iter(stdout.readline, b""):
+                    log_file.write(line)
+                    loop.call_soon_threadsafe(queue.put_nowait, (time.time(), line))
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+        return channel.makefile_stderr("rb").read().decode(errors="replace"), channel.recv_exit_status()
+
+    async def consume():
+        batch = deque(maxlen=SSH_STREAM_MAX_LINES)
+        skipped = 0
+        last_flush = time.monotonic()
+
+        def flush():
+            nonlocal skipped, last_flush
+            # A separate list: on the full deque appendleft would push out the newest line
+            on_output([f"... {skipped} lines skipped", *batch] if skipped else list(batch))
+            batch.clear()
+            skipped = 0
+            last_flush = time.monotonic()
+
+        while True:
+            if batch:
+                # Flush a pending batch on time even when the command goes quiet
+                try:
+                    line = await asyncio.wait_for(queue.get(), max(last_flush + interval - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    flush()
+                    continue
+            else:
+                line = await queue.get()
+            if line is None:
+                break
+            at, line = line
+            tail.append(line)
+            if on_line:
+                on_line(line.decode(errors="replace"), at)
+            if on_output:
+                if len(batch) == batch.maxlen:
+                    skipped += 1
+                batch.append(line.decode(errors="replace").rstrip("\r\n"))
+                if time.monotonic() - last_flush >= interval:
+                    flush()
+        if batch:
+            flush()
 
-    output = ''
-    for line in iter(stdout.readline, ""):
-        print(line, end="")
-        output += line
-    # print('finished.')
+    reader = asyncio.ensure_future(_in_ssh_thread(pump))
+    # The reader ends with an error once the channel is closed on timeout, nobody awaits it then
+    reader.add_done_callback(lambda future: future.cancelled() or future.exception())
+    try:
+        with metrics.timer("ssh", "exec_stream"):
+            await asyncio.wait_for(consume(), timeout)
+            stderr, exit_status = await reader
+    except asyncio.TimeoutError:
+        channel.close()
+        raise TimeoutError(f"Command timed out after {timeout}s on {hostname}: {command}, output in {log_path}")
+    except asyncio.CancelledError:
+        channel.close()
+        raise
 
-    return output, stderr.read().decode()
+    return {
+        "output": tail.text(),
+        "stderr": stderr,
+        "exit_status": exit_status,
+        "lines": tail.lines,
+        "truncated": tail.truncated,
+        "log_path": log_path,
+    }
 
 def wait_for_ssh_ready(host, port=22, timeout=300):
     """Wait until SSH port (22) is open"""
@@ -64,10 +401,10 @@ def wait_for_ssh_ready(host, port=22, timeout=300):
     while time.time() - start < timeout:
         try:
             with socket.create_connection((host, port), timeout=5):
-                print("SSH port is now open.")
+                logger.info(f"SSH port of {host} is now open")
                 return True
         except Exception:
-            print("SSH port is not open yet. Retrying...")
+            logger.info(f"SSH port of {host} is not open yet, retrying")
             time.sleep(5)
-    print("SSH port did not open. (timeout)")
+    logger.warning(f"SSH port of {host} did not open (timeout)")
     return False
\ No newline at end of file
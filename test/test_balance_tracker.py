@@ -0,0 +1,123 @@
+import asyncio
+import pytest
+
+import balance_tracker
+from balance_tracker import BalanceWatcher, touched_addresses
+
+ALICE = "0x" + "aa" * 20
+BOB = "0x" + "bb" * 20
+CAROL = "0x" + "cc" * 20
+MINER = "0x" + "ee" * 20
+WETH = "0x" + "de" * 20
+
+class FakeEth:
+    """A chain without Multicall3: blocks of (sender, recipient, value) transfers"""
+
+    def __init__(self, balances):
+        self.blocks = [{"number": 0, "hash": b"h0", "parentHash": b"", "miner": MINER, "transactions": []}]
+        self.history = [dict(balances)]
+        self.balance_calls = []
+
+    def mine(self, transfers=(), logs=(), reorg=False):
+        if reorg:
+            self.blocks.pop()
+            self.history.pop()
+        number = len(self.blocks)
+        balances = dict(self.history[-1])
+        for sender, recipient, value in transfers:
+            balances[sender] = balances.get(sender, 0) - value
+            balances[recipient] = balances.get(recipient, 0) + value
+        self.history.append(balances)
+        self.blocks.append({
+            "number": number,
+            "hash": f"h{number}{'r' if reorg else ''}".encode(),
+            "parentHash": self.blocks[-1]["hash"],
+            "miner": MINER,
+            "transactions": [{"from": sender, "to": recipient} for sender, recipient, _ in transfers],
+            "logs": list(logs),
+        })
+
+    @property
+    async def block_number(self):
+        return len(self.blocks) - 1
+
+    async def get_block(self, block, full_transactions=False):
+        return self.blocks[-1 if block == "latest" else block]
+
+    async def get_block_receipts(self, block):
+        return [{"contractAddress": None, "logs": self.blocks[block]["logs"]}]
+
+    async def get_code(self, address):
+        return b""
+
+    async def get_balance(self, address, block):
+        self.balance_calls.append((address.lower(), block))
+        return self.history[block].get(address.lower(), 0)
+
+class FakeWeb3:
+    def __init__(self, balances):
+        self.eth = FakeEth(balances)
+
+def test_touched_addresses():
+    topic = bytes(12) + bytes.fromhex(CAROL[2:])
+    block = {
+        "miner": MINER,
+        "transactions": [{"from": ALICE, "to": None}],
+        "withdrawals": [{"address": BOB}],
+    }
+    receipts = [{"contractAddress": None, "logs": [{"topics": [b"\x01" * 32, topic]}]}]
+    assert touched_addresses(block, receipts) == {MINER, ALICE, BOB, CAROL}
+
+@pytest.mark.asyncio
+async def test_watcher_refreshes_only_touched_addresses(monkeypatch):
+    monkeypatch.setattr(balance_tracker, "BALANCE_RECONCILE_INTERVAL", 3600)
+    w3 = FakeWeb3({ALICE: 100, BOB: 50, CAROL: 7})
+    watcher = BalanceWatcher(w3, "test", [ALICE, BOB, CAROL])
+    await watcher.poll()
+    assert watcher.balances[ALICE] == (100, 0)
+    assert watcher.counters["reconciliations"] == 1
+
+    w3.eth.mine([(ALICE, BOB, 30)])
+    w3.eth.mine()
+    # WETH withdrawal by Carol: a log names her, the ETH comes from the contract
+    w3.eth.mine([(MINER, WETH, 0)], logs=[{"topics": [b"\x01" * 32, bytes(12) + bytes.fromhex(CAROL[2:])]}])
+    w3.eth.balance_calls.clear()
+    await watcher.poll()
+    assert sorted(w3.eth.balance_calls) == [(ALICE, 1), (BOB, 1), (CAROL, 3)]
+    assert watcher.balances[ALICE] == (70, 1)
+    assert watcher.balances[BOB] == (80, 1)
+    assert watcher.block_number == 3
+
+@pytest.mark.asyncio
+async def test_watcher_reconciles_after_reorg_and_when_behind(monkeypatch):
+    monkeypatch.setattr(balance_tracker, "BALANCE_RECONCILE_INTERVAL", 3600)
+    monkeypatch.setattr(balance_tracker, "BALANCE_MAX_CATCHUP", 5)
+    w3 = FakeWeb3({ALICE: 100, BOB: 0})
+    watcher = BalanceWatcher(w3, "test", [ALICE, BOB])
+    w3.eth.mine([(ALICE, BOB, 10)])
+    await watcher.poll()
+    # Block 1 is replaced, noticed once block 2 doesn't extend the block 1 seen
+    w3.eth.mine([(ALICE, BOB, 20)], reorg=True)
+    w3.eth.mine()
+    await watcher.poll()
+    assert watcher.counters["reconciliations"] == 2
+    assert watcher.balances[BOB] == (20, 2)
+
+    for _ in range(6):
+        w3.eth.mine()
+    await watcher.poll()
+    assert watcher.counters["reconciliations"] == 3
+    assert watcher.block_number == 8
+
+@pytest.mark.asyncio
+async def test_watcher_lookup_only_while_current(monkeypatch):
+    monkeypatch.setattr(balance_tracker, "BALANCE_POLL_INTERVAL", 0.01)
+    w3 = FakeWeb3({ALICE: 100})
+    watcher = BalanceWatcher(w3, "test", [ALICE.upper().replace("0X", "0x")])
+    assert watcher.lookup(ALICE) is None
+    watcher.start()
+    await asyncio.sleep(0.05)
+    assert watcher.lookup(ALICE) == (100, 0)
+    assert watcher.lookup(BOB) is None
+    watcher.stop()
+    assert watcher.lookup(ALICE) is None
@@ -0,0 +1,26 @@
+import subprocess
+
+from bootstrap import render_user_data, STATUS_MARKER, DEPLOY_LOG
+
+def test_render_user_data_deploy():
+    """The rendered script prepares docker and runs the deploy as the SSH user."""
+    user_data = render_user_data()
+    assert user_data.startswith("#!/bin/bash")
+    assert "chmod 666 /var/run/docker.sock" in user_data
+    assert "sudo -u ubuntu" in user_data
+    assert 'script -qefc "trh-sdk deploy"' in user_data
+    assert f"echo done > {STATUS_MARKER}" in user_data
+    assert DEPLOY_LOG in user_data
+    # PATH from ssh.PRE_COMMAND is kept for the inner shell to expand
+    assert ":$PATH;" in user_data
+
+def test_render_user_data_custom_command():
+    """Test rendering with a restart command instead of the deploy."""
+    user_data = render_user_data("docker ps -aq | xargs -r docker restart", username="admin")
+    assert 'script -qefc "docker ps -aq | xargs -r docker restart"' in user_data
+    assert "sudo -u admin" in user_data
+
+def test_render_user_data_is_valid_bash():
+    """Test that the rendered script parses as bash."""
+    result = subprocess.run(["bash", "-n"], input=render_user_data(), text=True, capture_output=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,36 @@
+from deploy_timing import DeployTimer, percentile, summarize
+
+def test_deploy_timer_stage_breakdown():
+    timer = DeployTimer(start=1000.0)
+    lines = [
+        (1001.0, "Checking trh-sdk environment"),
+        (1004.0, "\x1b[32mStarting L1 devnet...\x1b[0m"),
+        (1034.0, "Starting L2 devnet"),
+        (1050.0, "L1 block 12"),  # an earlier stage's marker doesn't reopen it
+        (1074.0, "Deploying contracts"),
+        (1124.0, "Funding test accounts"),
+    ]
+    for at, line in lines:
+        timer.feed(line, at)
+
+    timings = timer.finish(end=1134.0)
+    stages = timings["stages"]
+    assert list(stages) == ["setup", "l1_startup", "l2_startup", "contracts", "accounts"]
+    assert stages["setup"]["duration"] == 4.0
+    assert stages["l1_startup"]["duration"] == 30.0
+    assert stages["l1_startup"]["marker"] == "Starting L1 devnet..."
+    assert stages["l2_startup"]["duration"] == 40.0
+    assert stages["contracts"]["duration"] == 50.0
+    assert stages["accounts"]["end"] == 134.0
+    assert timings["total"] == 134.0
+    assert timings["lines"] == 6
+
+def test_percentiles():
+    values = [10, 20, 30, 40, 50]
+    assert percentile(values, 50) == 30
+    assert percentile(values, 90) == 46
+    assert percentile([], 50) is None
+    summary = summarize(values)
+    assert summary["count"] == 5
+    assert summary["p99"] == 49.6
+    assert summarize([]) == {"count": 0}
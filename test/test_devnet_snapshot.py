@@ -0,0 +1,31 @@
+import shlex
+import subprocess
+import pytest
+
+from devnet_snapshot import delete_command, parse_output, restore_command, snapshot_command, snapshot_path
+
+def script(command):
+    """The bash script inside a `bash -eo pipefail -c '...'` command"""
+    return shlex.split(command)[-1]
+
+@pytest.mark.parametrize("command", [snapshot_command("snap-1"), snapshot_command("snap-1", "l1_data, l2_data"), restore_command("snap-1")])
+def test_commands_are_valid_bash(command):
+    assert command.startswith("bash -eo pipefail -c ")
+    subprocess.run(["bash", "-n", "-c", script(command)], check=True)
+
+def test_snapshot_command_volumes():
+    assert 'volumes=""' in script(snapshot_command("snap-1"))
+    assert 'volumes="l1_data l2_data"' in script(snapshot_command("snap-1", "l1_data, l2_data"))
+    # Containers are started again however archiving ends
+    assert "trap 'docker start $containers > /dev/null' EXIT" in script(snapshot_command("snap-1"))
+
+def test_snapshot_ids_are_plain_names():
+    assert snapshot_path("snap-20250604-230913").endswith("/snap-20250604-230913")
+    for snapshot_id in ("../etc", "a b", "$(reboot)", ""):
+        with pytest.raises(ValueError):
+            snapshot_path(snapshot_id)
+    assert delete_command("snap-1").startswith("sudo rm -rf ")
+
+def test_parse_output():
+    assert parse_output("volumes: l1_data l2_data\nsize: 1024\n") == {"volumes": ["l1_data", "l2_data"], "size_bytes": 1024}
+    assert parse_output("volumes: l1_data\n") == {"volumes": ["l1_data"]}
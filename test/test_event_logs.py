@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+
+import event_logs
+from event_logs import LogCache, LogRangeError, LogQueryError, iter_logs, logs_from_response, cache_key
+
+def fake_chain(logs_per_block, max_results=50, delay=0.001):
+    """A request(start, end) over a chain with logs_per_block(block) logs per block,
+    rejecting ranges with more than max_results logs like a provider, plus its call log"""
+    calls = []
+
+    async def request(start, end):
+        calls.append((start, end))
+        await asyncio.sleep(delay)
+        logs = [
+            {"blockNumber": block, "logIndex": i}
+            for block in range(start, end + 1)
+            for i in range(logs_per_block(block))
+        ]
+        if len(logs) > max_results:
+            raise LogRangeError(f"query returned more than {max_results} results")
+        return logs
+
+    return request, calls
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+@pytest.mark.asyncio
+async def test_iter_logs_splits_dense_ranges_and_keeps_order():
+    # Blocks 400-449 are dense, the rest sparse
+    request, calls = fake_chain(lambda block: 5 if 400 <= block < 450 else (1 if block % 100 == 0 else 0))
+    stats = {}
+    chunks = await collect(iter_logs(request, 0, 999, chunk_size=100, concurrency=4, stats=stats))
+
+    # Chunks come back contiguous and in order despite concurrent fetching and splits
+    assert chunks[0][0] == 0 and chunks[-1][1] == 999
+    assert all(previous[1] + 1 == chunk[0] for previous, chunk in zip(chunks, chunks[1:]))
+    logs = [log for chunk in chunks for log in chunk[2]]
+    assert [log["blockNumber"] for log in logs] == sorted(log["blockNumber"] for log in logs)
+    assert len(logs) == 50 * 5 + 9
+    assert stats["splits"] > 0
+    assert stats["requests"] == len(calls)
+
+@pytest.mark.asyncio
+async def test_iter_logs_grows_sparse_chunks(monkeypatch):
+    monkeypatch.setattr(event_logs, "LOGS_TARGET_RESULTS", 100)
+    request, calls = fake_chain(lambda block: 0)
+    await collect(iter_logs(request, 0, 99999, chunk_size=100, concurrency=1))
+    sizes = [end - start + 1 for start, end in calls]
+    assert sizes[:3] == [100, 200, 400]
+    assert len(calls) < 20
+
+@pytest.mark.asyncio
+async def test_iter_logs_single_block_too_large():
+    request, _ = fake_chain(lambda block: 100)
+    with pytest.raises(LogRangeError):
+        await collect(iter_logs(request, 0, 10, chunk_size=4))
+
+@pytest.mark.asyncio
+async def test_iter_logs_caches_finalized_ranges():
+    request, calls = fake_chain(lambda block: 1 if block % 10 == 0 else 0)
+    cache = LogCache()
+    key = cache_key("http://rpc.test", "0xAbC", None)
+    first = await collect(iter_logs(request, 0, 499, chunk_size=100, cache=cache, key=key, finalized=299))
+    calls.clear()
+
+    # Only blocks past the finalized ones are fetched again
+    second = await collect(iter_logs(request, 50, 499, chunk_size=100, cache=cache, key=cache_key("http://rpc.test", "0xabc", None), finalized=299))
+    assert all(start >= 300 for start, _ in calls)
+    assert [log for chunk in second for log in chunk[2]] == [
+        log for chunk in first for log in chunk[2] if log["blockNumber"] >= 50
+    ]
+
+def test_logs_from_response():
+    assert logs_from_response({"result": [{"blockNumber": "0x10", "logIndex": "0x1", "data": "0x"}]}, 0) == [
+        {"blockNumber": 16, "logIndex": 1, "data": "0x"}
+    ]
+    with pytest.raises(LogRangeError) as e:
+        logs_from_response({"error": {"code": -32602, "message": "Log response size exceeded. this block range should work: [0x64, 0x7d0]"}}, 100)
+    assert e.value.suggested_end == 2000
+    with pytest.raises(LogQueryError):
+        logs_from_response({"error": {"code": -32000, "message": "invalid address"}}, 0)
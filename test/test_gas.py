@@ -0,0 +1,88 @@
+import pytest
+
+from gas import EMPTY_CODE_HASH, TRANSFER_GAS, GasEstimator, intrinsic_gas
+
+TOKEN_CODE = b"\x60\x80\x60\x40"
+TRANSFER_DATA = "0xa9059cbb" + "00" * 64
+
+class FakeEth:
+    def __init__(self, codes):
+        self.codes = codes
+        self.estimates = []
+        self.code_calls = 0
+
+    async def get_code(self, address):
+        self.code_calls += 1
+        return self.codes.get(address, b"")
+
+    async def estimate_gas(self, tx):
+        self.estimates.append(tx)
+        return TRANSFER_GAS if not tx.get("data") else 51000
+
+class FakeWeb3:
+    def __init__(self, codes):
+        self.eth = FakeEth(codes)
+
+@pytest.mark.asyncio
+async def test_gas_limit_caches_by_code_hash_and_selector():
+    w3 = FakeWeb3({"0xToken1": TOKEN_CODE, "0xToken2": TOKEN_CODE})
+    estimator = GasEstimator(margin=0.2)
+
+    limit, shape, source = await estimator.gas_limit(w3, 1, {"to": "0xToken1", "data": TRANSFER_DATA})
+    assert (limit, source) == (61200, "estimate")
+    # Another copy of the same contract, same function: no estimate
+    limit, _, source = await estimator.gas_limit(w3, 1, {"to": "0xToken2", "data": TRANSFER_DATA})
+    assert (limit, source) == (61200, "cache")
+    # Another chain is another shape
+    _, _, source = await estimator.gas_limit(w3, 2, {"to": "0xToken1", "data": TRANSFER_DATA})
+    assert source == "estimate"
+    assert len(w3.eth.estimates) == 2
+    # Code hashes are cached per chain and address
+    await estimator.gas_limit(w3, 1, {"to": "0xToken1", "data": TRANSFER_DATA})
+    assert w3.eth.code_calls == 3
+    assert estimator.stats()["hits"] == 2
+
+@pytest.mark.asyncio
+async def test_plain_transfer_gets_exact_limit():
+    w3 = FakeWeb3({})
+    estimator = GasEstimator(margin=0.2)
+    limit, shape, _ = await estimator.gas_limit(w3, 1, {"to": "0xAlice", "value": 1})
+    assert limit == TRANSFER_GAS
+    assert shape == (1, EMPTY_CODE_HASH, None, 0)
+
+@pytest.mark.asyncio
+async def test_observe_raises_and_drops_estimates():
+    w3 = FakeWeb3({"0xToken1": TOKEN_CODE})
+    estimator = GasEstimator(margin=0.2)
+    tx = {"to": "0xToken1", "data": TRANSFER_DATA}
+    limit, shape, _ = await estimator.gas_limit(w3, 1, tx)
+
+    estimator.observe(shape, limit, 55000, 1)
+    assert (await estimator.gas_limit(w3, 1, tx))[0] == 66000
+    estimator.observe(shape, 66000, 66000, 0)
+    assert (await estimator.gas_limit(w3, 1, tx))[2] == "estimate"
+
+@pytest.mark.asyncio
+async def test_calldata_size_buckets_and_intrinsic_floor():
+    w3 = FakeWeb3({"0xRouter": TOKEN_CODE})
+    estimator = GasEstimator(margin=0.2)
+    short = {"to": "0xRouter", "data": "0x12345678" + "ff" * 64}
+    _, short_shape, _ = await estimator.gas_limit(w3, 1, short)
+
+    # Calldata 40x longer is another shape and gets its own estimate
+    long = {"to": "0xRouter", "data": "0x12345678" + "ff" * 2600}
+    _, long_shape, source = await estimator.gas_limit(w3, 1, long)
+    assert source == "estimate" and long_shape != short_shape
+
+    # Within a bucket the cached limit is floored at the intrinsic gas of the actual calldata
+    longer = {"to": "0xRouter", "data": "0x12345678" + "ff" * 4000}
+    limit, shape, source = await estimator.gas_limit(w3, 1, longer)
+    assert (shape, source) == (long_shape, "cache")
+    assert limit == intrinsic_gas(longer) == 21000 + 4004 * 16
+
+def test_forget_drops_the_shape():
+    estimator = GasEstimator()
+    estimator._estimates[(1, EMPTY_CODE_HASH, "0x12345678", 3)] = 30000
+    estimator.forget((1, EMPTY_CODE_HASH, "0x12345678", 3))
+    estimator.forget((1, EMPTY_CODE_HASH, "0x12345678", 3))
+    assert estimator.stats()["shapes"] == 0
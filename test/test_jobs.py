@@ -0,0 +1,147 @@
+import asyncio
+import os
+import pytest
+
+from tinydb import TinyDB, Query
+
+from jobs import JobManager
+
+TEST_DB_PATH = "test_jobs.db"
+
+@pytest.fixture
+def jobs_db():
+    db = TinyDB(TEST_DB_PATH)
+    yield db
+    db.close()
+    if os.path.exists(TEST_DB_PATH):
+        os.remove(TEST_DB_PATH)
+
+async def wait_for_job(manager, job_id, timeout=5):
+    for _ in range(int(timeout / 0.05)):
+        job = manager.get(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"Job {job_id} did not finish")
+
+@pytest.mark.asyncio
+async def test_submit_returns_immediately_and_runs_in_background(jobs_db):
+    """Test that a job is queued right away and its stage, logs and result are stored."""
+    release = asyncio.Event()
+
+    async def handler(job):
+        job.log("starting")
+        job.set_stage("deploy", done=1, total=2)
+        await release.wait()
+        return {"name": job.params["name"]}
+
+    manager = JobManager(jobs_db, workers=2)
+    manager.register("create_devnet", handler)
+
+    record = await manager.submit("create_devnet", {"name": "devnet-1"})
+    assert record["status"] == "queued"
+
+    await asyncio.sleep(0.1)
+    running = manager.get(record["job_id"])
+    assert running["status"] == "running"
+    assert running["stage"] == "deploy"
+    assert running["progress"] == 0.5
+
+    release.set()
+    job = await wait_for_job(manager, record["job_id"])
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"name": "devnet-1"}
+    assert job["progress"] == 1.0
+    assert job["logs"][0].endswith("starting")
+
+@pytest.mark.asyncio
+async def test_failed_job_keeps_error(jobs_db):
+    """Test that a raising handler marks the job failed with its error."""
+    async def handler(job):
+        raise RuntimeError("deploy failed")
+
+    manager = JobManager(jobs_db)
+    manager.register("create_devnet", handler)
+    record = await manager.submit("create_devnet", {"name": "devnet-1"})
+
+    job = await wait_for_job(manager, record["job_id"])
+    assert job["status"] == "failed"
+    assert job["error"] == "deploy failed"
+    assert manager.list(status="failed")[0]["job_id"] == record["job_id"]
+
+@pytest.mark.asyncio
+async def test_workers_bound_concurrency(jobs_db):
+    """Test that no more than `workers` jobs run at the same time."""
+    running = 0
+    peak = 0
+
+    async def handler(job):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.1)
+        running -= 1
+
+    manager = JobManager(jobs_db, workers=2)
+    manager.register("create_devnet", handler)
+    records = [await manager.submit("create_devnet", {"name": f"devnet-{i}"}) for i in range(5)]
+
+    for record in records:
+        await wait_for_job(manager, record["job_id"])
+    assert peak == 2
+
+@pytest.mark.asyncio
+async def test_unfinished_jobs_resume_after_restart(jobs_db):
+    """Jobs left running by a previous process are queued again on start."""
+    async def never_finishes(job):
+        job.remember(instance_id="i-0123")
+        await asyncio.sleep(3600)
+
+    first = JobManager(jobs_db)
+    first.register("create_devnet", never_finishes)
+    record = await first.submit("create_devnet", {"name": "devnet-1"})
+    await asyncio.sleep(0.1)
+    for task in first._worker_tasks:
+        task.cancel()
+    assert first.get(record["job_id"])["status"] == "running"
+
+    attempts = []
+
+    async def handler(job):
+        attempts.append((job.attempt, job.resumed, job.saved))
+        return "done"
+
+    second = JobManager(jobs_db)
+    second.register("create_devnet", handler)
+    second.start()
+
+    job = await wait_for_job(second, record["job_id"])
+    assert job["status"] == "succeeded"
+    assert attempts == [(2, True, {"instance_id": "i-0123"})]
+    assert "Resuming after restart" in job["logs"][-1]
+
+@pytest.mark.asyncio
+async def test_logs_are_buffered_and_flushed(jobs_db):
+    """Log lines are visible right away but written to the database in batches."""
+    release = asyncio.Event()
+
+    async def handler(job):
+        for i in range(100):
+            job.log(f"line {i}")
+        await release.wait()
+
+    manager = JobManager(jobs_db, log_flush_interval=0.2)
+    manager.register("create_devnet", handler)
+    record = await manager.submit("create_devnet", {"name": "devnet-1"})
+    await asyncio.sleep(0.05)
+
+    stored = lambda: TinyDB(TEST_DB_PATH).search(Query().job_id == record["job_id"])[0]["logs"]
+    assert manager.get(record["job_id"])["logs"][-1].endswith("line 99")
+    assert stored() == []
+
+    await asyncio.sleep(0.3)
+    assert len(stored()) == 100
+
+    release.set()
+    job = await wait_for_job(manager, record["job_id"])
+    assert job["logs"] == stored()
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+
+from limits import ToolLimiter, ToolBusy, limit_tool, limiter
+
+@pytest.mark.asyncio
+async def test_limiter_bounds_concurrency():
+    tool_limiter = ToolLimiter(limits={"create_new_devnet": 2}, default=10, queue_timeout=5)
+    running = 0
+    peak = 0
+
+    async def call():
+        nonlocal running, peak
+        async with tool_limiter.slot("create_new_devnet"):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+
+    await asyncio.gather(*(call() for _ in range(6)))
+    assert peak == 2
+    status = tool_limiter.status()["create_new_devnet"]
+    assert status["limit"] == 2 and status["running"] == 0 and status["waiting"] == 0
+
+@pytest.mark.asyncio
+async def test_limiter_backpressure():
+    tool_limiter = ToolLimiter(limits={"slow": 1}, queue_timeout=0.1, max_queue=1)
+    await tool_limiter.acquire("slow")
+
+    # One call may wait, it times out; a second waiting call is turned away at once
+    waiting = asyncio.create_task(tool_limiter.acquire("slow"))
+    await asyncio.sleep(0)
+    with pytest.raises(ToolBusy, match="already queued"):
+        await tool_limiter.acquire("slow")
+    with pytest.raises(ToolBusy, match="no free slot"):
+        await waiting
+    assert tool_limiter.status()["slow"]["rejected"] == 2
+
+    tool_limiter.release("slow")
+    await tool_limiter.acquire("slow")
+
+@pytest.mark.asyncio
+async def test_limit_tool_busy_response(monkeypatch):
+    monkeypatch.setattr(limiter, "limits", {"bake": 1})
+    monkeypatch.setattr(limiter, "queue_timeout", 0.05)
+    monkeypatch.setattr(limiter, "_tools", {})
+
+    async def bake():
+        await asyncio.sleep(0.3)
+        return {"status": "ok"}
+
+    tool = limit_tool(bake)
+    first, second = await asyncio.gather(tool(), tool())
+    assert first == {"status": "ok"}
+    assert second["status"] == "error"
+    assert second["busy"] is True
+    assert second["retry_after"] >= 1
@@ -27,13 +27,29 @@ from main import (
     delete_account,
     get_latest_block,
     get_block_by_number,
+    get_logs,
+    get_token_balances,
     create_new_devnet,
     get_ec2_instance,
     terminate_ec2_instance,
     wait_for_instance_state,
     destroy_devnet,
     check_instance_status,
+    get_fleet_status,
+    list_all_devnets,
+    create_devnets,
+    destroy_devnets,
+    run_on_devnets,
+    deploy_timing_report,
+    get_server_metrics,
+    mcp,
+    bake_devnet_image,
+    list_devnet_images,
+    prune_devnet_images,
     send_transaction,
+    snapshot_devnet,
+    reset_devnet,
+    list_devnet_snapshots,
 )
 
 from ssh import (
@@ -76,6 +92,52 @@ async def test_get_balance():
     assert result["address"] == TEST_ADDRESS
     assert isinstance(result["balance"], int)
 
+@pytest.mark.asyncio
+async def test_get_balance_of_watched_accounts(monkeypatch, tmp_path):
+    """Test get_balance starts watching saved accounts and then answers them from memory."""
+    import main
+
+    monkeypatch.setattr(main, "db", TinyDB(tmp_path / "db.json"))
+    monkeypatch.setattr(main, "_balance_watchers", {})
+    main.db.insert({"type": "account", "address": TEST_ADDRESS})
+    rpc_calls = []
+
+    class FakeEth:
+        @property
+        async def block_number(self):
+            return 7
+
+        async def get_block(self, block, full_transactions=False):
+            return {"number": 7, "hash": b"h7", "parentHash": b"h6", "transactions": []}
+
+        async def get_code(self, address):
+            return b""
+
+        async def get_balance(self, address, block=None):
+            rpc_calls.append(address)
+            return 42
+
+    class FakeWeb3:
+        eth = FakeEth()
+
+    monkeypatch.setattr(main, "get_web3", lambda url, type: FakeWeb3())
+
+    first = await get_balance(TEST_ADDRESS, "http://rpc.test")
+    assert first == {"address": TEST_ADDRESS, "balance": 42}
+    watcher = main._balance_watchers[("http://rpc.test", "Layer2")]
+    try:
+        await asyncio.sleep(0.1)
+        rpc_calls.clear()
+        second = await get_balance(TEST_ADDRESS, "http://rpc.test")
+        assert second == {"address": TEST_ADDRESS, "balance": 42, "block_number": 7, "source": "watch"}
+        assert rpc_calls == []
+    finally:
+        watcher.stop()
+
+    # Following every block of a metered provider would spend its budget
+    await get_balance(TEST_ADDRESS, "https://eth-mainnet.g.alchemy.com/v2/KEY")
+    assert ("https://eth-mainnet.g.alchemy.com/v2/KEY", "Layer2") not in main._balance_watchers
+
 @pytest.mark.asyncio
 async def test_create_account():
     """Test creating a new Ethereum account"""
@@ -167,6 +229,90 @@ async def test_get_block_by_number():
     assert "miner" in result
     assert "hash" in result
 
+@pytest.mark.asyncio
+async def test_get_logs():
+    """Test getting USDT Transfer logs of the latest blocks"""
+    usdt = "0xdAC17F958D2ee523a2206206994597C13D831ec7"
+    transfer = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+    latest_block = await get_latest_block()
+    from_block = latest_block["block_number"] - 20
+
+    result = await get_logs(usdt, [transfer], from_block, latest_block["block_number"])
+    assert result["count"] == len(result["logs"]) > 0
+    assert all(from_block <= log["blockNumber"] <= latest_block["block_number"] for log in result["logs"])
+    positions = [(log["blockNumber"], log["logIndex"]) for log in result["logs"]]
+    assert positions == sorted(positions)
+
+@pytest.mark.asyncio
+async def test_get_token_balances_batches_and_caches_metadata(monkeypatch, tmp_path):
+    """Test get_token_balances packs balanceOf calls into aggregate3 and remembers token metadata."""
+    import main
+    from eth_abi import decode, encode
+    from multicall import BALANCE_OF, DECIMALS, MULTICALL3_ADDRESS, SYMBOL
+
+    monkeypatch.setattr(main, "db", TinyDB(tmp_path / "db.json"))
+    monkeypatch.setattr(main, "_token_metadata", {})
+    monkeypatch.setattr(main, "_multicall_deployed", {})
+    tokens = {"0x" + "11" * 20: ("AAA", 6), "0x" + "22" * 20: ("BBB", 18)}
+    holders = ["0x" + f"{i:02x}" * 20 for i in range(1, 4)]
+    requests = []
+
+    def answer(target, data):
+        symbol, decimals = tokens[target.lower()]
+        if data[:4] == DECIMALS and decimals is None:
+            return False, b""
+        if data[:4] == DECIMALS:
+            return True, encode(["uint8"], [decimals])
+        if data[:4] == SYMBOL:
+            return True, encode(["string"], [symbol])
+        if data[:4] == BALANCE_OF:
+            return True, encode(["uint256"], [data[-1] * 10 ** (decimals or 0) // 2])
+        return False, b""
+
+    class FakeEth:
+        @property
+        async def chain_id(self):
+            return 1
+
+        @property
+        async def block_number(self):
+            return 100
+
+        async def get_code(self, address):
+            return b"\x01"
+
+        async def call(self, transaction, block_identifier):
+            assert transaction["to"] == MULTICALL3_ADDRESS and block_identifier == 100
+            calls = decode(["(address,bool,bytes)[]"], transaction["data"][4:])[0]
+            requests.append(len(calls))
+            return encode(["(bool,bytes)[]"], [[answer(target, data) for target, _, data in calls]])
+
+    class FakeWeb3:
+        eth = FakeEth()
+
+    monkeypatch.setattr(main, "get_web3", lambda url, type: FakeWeb3())
+
+    result = await get_token_balances(holders, list(tokens))
+    assert result["calls"] == 6
+    assert requests == [4, 6]  # metadata, then every balanceOf in one aggregate3
+    balances = list(result["balances"].values())
+    assert balances[0]["0x" + "11" * 20]["balance"] == "0.5"
+    assert balances[2]["0x" + "22" * 20]["balance"] == "1.5"
+    assert balances[2]["0x" + "22" * 20]["symbol"] == "BBB"
+
+    # Metadata comes from the DB from now on, even after a restart
+    main._token_metadata.clear()
+    requests.clear()
+    await get_token_balances(holders[:1], list(tokens))
+    assert requests == [2]
+
+    # A token whose decimals() fails still gets its raw balances
+    broken = "0x" + "33" * 20
+    tokens[broken] = ("CCC", None)
+    result = await get_token_balances(holders[2:], [broken])
+    assert result["tokens"][broken] is None
+    assert result["balances"][holders[2]][broken] == {"symbol": None, "raw": 1, "balance": None}
+
 @pytest.mark.asyncio
 async def test_create_new_devnet(devnet_instance, caplog):
     """Test creating a new Devnet Layer1 instance (fixture 사용)"""
@@ -179,6 +325,11 @@ async def test_create_new_devnet(devnet_instance, caplog):
     # Get instance details
     instance = get_ec2_instance(result["instance_id"])
     assert instance.state["Name"] == "running"
+    # Per-stage timings of the provisioning pipeline
+    assert result["status"] == "ready"
+    for stage in ("instance", "public_ip", "ssh_ready", "deploy", "rpc_ready", "total"):
+        assert result["stage_timings"][stage]["duration"] >= 0
+    print(f"Stage timings: {result['stage_timings']}")
     # 로그 출력 확인
     for record in caplog.records:
         print(f"Log: {record.message}")
@@ -198,6 +349,53 @@ async def test_check_instance_status(devnet_instance, caplog):
     for record in caplog.records:
         print(f"Log: {record.message}")
 
+@pytest.mark.asyncio
+async def test_get_fleet_status(devnet_instance):
+    """Test live fleet status and its short-lived cache (devnet_instance 활용)"""
+    fleet = await get_fleet_status(refresh=True)
+    assert fleet["cached"] is False
+    status = next(d for d in fleet["devnets"] if d["instance_id"] == devnet_instance["instance_id"])
+    assert status["state"] == "running"
+    assert status["public_ip"] == devnet_instance["public_ip"]
+    assert status["uptime_seconds"] >= 0
+    assert status["layer1"]["reachable"]
+    assert status["layer2"]["reachable"]
+
+    # A second call within the TTL is served from the cache
+    cached = await get_fleet_status()
+    assert cached["cached"] is True
+    assert cached["checked_at"] == fleet["checked_at"]
+
+    devnets = await list_all_devnets(include_status=True)
+    devnet = next(d for d in devnets if d["instance_id"] == devnet_instance["instance_id"])
+    assert devnet["live"]["state"] == "running"
+
+@pytest.mark.asyncio
+async def test_bake_devnet_image_and_create_from_it(devnet_instance):
+    """Test baking a deployed devnet into an image and booting a devnet from it"""
+    image = await bake_devnet_image(devnet_instance["instance_id"], wait=True)
+    assert image["image_id"].startswith("ami-")
+    assert image["state"] == "available"
+    # The source devnet serves again after baking
+    assert image["source_ready"] is True
+    block = await get_latest_block(url=devnet_instance["layer1_url"], type="Layer1")
+    assert block["block_number"] >= 0
+
+    images = await list_devnet_images()
+    assert images[0]["image_id"] == image["image_id"]
+    assert images[0]["version"] == image["version"]
+
+    test_name = f"test_devnet_from_image_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    devnet = await create_new_devnet(test_name, from_image="latest")
+    try:
+        assert devnet["image_id"] == image["image_id"]
+        block = await get_latest_block(url=devnet["layer1_url"], type="Layer1")
+        assert block["block_number"] >= 0
+    finally:
+        await destroy_devnet(devnet["instance_id"])
+        pruned = await prune_devnet_images(keep=0)
+        assert image["image_id"] in pruned["deregistered"]
+
 @pytest.mark.asyncio
 async def test_destroy_devnet(devnet_instance, caplog):
     """Test destroying a Devnet instance (fixture 사용)"""
@@ -313,6 +511,351 @@ async def test_devnet_creation_steps_time():
     # Clean up
     await destroy_devnet(instance_id)
 
+@pytest.mark.asyncio
+async def test_create_new_devnet_cloud_init():
+    """Test creating a devnet whose deploy runs from EC2 user data at boot."""
+    devnet_name = f"devnet_cloud_init_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    start_time = time.time()
+    devnet = await create_new_devnet(devnet_name, use_pool=False, bootstrap="cloud-init")
+    print(f"\nCloud-init devnet creation time: {time.time() - start_time:.2f} seconds")
+
+    try:
+        assert devnet["status"] == "ready", devnet.get("error")
+        block = await get_latest_block(url=devnet["layer2_url"])
+        assert block["block_number"] >= 0
+    finally:
+        await destroy_devnet(devnet["instance_id"])
+
+@pytest.mark.asyncio
+async def test_create_devnets_in_parallel():
+    """Test creating several devnets from one call and its wall-clock time."""
+    prefix = f"devnet_parallel_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    names = [f"{prefix}_{i}" for i in range(3)]
+
+    start_time = time.time()
+    result = await create_devnets(names=names, concurrency=3)
+    creation_time = time.time() - start_time
+    print(f"\nParallel creation time for {len(names)} devnets: {creation_time:.2f} seconds")
+
+    try:
+        assert result["failed"] == []
+        assert [devnet["name"] for devnet in result["devnets"]] == names
+        for devnet in result["devnets"]:
+            instance = get_ec2_instance(devnet["instance_id"])
+            assert instance.state["Name"] == "running"
+            tags = {tag["Key"]: tag["Value"] for tag in instance.tags}
+            assert tags["Name"] == devnet["name"]
+            assert tags["DevnetBatch"].startswith("devnets-")
+    finally:
+        destroy_start = time.time()
+        destroyed = await destroy_devnets(name_filter=f"{prefix}_*", wait=True)
+        print(f"Bulk destruction time: {time.time() - destroy_start:.2f} seconds")
+
+    assert destroyed["terminated"] is True
+    assert sorted(d["name"] for d in destroyed["destroyed"]) == names
+    assert all(d["remote_destroy"] == "destroyed" for d in destroyed["destroyed"])
+
+@pytest.mark.asyncio
+async def test_create_devnets_requires_names_or_count():
+    """Test that create_devnets rejects a call without names or count."""
+    result = await create_devnets()
+    assert result["status"] == "error"
+
+@pytest.mark.asyncio
+async def test_destroy_devnets_requires_selection():
+    """Test that destroy_devnets never destroys everything by default."""
+    result = await destroy_devnets()
+    assert result["status"] == "error"
+
+@pytest.mark.asyncio
+async def test_run_on_devnets_aggregates_per_host(monkeypatch, tmp_path):
+    """Test run_on_devnets exit codes, output tails, fail_fast and the global timeout."""
+    import main
+
+    monkeypatch.setattr(main, "db", TinyDB(tmp_path / "db.json"))
+    main.db.insert_multiple([
+        {"type": "devnet", "name": f"run-devnet-{i}", "instance_id": f"i-run{i}", "public_ip": f"10.0.0.{i}"}
+        for i in range(4)
+    ])
+
+    async def fake_exec(host, command):
+        # 10.0.0.1 fails right away, 10.0.0.3 hangs
+        if host == "10.0.0.1":
+            return "", "boom", 2
+        if host == "10.0.0.3":
+            await asyncio.sleep(60)
+        await asyncio.sleep(0.1)
+        return f"{host} ok", "", 0
+
+    monkeypatch.setattr(main, "exec_command_with_status_async", fake_exec)
+
+    result = await run_on_devnets("uptime", name_filter="run-devnet-*", timeout=1)
+    statuses = {r["name"]: r["status"] for r in result["results"]}
+    assert statuses == {
+        "run-devnet-0": "ok",
+        "run-devnet-1": "failed",
+        "run-devnet-2": "ok",
+        "run-devnet-3": "timeout",
+    }
+    assert result["succeeded"] == 2
+    assert result["results"][1]["exit_status"] == 2
+    assert result["results"][0]["stdout"] == "10.0.0.0 ok"
+    assert result["elapsed"] < 5
+
+    # One host at a time, the failing second host cancels the rest
+    result = await run_on_devnets("uptime", concurrency=1, fail_fast=True)
+    assert [r["status"] for r in result["results"]] == ["ok", "failed", "cancelled", "cancelled"]
+
+@pytest.mark.asyncio
+async def test_snapshot_and_reset_devnet(monkeypatch, tmp_path):
+    """Test snapshot_devnet records chain heads and reset_devnet verifies them after stop-swap-start."""
+    import main
+
+    monkeypatch.setattr(main, "db", TinyDB(tmp_path / "db.json"))
+    main.db.insert(main._devnet_record("snap-devnet", "i-snap", "10.0.0.9"))
+    commands = []
+    chains = {"Layer1": [b"a0", b"a1", b"a2"], "Layer2": [b"b0", b"b1"]}
+    archived = {}
+    restores = {"work": True}
+
+    async def fake_exec(host, command, timeout=None):
+        commands.append(command)
+        if "docker stop" in command and "tar -cf" in command:
+            await asyncio.sleep(0.01)
+            archived.update({type: list(blocks) for type, blocks in chains.items()})
+            return "volumes: l1_data l2_data\nsize: 2048\n", "", 0
+        if "tar -xf" in command and restores["work"]:
+            chains.update({type: list(blocks) for type, blocks in archived.items()})
+        return "volumes: l1_data l2_data\n", "", 0
+
+    async def fake_ready(host, conditions, timeout):
+        return {"ready": True, "stages": {}}
+
+    class Block:
+        def __init__(self, number, hash):
+            self.number, self.hash = number, hash
+
+    class FakeEth:
+        def __init__(self, type):
+            self.type = type
+
+        async def get_block(self, block):
+            blocks = chains[self.type]
+            number = len(blocks) - 1 if block == "latest" else block
+            if number >= len(blocks):
+                raise ValueError(f"Block {number} not found")
+            return Block(number, blocks[number])
+
+        @property
+        async def block_number(self):
+            return len(chains[self.type]) - 1
+
+    class FakeWeb3:
+        def __init__(self, type):
+            self.eth = FakeEth(type)
+
+    monkeypatch.setattr(main, "exec_command_with_status_async", fake_exec)
+    monkeypatch.setattr(main, "wait_for_devnet_ready", fake_ready)
+    monkeypatch.setattr(main, "get_web3", lambda url, type: FakeWeb3(type))
+
+    snapshot = await snapshot_devnet("i-snap", "clean")
+    assert snapshot["volumes"] == ["l1_data", "l2_data"]
+    assert snapshot["heads"]["layer1"] == {"number": 2, "hash": "0x" + b"a2".hex()}
+    assert (await snapshot_devnet("i-snap", "clean"))["status"] == "error"
+    assert [s["snapshot_id"] for s in await list_devnet_snapshots("i-snap")] == ["clean"]
+
+    # Concurrent snapshots with the same ID: only one of them archives
+    results = await asyncio.gather(snapshot_devnet("i-snap", "twice"), snapshot_devnet("i-snap", "twice"))
+    assert sorted(result.get("status", "ok") for result in results) == ["error", "ok"]
+
+    # The chains went on after the snapshot; the reset takes the new blocks away
+    chains["Layer2"].append(b"b2")
+    reset = await reset_devnet("i-snap")
+    assert reset["status"] == "ok" and reset["verified"]
+    assert reset["chains"]["layer2"] == {"snapshot_head": 1, "head_before": 2, "head": 1, "rewound": True, "verified": True}
+    assert "tar -xf" in commands[-1]
+
+    # A restore that left the chains as they were isn't verified, though the recorded blocks are still there
+    restores["work"] = False
+    chains["Layer2"].append(b"b2")
+    reset = await reset_devnet("i-snap")
+    assert reset["status"] == "error"
+    assert reset["chains"]["layer2"]["rewound"] is False
+    restores["work"] = True
+
+    # A chain with other blocks at the recorded height isn't the snapshot
+    archived["Layer1"][2] = b"other"
+    reset = await reset_devnet("i-snap", "clean")
+    assert reset["status"] == "error"
+    assert reset["chains"]["layer1"]["verified"] is False
+    assert (await reset_devnet("i-snap", "missing"))["status"] == "error"
+
+@pytest.mark.asyncio
+async def test_failed_deploy_fails_the_pipeline(monkeypatch, tmp_path):
+    """A non-zero trh-sdk deploy exit status fails the deploy stage instead of waiting for the RPCs."""
+    import main
+    from pipeline import StageError
+
+    async def fake_exec(host, command, timeout=None):
+        return "", ""
+
+    async def fake_stream(host, command, on_output=None, on_line=None, timeout=None, log_path=None):
+        return {"output": "Error: deploy failed\n", "stderr": "", "exit_status": 1, "lines": 1, "log_path": log_path}
+
+    async def fake_ready(host, conditions, timeout):
+        assert "layer1" not in conditions, "RPCs probed after a failed deploy"
+        return {"ready": True, "elapsed": 0.0, "stages": {}}
+
+    monkeypatch.setattr(main, "load_private_key", lambda: None)
+    monkeypatch.setattr(main, "check_security_group_ports", lambda ports: [])
+    monkeypatch.setattr(main, "wait_for_public_ip", lambda instance_id: "10.0.0.7")
+    monkeypatch.setattr(main, "wait_for_instance_state", lambda instance_id, state, interval: True)
+    monkeypatch.setattr(main, "wait_for_devnet_ready", fake_ready)
+    monkeypatch.setattr(main, "exec_command_async", fake_exec)
+    monkeypatch.setattr(main, "exec_command_stream_async", fake_stream)
+    monkeypatch.setattr(main, "SSH_LOG_DIR", str(tmp_path))
+
+    pipeline = main._devnet_pipeline("failing-devnet", lambda message: None, instance_id="i-fail", store=False)
+    with pytest.raises(StageError) as error:
+        await pipeline.run()
+    assert error.value.stage == "deploy"
+    assert "exited with status 1" in str(error.value)
+
+    # A launched instance is reported right away, so a resumed job can pick it up
+    launched = []
+    monkeypatch.setattr(main, "create_ec2_instance", lambda name, user_data: "i-new")
+    pipeline = main._devnet_pipeline("failing-devnet", lambda message: None, store=False, on_instance=launched.append)
+    with pytest.raises(StageError):
+        await pipeline.run()
+    assert launched == ["i-new"]
+
+@pytest.mark.asyncio
+async def test_failed_stage_terminates_launched_instance(monkeypatch, tmp_path):
+    """An instance whose provisioning fails after launch is terminated, not left running."""
+    import main
+
+    terminated = []
+    monkeypatch.setattr(main, "db", TinyDB(tmp_path / "db.json"))
+    monkeypatch.setattr(main, "load_private_key", lambda: None)
+    monkeypatch.setattr(main, "check_security_group_ports", lambda ports: [])
+    monkeypatch.setattr(main, "create_ec2_instance", lambda name, user_data: "i-orphan")
+    monkeypatch.setattr(main, "wait_for_public_ip", lambda instance_id: None)
+    monkeypatch.setattr(main, "wait_for_instance_state", lambda instance_id, state, interval: True)
+    monkeypatch.setattr(main, "terminate_ec2_instances", terminated.append)
+
+    result = await main._create_devnet("orphan-devnet", lambda message: None, use_pool=False)
+    assert result["status"] == "error"
+    assert result["stage"] == "public_ip"
+    assert result["terminated_instance_id"] == "i-orphan"
+    assert terminated == [["i-orphan"]]
+
+@pytest.mark.asyncio
+async def test_rejected_send_forgets_cached_gas_limit(monkeypatch, tmp_path):
+    """A transaction the node refuses drops its shape's cached estimate, the next send estimates again."""
+    import main
+    from eth_account import Account
+    from gas import GasEstimator
+    import gas
+
+    estimator = GasEstimator()
+    monkeypatch.setattr(gas, "gas_estimator", estimator)
+    monkeypatch.setattr(main, "db", TinyDB(tmp_path / "db.json"))
+    estimates = []
+
+    class FakeEth:
+        account = Account
+
+        @property
+        async def gas_price(self):
+            return 10 ** 9
+
+        @property
+        async def chain_id(self):
+            return 1
+
+        async def get_transaction_count(self, address):
+            return 0
+
+        async def get_code(self, address):
+            return b"\x60\x80"
+
+        async def estimate_gas(self, tx):
+            estimates.append(tx)
+            return 30000
+
+        async def send_raw_transaction(self, raw):
+            raise ValueError("intrinsic gas too low")
+
+    class FakeWeb3:
+        eth = FakeEth()
+
+        @staticmethod
+        def to_wei(amount, unit):
+            return int(amount * 10 ** 18)
+
+    monkeypatch.setattr(main, "get_web3", lambda url, type: FakeWeb3())
+    key = "0x59c6995e998f97a5a0044966f0945389dc9e86dae88c7a8412f4603b6b78690d"
+    data = "0x12345678" + "ff" * 32
+    for _ in range(2):
+        result = await send_transaction(key, TEST_ADDRESS, 0, data=data)
+        assert result["status"] == "error"
+    assert len(estimates) == 2
+    assert estimator.stats()["shapes"] == 0
+
+@pytest.mark.asyncio
+async def test_deploy_timing_report(monkeypatch, tmp_path):
+    """Test that deploy_timing_report aggregates stored deploy timings."""
+    import main
+
+    monkeypatch.setattr(main, "db", TinyDB(tmp_path / "db.json"))
+    main.db.insert_multiple([
+        {
+            "type": "devnet",
+            "name": f"timing-devnet-{i}",
+            "instance_id": f"i-timing{i}",
+            "created_at": f"2025-06-0{i + 1} 12:00:00",
+            "status": "terminated",
+            "deploy_timings": {
+                "total": 100.0 + i * 10,
+                "stages": {"l1_startup": {"duration": 30.0 + i}, "contracts": {"duration": 50.0 + i}},
+            },
+            "stage_timings": {"deploy": {"duration": 100.0 + i * 10}},
+        }
+        for i in range(5)
+    ])
+
+    report = await deploy_timing_report()
+    assert report["deploys"] == 5
+    assert report["deploy_total"]["p50"] == 120.0
+    assert report["deploy_stages"]["l1_startup"]["max"] == 34.0
+    assert report["provisioning"]["deploy"]["count"] == 5
+
+    report = await deploy_timing_report(since="2025-06-03", last=2)
+    assert report["deploys"] == 2
+    assert report["deploy_total"]["min"] == 130.0
+
+@pytest.mark.asyncio
+async def test_server_metrics():
+    """Test that tool calls are recorded and served as Prometheus text over HTTP."""
+    import httpx
+
+    await get_server_metrics(reset=True)
+    await destroy_devnets()
+    result = await get_server_metrics()
+    assert result["tools"]["destroy_devnets"] == {
+        "calls": 1,
+        "errors": 1,
+        "latency": result["tools"]["destroy_devnets"]["latency"],
+    }
+    assert set(result["downstream"]) >= {"rpc", "ec2", "ssh", "db"}
+
+    transport = httpx.ASGITransport(app=mcp.http_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert 'mcp_tool_errors_total{tool="destroy_devnets"} 1' in response.text
+
 @pytest.mark.asyncio
 async def test_get_devnet_instance():
     """Test getting a specific devnet instance."""
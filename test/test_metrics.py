@@ -0,0 +1,67 @@
+import pytest
+
+from tinydb import TinyDB
+from tinydb.storages import JSONStorage
+
+from metrics import Histogram, Metrics, metrics, instrument_tool, TimedStorage
+
+def test_histogram_quantiles():
+    histogram = Histogram(buckets=(0.1, 1, 10))
+    for value in [0.05] * 90 + [0.5] * 9 + [20]:
+        histogram.observe(value)
+    assert histogram.count == 100
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.95) == 1
+    assert histogram.quantile(1.0) == 20
+    assert histogram.cumulative() == [(0.1, 90), (1, 99), (10, 99), ("+Inf", 100)]
+
+def test_downstream_timer_counts_errors():
+    registry = Metrics()
+    with registry.timer("ssh", "exec"):
+        pass
+    with pytest.raises(RuntimeError):
+        with registry.timer("ssh", "exec"):
+            raise RuntimeError("connection lost")
+
+    ssh = registry.snapshot()["downstream"]["ssh"]
+    assert ssh["calls"] == 2
+    assert ssh["errors"] == 1
+    assert ssh["operations"]["exec"]["latency"]["count"] == 2
+
+    text = registry.render_prometheus()
+    assert 'mcp_downstream_errors_total{kind="ssh",operation="exec"} 1' in text
+    assert 'mcp_downstream_duration_seconds_count{kind="ssh",operation="exec"} 2' in text
+
+@pytest.mark.asyncio
+async def test_instrument_tool():
+    metrics.reset()
+
+    async def flaky_tool(fail: str = "no"):
+        """A tool"""
+        if fail == "raise":
+            raise ValueError("boom")
+        if fail == "status":
+            return {"status": "error", "error": "boom"}
+        return {"status": "ok"}
+
+    tool = instrument_tool(flaky_tool)
+    assert tool.__name__ == "flaky_tool" and tool.__doc__ == "A tool"
+    await tool()
+    await tool(fail="status")
+    with pytest.raises(ValueError):
+        await tool(fail="raise")
+
+    entry = metrics.snapshot()["tools"]["flaky_tool"]
+    assert entry["calls"] == 3
+    assert entry["errors"] == 2
+    assert 'mcp_tool_calls_total{tool="flaky_tool"} 3' in metrics.render_prometheus()
+
+def test_timed_storage(tmp_path):
+    metrics.reset()
+    db = TinyDB(tmp_path / "db.json", storage=TimedStorage(JSONStorage))
+    db.insert({"type": "devnet"})
+    assert db.all() == [{"type": "devnet"}]
+
+    operations = metrics.snapshot()["downstream"]["db"]["operations"]
+    assert operations["write"]["calls"] >= 1
+    assert operations["read"]["calls"] >= 1
@@ -0,0 +1,80 @@
+import pytest
+
+from eth_abi import decode, encode
+
+from multicall import (
+    BALANCE_OF,
+    DECIMALS,
+    MULTICALL3_ADDRESS,
+    SYMBOL,
+    address_call,
+    aggregate,
+    batches,
+    decode_aggregate3,
+    decode_symbol,
+    encode_aggregate3,
+)
+
+TOKEN = "0xdAC17F958D2ee523a2206206994597C13D831ec7"
+HOLDER = "0x742d35Cc6634C0532925a3b844Bc454e4438f44e"
+
+def answer(target, data):
+    """A token answering balanceOf(holder) with the holder's last byte, and failing otherwise"""
+    if data[:4] == BALANCE_OF:
+        return True, encode(["uint256"], [data[-1]])
+    return False, b""
+
+def fake_multicall(max_calls=None):
+    """An eth_call serving aggregate3 like Multicall3, failing for batches above max_calls, plus its request log"""
+    requests = []
+
+    async def eth_call(to, data):
+        assert to == MULTICALL3_ADDRESS and data[:4] == encode_aggregate3([])[:4]
+        calls = decode(["(address,bool,bytes)[]"], data[4:])[0]
+        requests.append(len(calls))
+        if max_calls and len(calls) > max_calls:
+            raise ValueError("out of gas")
+        return encode(["(bool,bytes)[]"], [[answer(target, call_data) for target, _, call_data in calls]])
+
+    return eth_call, requests
+
+def test_encode_decode_roundtrip():
+    result = encode(["(bool,bytes)[]"], [[(True, b"\x01" * 32), (False, b"")]])
+    assert decode_aggregate3(result) == ((True, b"\x01" * 32), (False, b""))
+    assert decode_symbol(True, encode(["string"], ["USDT"])) == "USDT"
+    assert decode_symbol(True, b"MKR".ljust(32, b"\0")) == "MKR"
+    assert decode_symbol(False, b"") is None
+
+def test_batches_respect_count_and_calldata_limits():
+    calls = [(TOKEN, address_call(BALANCE_OF, HOLDER))] * 10
+    assert [len(batch) for batch in batches(calls, batch_size=4)] == [4, 4, 2]
+    # Every balanceOf takes 5 words of overhead and 2 words of calldata
+    assert [len(batch) for batch in batches(calls, batch_size=100, max_calldata=7 * 32 * 3)] == [3, 3, 3, 1]
+
+@pytest.mark.asyncio
+async def test_aggregate_keeps_order_and_splits_failing_batches():
+    holders = [f"0x{i:040x}" for i in range(1, 11)]
+    calls = [(TOKEN, address_call(BALANCE_OF, holder)) for holder in holders] + [(TOKEN, DECIMALS)]
+    eth_call, requests = fake_multicall(max_calls=3)
+    stats = {}
+    results = await aggregate(eth_call, calls, stats=stats)
+
+    assert [int.from_bytes(data, "big") for _, data in results[:10]] == list(range(1, 11))
+    assert results[10] == (False, b"")
+    assert stats["splits"] > 0
+    # The full batch failed, the batches that succeeded cover every call once
+    assert requests[0] == 11
+    assert sum(size for size in requests if size <= 3) == 11
+
+@pytest.mark.asyncio
+async def test_aggregate_without_multicall():
+    async def eth_call(to, data):
+        success, result = answer(to, data)
+        if not success:
+            raise ValueError("execution reverted")
+        return result
+
+    stats = {}
+    results = await aggregate(eth_call, [(TOKEN, address_call(BALANCE_OF, HOLDER)), (TOKEN, SYMBOL)], multicall=False, stats=stats)
+    assert results == [(True, encode(["uint256"], [0x4E])), (False, b"")]
+    assert stats["requests"] == 2
@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+
+from pipeline import StagePipeline, StageError
+
+@pytest.mark.asyncio
+async def test_independent_stages_overlap():
+    """Stages without dependencies between them run at the same time."""
+    async def sleep(results):
+        await asyncio.sleep(0.2)
+        return "done"
+
+    pipeline = StagePipeline()
+    pipeline.add("a", sleep)
+    pipeline.add("b", sleep)
+    pipeline.add("c", sleep)
+    results, timings = await pipeline.run()
+
+    assert results == {"a": "done", "b": "done", "c": "done"}
+    assert timings["total"]["duration"] < 0.5
+
+@pytest.mark.asyncio
+async def test_stage_waits_for_dependencies():
+    """Test that a stage sees the results of its dependencies."""
+    async def instance(results):
+        await asyncio.sleep(0.1)
+        return "i-123"
+
+    async def public_ip(results):
+        return f"ip-of-{results['instance']}"
+
+    pipeline = StagePipeline()
+    pipeline.add("instance", instance)
+    pipeline.add("public_ip", public_ip, deps=["instance"])
+    results, timings = await pipeline.run()
+
+    assert results["public_ip"] == "ip-of-i-123"
+    assert timings["public_ip"]["start"] >= timings["instance"]["end"]
+
+@pytest.mark.asyncio
+async def test_failing_stage_cancels_the_rest():
+    """Test that the first failure is reported with its stage and the others are cancelled."""
+    cancelled = []
+
+    async def slow(results):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+
+    async def broken(results):
+        raise RuntimeError("boom")
+
+    async def after(results):
+        return "never"
+
+    pipeline = StagePipeline()
+    pipeline.add("slow", slow)
+    pipeline.add("broken", broken)
+    pipeline.add("after", after, deps=["broken"])
+
+    with pytest.raises(StageError) as excinfo:
+        await pipeline.run()
+
+    assert excinfo.value.stage == "broken"
+    assert isinstance(excinfo.value.error, RuntimeError)
+    assert cancelled == ["slow"]
+
+def test_unknown_dependency():
+    """Test that dependencies must be added before the stages using them."""
+    async def noop(results):
+        return None
+
+    with pytest.raises(ValueError):
+        StagePipeline().add("docker", noop, deps=["ssh_ready"])
@@ -0,0 +1,111 @@
+import pytest
+import asyncio
+import os
+
+from tinydb import TinyDB, Query
+
+from pool import WarmPool
+from ec2 import (
+    get_ec2_instance,
+    terminate_ec2_instance,
+    wait_for_instance_state,
+)
+
+TEST_DB_PATH = "test_pool.db"
+
+@pytest.fixture
+def pool_db():
+    db = TinyDB(TEST_DB_PATH)
+    yield db
+    # Terminate anything the pool left behind
+    for record in db.search(Query().type == "pool_instance"):
+        terminate_ec2_instance(record["instance_id"])
+    db.close()
+    if os.path.exists(TEST_DB_PATH):
+        os.remove(TEST_DB_PATH)
+
+@pytest.mark.asyncio
+async def test_empty_pool_is_a_miss(pool_db):
+    """Claiming from an empty pool falls back to the cold path."""
+    pool = WarmPool(pool_db, size=1, mode="booted")
+    assert await pool.claim("test-warm-pool-miss") is None
+    assert pool.metrics()["misses"] == 1
+    assert pool.metrics()["hits"] == 0
+
+@pytest.mark.asyncio
+async def test_refill_and_claim(pool_db):
+    """Test filling the pool and claiming a retagged instance from it."""
+    pool = WarmPool(pool_db, size=1, mode="booted")
+    assert await pool.refill() == 1
+
+    # Wait for the background refill to finish
+    while pool.metrics()["warming"]:
+        await asyncio.sleep(5)
+    assert pool.metrics()["ready"] == 1
+
+    claimed = await pool.claim("test-warm-pool-claim")
+    assert claimed is not None
+    assert claimed["public_ip"]
+
+    instance = get_ec2_instance(claimed["instance_id"])
+    tags = {tag["Key"]: tag["Value"] for tag in instance.tags}
+    assert tags["Name"] == "test-warm-pool-claim"
+    assert tags["WarmPool"] == "claimed"
+
+    metrics = pool.metrics()
+    assert metrics["hits"] == 1
+    assert metrics["ready"] == 0
+    assert metrics["refill_latency_last"] > 0
+
+    terminate_ec2_instance(claimed["instance_id"])
+    await asyncio.to_thread(wait_for_instance_state, claimed["instance_id"], "terminated")
+
+class ThreadCheckingDB:
+    """A TinyDB in memory recording which threads write to it"""
+
+    def __init__(self):
+        from tinydb.storages import MemoryStorage
+        self.db = TinyDB(storage=MemoryStorage)
+        self.writer_threads = set()
+
+    def __getattr__(self, name):
+        if name in ("insert", "update", "remove"):
+            import threading
+            self.writer_threads.add(threading.current_thread())
+        return getattr(self.db, name)
+
+@pytest.mark.asyncio
+async def test_provision_writes_db_on_event_loop(monkeypatch):
+    """EC2 and SSH calls run in threads, database writes stay on the loop."""
+    import threading
+    import pool as pool_module
+
+    terminated = []
+    monkeypatch.setattr(pool_module, "create_ec2_instance", lambda name: "i-warm")
+    monkeypatch.setattr(pool_module, "tag_ec2_instance", lambda instance_id, tags: None)
+    monkeypatch.setattr(pool_module, "wait_for_instance_state", lambda instance_id, state: True)
+    monkeypatch.setattr(pool_module, "get_ec2_instance_public_ip", lambda instance_id: "10.0.0.9")
+    monkeypatch.setattr(pool_module, "wait_for_ssh_ready", lambda host: True)
+    monkeypatch.setattr(pool_module, "exec_command", lambda host, command: None)
+    monkeypatch.setattr(pool_module, "terminate_ec2_instance", terminated.append)
+
+    db = ThreadCheckingDB()
+    pool = WarmPool(db, size=1, mode="booted")
+    assert await pool.refill() == 1
+    while pool.metrics()["warming"]:
+        await asyncio.sleep(0.01)
+
+    assert db.search(Query().instance_id == "i-warm")[0]["status"] == "ready"
+    assert db.writer_threads == {threading.current_thread()}
+    assert not pool._tasks
+
+    # A failed boot removes the record and terminates the instance
+    monkeypatch.setattr(pool_module, "create_ec2_instance", lambda name: "i-broken")
+    monkeypatch.setattr(pool_module, "wait_for_ssh_ready", lambda host: False)
+    pool.size = 2
+    await pool.refill()
+    while pool.metrics()["warming"]:
+        await asyncio.sleep(0.01)
+    assert terminated == ["i-broken"]
+    assert not db.search(Query().instance_id == "i-broken")
+    assert db.writer_threads == {threading.current_thread()}
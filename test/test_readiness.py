@@ -0,0 +1,42 @@
+import asyncio
+import pytest
+
+from readiness import ssh_ready, rpc_ready, wait_for_devnet_ready
+
+async def _serve(banner: bytes):
+    async def handle(reader, writer):
+        writer.write(banner)
+        await writer.drain()
+        writer.close()
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+@pytest.mark.asyncio
+async def test_ssh_ready_requires_banner():
+    """A listening port only counts as SSH-ready once it sends the SSH banner."""
+    server, port = await _serve(b"SSH-2.0-OpenSSH_8.9\r\n")
+    async with server:
+        assert await ssh_ready("127.0.0.1", port)
+
+    server, port = await _serve(b"HTTP/1.1 400 Bad Request\r\n")
+    async with server:
+        assert not await ssh_ready("127.0.0.1", port)
+
+@pytest.mark.asyncio
+async def test_rpc_not_ready_when_nothing_listens():
+    """Test that a closed RPC port is reported as not ready."""
+    assert not await rpc_ready("http://127.0.0.1:1", timeout=1)
+
+@pytest.mark.asyncio
+async def test_wait_for_devnet_ready_times_out():
+    """Test that unmet conditions are reported per stage after the timeout."""
+    result = await wait_for_devnet_ready("127.0.0.1", ("layer1", "layer2"), timeout=1, min_interval=0.1)
+    assert result["ready"] is False
+    assert result["stages"]["layer1"] == {"ready": False, "after": None, "at": None}
+    assert result["elapsed"] < 5
+
+@pytest.mark.asyncio
+async def test_wait_for_devnet_ready_unknown_condition():
+    """Test that a typo in the conditions fails loudly."""
+    with pytest.raises(ValueError):
+        await wait_for_devnet_ready("127.0.0.1", ("layer3",))
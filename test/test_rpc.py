@@ -0,0 +1,246 @@
+import asyncio
+import pytest
+
+from web3 import AsyncHTTPProvider, AsyncWeb3
+
+from metrics import metrics
+import rpc
+from rpc import SingleFlight, TimedAsyncHTTPProvider, EndpointGroup, TokenBucket, Throttled, mask_url
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_inflight_calls():
+    flight = SingleFlight(ttl=0)
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"jsonrpc": "2.0", "result": {"number": "0x10"}}
+
+    results = await asyncio.gather(*(flight.do("key", call) for _ in range(10)))
+    assert calls == 1
+    assert all(result == results[0] for result in results)
+    # Callers don't share one mutable response
+    assert results[0] is not results[1]
+
+    # Nothing is kept without a ttl
+    await flight.do("key", call)
+    assert calls == 2
+
+@pytest.mark.asyncio
+async def test_single_flight_ttl_and_cancelled_leader():
+    flight = SingleFlight(ttl=60)
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"jsonrpc": "2.0", "result": calls}
+
+    leader = asyncio.create_task(flight.do("key", call))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("key", call))
+    await asyncio.sleep(0)
+    leader.cancel()
+    # The follower still gets the result of the call the leader started
+    assert (await follower)["result"] == 1
+    assert (await flight.do("key", call))["result"] == 1
+    assert calls == 1
+
+@pytest.mark.asyncio
+async def test_provider_coalesces_reads_only(monkeypatch):
+    metrics.reset()
+    requests = []
+
+    async def fake_request(self, method, params):
+        requests.append(method)
+        await asyncio.sleep(0.05)
+        if method == "eth_getBalance":
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x64"}
+        return {"jsonrpc": "2.0", "id": 1, "result": "0x" + "ab" * 32}
+
+    monkeypatch.setattr(TimedAsyncHTTPProvider, "_timed_request", fake_request)
+    w3 = AsyncWeb3(TimedAsyncHTTPProvider("http://rpc.test"))
+    address = "0x742d35Cc6634C0532925a3b844Bc454e4438f44e"
+
+    balances = await asyncio.gather(*(w3.eth.get_balance(address) for _ in range(5)))
+    assert balances == [100] * 5
+    assert requests.count("eth_getBalance") == 1
+
+    await asyncio.gather(*(w3.eth.send_raw_transaction(b"\x01") for _ in range(2)))
+    assert requests.count("eth_sendRawTransaction") == 2
+
+    counters = metrics.snapshot()["counters"]["rpc_coalescing"]
+    assert counters["requests"] == 5
+    assert counters["coalesced"] == 4
+
+def fake_endpoints(group, behaviours):
+    """Replace each endpoint's upstream call with (delay, fail) behaviour, returning the call log"""
+    calls = []
+    for endpoint, (delay, fail) in zip(group.endpoints, behaviours):
+        async def request(method, params, retries=None, *, url=endpoint.url, delay=delay, fail=fail):
+            calls.append(url)
+            await asyncio.sleep(delay)
+            if fail:
+                raise ConnectionError(f"{url} unavailable")
+            return {"jsonrpc": "2.0", "id": 1, "result": url}
+        endpoint.provider._timed_request = request
+    return calls
+
+@pytest.mark.asyncio
+async def test_endpoint_group_prefers_fastest_and_fails_over(monkeypatch):
+    monkeypatch.setattr(rpc, "RPC_CIRCUIT_FAILURES", 2)
+    group = EndpointGroup("test", ["http://a.test", "http://b.test", "http://c.test"], hedge_delay=0)
+    calls = fake_endpoints(group, [(0.03, False), (0.01, False), (0, True)])
+
+    # Unmeasured endpoints are tried first, c fails over to the next one
+    for _ in range(4):
+        await group.request("eth_blockNumber", [])
+    states = {endpoint.url: endpoint.state for endpoint in group.endpoints}
+    assert states["http://c.test"] == "open"
+    # Once measured, b (fastest) takes the traffic
+    calls.clear()
+    response = await group.request("eth_blockNumber", [])
+    assert response["result"] == "http://b.test"
+    assert calls == ["http://b.test"]
+
+    stats = group.stats()["endpoints"]
+    assert stats[2]["errors"] == 2
+    assert stats[1]["ewma_ms"] is not None
+
+@pytest.mark.asyncio
+async def test_endpoint_group_hedges_slow_reads():
+    group = EndpointGroup("test", ["http://slow.test", "http://fast.test"], hedge_delay=0.05)
+    group.endpoints[0].ewma = 0.001  # looks fastest, but hangs
+    group.endpoints[1].ewma = 0.01
+    fake_endpoints(group, [(5, False), (0.01, False)])
+
+    start = asyncio.get_running_loop().time()
+    response = await group.request("eth_getBalance", ["0x0", "latest"], hedge=True)
+    assert response["result"] == "http://fast.test"
+    assert asyncio.get_running_loop().time() - start < 1
+    assert group.endpoints[1].hedges == 1
+
+@pytest.mark.asyncio
+async def test_endpoint_group_all_failing():
+    group = EndpointGroup("test", ["http://a.test", "http://b.test"], hedge_delay=0)
+    fake_endpoints(group, [(0, True), (0, True)])
+    with pytest.raises(ConnectionError):
+        await group.request("eth_blockNumber", [])
+
+def test_mask_url():
+    assert mask_url("https://eth-mainnet.g.alchemy.com/v2/SECRET") == "https://eth-mainnet.g.alchemy.com/..."
+    assert mask_url("http://1.2.3.4:8545") == "http://1.2.3.4:8545"
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_bursts_in_arrival_order():
+    bucket = TokenBucket(rate=100, burst=50)
+    order = []
+
+    async def call(name, cost):
+        await bucket.acquire(cost)
+        order.append(name)
+
+    start = asyncio.get_running_loop().time()
+    # The first call empties the bucket, the expensive second one must not be overtaken
+    await asyncio.gather(call("first", 50), call("expensive", 40), call("cheap", 1))
+    assert order == ["first", "expensive", "cheap"]
+    assert 0.35 < asyncio.get_running_loop().time() - start < 1
+    stats = bucket.stats()
+    assert stats["units_spent"] == 91
+    assert stats["waited_seconds"] > 0
+
+@pytest.mark.asyncio
+async def test_provider_retries_throttled_requests(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(rpc, "rate_limiters", {})
+    monkeypatch.setattr(rpc, "backoff_delay", lambda attempt, retry_after=None: 0.01)
+    answers = [
+        {"jsonrpc": "2.0", "id": 1, "error": {"code": 429, "message": "Too many requests"}},
+        {"jsonrpc": "2.0", "id": 1, "error": {"code": -32005, "message": "limit exceeded"}},
+        {"jsonrpc": "2.0", "id": 1, "result": "0x10"},
+    ]
+
+    async def fake_request(self, method, params):
+        return answers.pop(0)
+
+    monkeypatch.setattr(AsyncHTTPProvider, "make_request", fake_request)
+    provider = TimedAsyncHTTPProvider("http://throttled.test")
+    response = await provider._timed_request("eth_blockNumber", [])
+    assert response["result"] == "0x10"
+
+    budget = rpc.budget_stats()["http://throttled.test"]
+    assert budget["throttled"] == 2
+    assert budget["units_spent"] == 30
+    counters = metrics.snapshot()["counters"]["rpc_budget"]
+    assert counters["retries"] == 2
+
+    answers[:] = [{"jsonrpc": "2.0", "id": 1, "error": {"code": 429, "message": "Too many requests"}}] * 2
+    with pytest.raises(Throttled):
+        await provider._timed_request("eth_blockNumber", [], retries=1)
+
+def test_backoff_delay_is_jittered_and_capped():
+    delays = {rpc.backoff_delay(3) for _ in range(20)}
+    assert len(delays) > 1
+    assert all(0 <= delay <= min(rpc.RPC_BACKOFF_MAX, rpc.RPC_BACKOFF_BASE * 16) for delay in delays)
+    assert rpc.backoff_delay(0, retry_after=2) >= 2
+
+@pytest.mark.asyncio
+async def test_only_metered_endpoints_are_paced(monkeypatch):
+    monkeypatch.setattr(rpc, "rate_limiters", {})
+    monkeypatch.setattr(rpc, "RPC_RATE_LIMITS", {"http://10.0.0.6:8545": 100})
+
+    async def fake_request(self, method, params):
+        return {"jsonrpc": "2.0", "id": 1, "result": "0x1"}
+
+    monkeypatch.setattr(AsyncHTTPProvider, "make_request", fake_request)
+
+    # A devnet RPC: 40 eth_sendRawTransaction (10000 CU) go through at once
+    devnet = TimedAsyncHTTPProvider("http://10.0.0.5:8545")
+    start = asyncio.get_running_loop().time()
+    await asyncio.gather(*(devnet._timed_request("eth_sendRawTransaction", ["0x00"]) for _ in range(40)))
+    assert asyncio.get_running_loop().time() - start < 0.5
+    assert rpc.rate_limiter("http://10.0.0.5:8545").stats()["available"] is None
+
+    assert rpc.rate_limiter("https://eth-mainnet.g.alchemy.com/v2/KEY").rate == rpc.RPC_COMPUTE_UNITS_PER_SECOND
+    assert rpc.rate_limiter("http://10.0.0.6:8545").rate == 100
+    assert not rpc.is_metered("http://alchemy.com.evil.test/")
+
+@pytest.mark.asyncio
+async def test_cache_ttl_skips_nonces_receipts_and_estimates(monkeypatch):
+    """Back to back sends see a fresh nonce and receipt even with RPC_CACHE_TTL set"""
+    monkeypatch.setattr(rpc, "single_flight", SingleFlight(ttl=60))
+    sent = []
+    requests = []
+
+    async def fake_request(self, method, params):
+        requests.append(method)
+        if method == "eth_sendRawTransaction":
+            sent.append(params[0])
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x" + "ab" * 32}
+        if method == "eth_getTransactionCount":
+            return {"jsonrpc": "2.0", "id": 1, "result": hex(len(sent))}
+        if method == "eth_getTransactionReceipt":
+            return {"jsonrpc": "2.0", "id": 1, "result": None}
+        return {"jsonrpc": "2.0", "id": 1, "result": "0x64"}
+
+    monkeypatch.setattr(TimedAsyncHTTPProvider, "_timed_request", fake_request)
+    w3 = AsyncWeb3(TimedAsyncHTTPProvider("http://rpc.test"))
+    address = "0x742d35Cc6634C0532925a3b844Bc454e4438f44e"
+
+    nonces = []
+    for _ in range(3):
+        nonces.append(await w3.eth.get_transaction_count(address))
+        await w3.eth.send_raw_transaction(b"\x01")
+    assert nonces == [0, 1, 2]
+
+    for _ in range(2):
+        await w3.provider.make_request("eth_getTransactionReceipt", ["0x" + "ab" * 32])
+    assert requests.count("eth_getTransactionReceipt") == 2
+
+    # Block pinned reads are still answered from the cache
+    for _ in range(2):
+        assert await w3.eth.get_balance(address, 5) == 100
+    assert requests.count("eth_getBalance") == 1
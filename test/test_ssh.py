@@ -1,9 +1,21 @@
+import io
+import gzip
 import time
+import asyncio
+import pytest
+
+import ssh
 
 from ssh import (
     exec_command, 
     exec_command_interactive, 
     wait_for_ssh_ready,
+    get_ssh_client,
+    close_ssh_clients,
+    exec_command_async,
+    exec_command_with_status_async,
+    exec_command_stream_async,
+    OutputTail,
 )
 
 from ec2 import (
@@ -82,6 +94,151 @@ def test_ssh():
     terminate_ec2_instance(instance_id)
     wait_for_instance_state(instance_id, "terminated", timeout=600)
 
+def test_ssh_connection_pool():
+    instance_id = create_ec2_instance("test_ssh_pool_1")
+    wait_for_instance_state(instance_id, "running")
+    public_ip = get_ec2_instance_public_ip(instance_id)
+    wait_for_ssh_ready(public_ip)
+
+    try:
+        # Repeated commands share one pooled connection
+        start = time.time()
+        stdout, _ = exec_command(public_ip, "echo first")
+        first_time = time.time() - start
+        client = get_ssh_client(public_ip)
+
+        start = time.time()
+        stdout, _ = exec_command(public_ip, "echo second")
+        second_time = time.time() - start
+        assert stdout.strip() == "second"
+        assert get_ssh_client(public_ip) is client
+        print(f"first command: {first_time:.2f}s, pooled command: {second_time:.2f}s")
+
+        # A dropped connection is replaced transparently
+        client.get_transport().close()
+        stdout, _ = exec_command(public_ip, "echo reconnected")
+        assert stdout.strip() == "reconnected"
+        assert get_ssh_client(public_ip) is not client
+    finally:
+        close_ssh_clients(public_ip)
+        terminate_ec2_instance(instance_id)
+
+@pytest.mark.asyncio
+async def test_exec_command_async():
+    instance_id = create_ec2_instance("test_ssh_async_1")
+    wait_for_instance_state(instance_id, "running")
+    public_ip = get_ec2_instance_public_ip(instance_id)
+    wait_for_ssh_ready(public_ip)
+
+    try:
+        # Commands run concurrently instead of one after another
+        start = time.time()
+        results = await asyncio.gather(*(exec_command_async(public_ip, "sleep 3; echo done") for _ in range(3)))
+        assert all(stdout.strip() == "done" for stdout, _ in results)
+        assert time.time() - start < 9
+
+        _, _, exit_status = await exec_command_with_status_async(public_ip, "exit 3")
+        assert exit_status == 3
+
+        with pytest.raises(TimeoutError):
+            await exec_command_async(public_ip, "sleep 30", get_pty=True, timeout=2)
+
+        # Cancelling the task doesn't leave the event loop waiting on the thread
+        task = asyncio.create_task(exec_command_async(public_ip, "sleep 30"))
+        await asyncio.sleep(2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    finally:
+        close_ssh_clients(public_ip)
+        terminate_ec2_instance(instance_id)
+
+class FakeChannel:
+    """Channel replaying canned output, standing in for a paramiko Channel"""
+
+    def __init__(self, output, exit_status=0):
+        self._stdout = io.BytesIO(output)
+        self.exit_status = exit_status
+        self.closed = False
+
+    def makefile(self, mode):
+        return self._stdout
+
+    def makefile_stderr(self, mode):
+        return io.BytesIO(b"")
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+    def close(self):
+        self.closed = True
+
+def test_output_tail_keeps_last_bytes():
+    tail = OutputTail(max_bytes=10)
+    for i in range(5):
+        tail.append(f"line{i}\n".encode())
+    assert tail.text() == "line4\n"
+    assert tail.lines == 5
+    assert tail.truncated
+
+@pytest.mark.asyncio
+async def test_exec_command_stream_async(monkeypatch, tmp_path):
+    output = b"".join(f"step {i}\n".encode() for i in range(1000))
+    monkeypatch.setattr(ssh, "_open_channel", lambda *args: FakeChannel(output, exit_status=1))
+
+    batches = []
+    lines = []
+    log_path = tmp_path / "deploy.log.gz"
+    result = await exec_command_stream_async(
+        "1.2.3.4", "trh-sdk deploy", on_output=batches.append, on_line=lambda line, at: lines.append(line),
+        log_path=str(log_path), interval=0, tail_bytes=100,
+    )
+
+    assert result["exit_status"] == 1
+    assert result["lines"] == 1000
+    assert result["truncated"]
+    assert result["output"].endswith("step 999\n")
+    assert len(result["output"]) <= 100
+    # Every line is streamed and the full output is on disk
+    assert batches[-1][-1] == "step 999"
+    assert len(lines) == 1000
+    with gzip.open(log_path) as log_file:
+        assert log_file.read() == output
+
+@pytest.mark.asyncio
+async def test_exec_command_stream_async_overflowing_batch(monkeypatch, tmp_path):
+    """A batch over SSH_STREAM_MAX_LINES skips its oldest lines and still ends with the newest"""
+    monkeypatch.setattr(ssh, "SSH_STREAM_MAX_LINES", 10)
+    output = b"".join(f"step {i}\n".encode() for i in range(25))
+    monkeypatch.setattr(ssh, "_open_channel", lambda *args: FakeChannel(output))
+
+    batches = []
+    await exec_command_stream_async(
+        "1.2.3.4", "trh-sdk deploy", on_output=batches.append, log_path=str(tmp_path / "deploy.log.gz"), interval=60,
+    )
+    assert batches == [["... 15 lines skipped"] + [f"step {i}" for i in range(15, 25)]]
+
+@pytest.mark.asyncio
+async def test_exec_commands_run_on_ssh_threads(monkeypatch):
+    """Long commands use the SSH pool and leave the default executor free"""
+    import threading
+
+    monkeypatch.setattr(ssh, "_open_channel", lambda *args: object())
+    release = threading.Event()
+
+    def read_channel(channel):
+        release.wait(5)
+        return threading.current_thread().name, "", 0
+
+    monkeypatch.setattr(ssh, "_read_channel", read_channel)
+    commands = [asyncio.ensure_future(exec_command_async("1.2.3.4", "sleep")) for _ in range(20)]
+    await asyncio.sleep(0.1)
+    # More commands than the default executor has threads, and it still answers
+    assert await asyncio.wait_for(asyncio.to_thread(lambda: "free"), 1) == "free"
+    release.set()
+    results = await asyncio.gather(*commands)
+    assert all(stdout.startswith("ssh") for stdout, _ in results)
+
 if __name__ == "__main__":
     test_ssh()
 
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+from os.path import dirname
+
+# Cold start budget in seconds for importing main, i.e. until the server can answer initialize
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "2.0"))
+
+HEAVY_MODULES = ("web3", "eth_account", "eth_utils", "boto3", "botocore", "paramiko")
+
+def measure_import(module="main"):
+    """Import a module in a fresh interpreter, returning its import time and the heavy modules it loaded"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=dirname(dirname(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_import_skips_heavy_modules():
+    result = measure_import()
+    assert result["loaded"] == []
+
+def test_import_time_budget():
+    # Best of three, a single run is at the mercy of the disk cache
+    elapsed = min(measure_import()["elapsed"] for _ in range(3))
+    print(f"import main: {elapsed:.3f}s (budget {IMPORT_TIME_BUDGET}s)")
+    assert elapsed < IMPORT_TIME_BUDGET